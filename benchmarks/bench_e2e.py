@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Scirate Discord Bot - オフラインのエンドツーエンドベンチマーク
+Scirate・arXiv API・Gemini API・Discord Webhookのスタンドインサーバーを起動し、
+main() を実行して実行時間・リクエスト数・ピークメモリを計測する（ネットワーク不要）
+
+使い方:
+  python benchmarks/bench_e2e.py                          # 全シナリオを実行して閾値と比較
+  python benchmarks/bench_e2e.py --scenario degraded      # 劣化シナリオのみ
+  python benchmarks/bench_e2e.py --scenario nominal --latency 0.1 --error-rate 0.2 --runs 3
+  python benchmarks/bench_e2e.py --update-thresholds      # 現在の結果から閾値を作り直す
+  python benchmarks/bench_e2e.py --virtual-clock          # 待機を仮想時計で進め、数秒で再生する
+
+各実行は空の作業ディレクトリ（cache/なし）で子プロセスとして起動するため、毎回コールドスタートになる。
+スタンドインも子プロセス内で起動し、--virtual-clock ではボットと同じ仮想時計で遅延・レート制限を再現する。
+wall_seconds はボットの時計での経過時間（仮想時計では待機を含む本番相当の時間）、real_seconds は実時間。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from standin_servers import (  # noqa: E402
+    ArxivStandin,
+    DiscordWebhookStandin,
+    GeminiStandin,
+    ScirateStandin,
+    synthetic_papers,
+)
+
+DEFAULT_THRESHOLDS = Path(__file__).resolve().parent / "e2e_thresholds.json"
+THRESHOLD_HEADROOM = 1.5  # --update-thresholds で計測値に掛ける余裕
+
+# シナリオごとのスタンドイン設定（latency秒, error_rate=503の確率, throttle_rate=429の確率, seed=障害注入の乱数シード）
+SCENARIOS = {
+    'nominal': {
+        'papers': 50,
+        'padding': 200_000,
+        'scirate': {},
+        'arxiv': {},
+        'gemini': {},
+        'discord': {'limit': 5, 'window': 1.0},
+    },
+    'degraded': {
+        'papers': 50,
+        'padding': 200_000,
+        'scirate': {'latency': 0.3, 'abstracts': False},  # arXiv APIへのフォールバックを障害下で通す
+        'arxiv': {'latency': 0.2, 'error_rate': 0.3, 'seed': 1},
+        'gemini': {'latency': 0.5, 'throttle_rate': 0.3, 'seed': 4},
+        'discord': {'latency': 0.05, 'limit': 1, 'window': 0.5, 'force_429': 2},
+    },
+}
+
+
+def start_servers(scenario: dict) -> dict:
+    """シナリオのスタンドインを起動"""
+    papers = synthetic_papers(scenario['papers'])
+    servers = {
+        'scirate': ScirateStandin(papers, padding=scenario['padding'], **scenario['scirate']),
+        'arxiv': ArxivStandin(papers, **scenario['arxiv']),
+        'gemini': GeminiStandin(**scenario['gemini']),
+        'discord': DiscordWebhookStandin(**scenario['discord']),
+    }
+    for server in servers.values():
+        server.start()
+    return servers
+
+
+def run_child(scenario: dict, date: str) -> dict:
+    """子プロセス側: スタンドインを起動し、そこに向けて main() を実行して結果を返す"""
+    import resource
+    import tracemalloc
+
+    servers = start_servers(scenario)
+    os.environ.update(
+        SCIRATE_BASE_URL=servers['scirate'].url,
+        ARXIV_API_URL=f"{servers['arxiv'].url}/api/query",
+        GEMINI_BASE_URL=servers['gemini'].url,
+        GEMINI_API_KEY="standin",
+        DISCORD_WEBHOOK_URL=f"{servers['discord'].url}/api/webhooks/1/bench",
+        DISCORD_WEBHOOK_URLS="",
+        STATE_BACKEND="",
+        METRICS_TEXTFILE=str(Path.cwd() / "metrics.prom"),
+    )
+
+    tracemalloc.start()
+    import scirate_discord_bot as bot
+    bot.setup_logging()
+
+    for server in servers.values():
+        server.clock = bot.clock
+    try:
+        start, real_start = bot.clock.monotonic(), time.perf_counter()
+        bot.main(force_weekday=True, date=date)
+        wall, real = bot.clock.monotonic() - start, time.perf_counter() - real_start
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    requests_by_service = {name: len(server.requests) for name, server in servers.items()}
+    return {
+        'wall_seconds': wall,
+        'real_seconds': real,
+        'slept_seconds': bot.sleep_tracker.total(),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_traced_mb': traced_peak / 1024 / 1024,
+        'http_retries': bot.metrics.total('http_retries'),
+        'gemini_tokens': bot.metrics.total('gemini_tokens'),
+        'gemini_cached_tokens': bot.metrics.total('gemini_cached_tokens'),
+        'arxiv_lookups_avoided': bot.metrics.total('arxiv_lookups_avoided'),
+        'requests': requests_by_service,
+        'requests_total': sum(requests_by_service.values()),
+        'injected_faults': sum(sum(server.injected.values()) for server in servers.values()),
+        'discord_messages': len(servers['discord'].messages),
+        'discord_429': servers['discord'].rate_limited,
+    }
+
+
+def run_once(scenario: dict, date: str, virtual_clock: bool) -> dict:
+    """空の作業ディレクトリで子プロセスを1回実行"""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=str(ROOT), CLOCK_MODE='virtual' if virtual_clock else 'real')
+        completed = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), '--child', json.dumps(scenario), '--date', date],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"ベンチマーク実行に失敗しました:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_scenario(scenario: dict, runs: int, date: str, virtual_clock: bool = False) -> dict:
+    """シナリオを runs 回実行し、wall_seconds の中央値の実行を返す"""
+    results = [run_once(scenario, date, virtual_clock) for _ in range(runs)]
+    median = dict(sorted(results, key=lambda r: r['wall_seconds'])[len(results) // 2])
+    median['runs'] = runs
+    return median
+
+
+def check_thresholds(name: str, result: dict, thresholds: dict) -> list:
+    """閾値を超えた項目のリストを返す"""
+    failures = []
+    for metric, limit in thresholds.get(name, {}).items():
+        value = result.get(metric)
+        if value is not None and value > limit:
+            failures.append(f"{name}: {metric} = {value:.2f} > {limit:.2f}")
+    return failures
+
+
+def print_result(name: str, result: dict):
+    print(f"\n== {name} ({result['runs']}回の中央値) ==")
+    print(f"  wall:          {result['wall_seconds']:8.2f}s  (sleep {result['slept_seconds']:.2f}s, 実時間 {result['real_seconds']:.2f}s)")
+    print(f"  peak RSS:      {result['peak_rss_mb']:8.1f}MB  (Python割り当て {result['peak_traced_mb']:.1f}MB)")
+    print(f"  requests:      {result['requests_total']:8d}    " +
+          ", ".join(f"{k}={v}" for k, v in result['requests'].items()))
+    print(f"  arxiv avoided: {result.get('arxiv_lookups_avoided', 0):8.0f}件  (ScirateページのAbstractを使用)")
+    print(f"  retries:       {result['http_retries']:8.0f}    (注入した障害 {result['injected_faults']}件)")
+    print(f"  discord:       {result['discord_messages']:8d}件  (429: {result['discord_429']})")
+    print(f"  gemini tokens: {result['gemini_tokens']:8.0f}    (キャッシュから読んだ入力 {result.get('gemini_cached_tokens', 0):.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='スタンドインサーバーを使ったオフラインE2Eベンチマーク')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help='実行するシナリオ（複数指定可、省略時は全て）')
+    parser.add_argument('--runs', type=int, default=1, help='シナリオごとの実行回数（中央値を採用）')
+    parser.add_argument('--date', default='2026-03-02', help='main() に渡す日付')
+    parser.add_argument('--papers', type=int, help='Scirateページの論文数')
+    parser.add_argument('--padding', type=int, help='Scirateページに付け足すバイト数')
+    parser.add_argument('--latency', type=float, help='全スタンドインの遅延（秒）')
+    parser.add_argument('--error-rate', type=float, help='全スタンドインの503の確率')
+    parser.add_argument('--throttle-rate', type=float, help='全スタンドインの429の確率')
+    parser.add_argument('--thresholds', type=Path, default=DEFAULT_THRESHOLDS, help='回帰判定の閾値ファイル')
+    parser.add_argument('--update-thresholds', action='store_true', help='今回の結果から閾値ファイルを書き直す')
+    parser.add_argument('--virtual-clock', action='store_true', help='待機を実際には行わず仮想時計で進める')
+    parser.add_argument('--json', type=Path, help='結果をJSONで書き出す')
+    parser.add_argument('--child', metavar='SCENARIO_JSON', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child), args.date)))
+        return 0
+
+    overrides = {k: v for k, v in (('latency', args.latency), ('error_rate', args.error_rate),
+                                   ('throttle_rate', args.throttle_rate)) if v is not None}
+    results = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        scenario = json.loads(json.dumps(SCENARIOS[name]))
+        for key in ('papers', 'padding'):
+            if getattr(args, key) is not None:
+                scenario[key] = getattr(args, key)
+        for service in ('scirate', 'arxiv', 'gemini', 'discord'):
+            scenario[service].update(overrides)
+        results[name] = run_scenario(scenario, args.runs, args.date, args.virtual_clock)
+        print_result(name, results[name])
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.update_thresholds:
+        thresholds = json.loads(args.thresholds.read_text(encoding='utf-8')) if args.thresholds.exists() else {}
+        for name, result in results.items():
+            thresholds[name] = {
+                metric: round(max(result[metric] * THRESHOLD_HEADROOM, minimum), 1)
+                for metric, minimum in (('wall_seconds', 1.0), ('peak_rss_mb', 50.0), ('requests_total', 5))
+            }
+        args.thresholds.write_text(json.dumps(thresholds, indent=2) + "\n", encoding='utf-8')
+        print(f"\n閾値を更新しました: {args.thresholds}")
+        return 0
+
+    if overrides or args.papers is not None or args.padding is not None:
+        print("\n（シナリオを上書きしたため閾値との比較はスキップ）")
+        return 0
+
+    thresholds = json.loads(args.thresholds.read_text(encoding='utf-8')) if args.thresholds.exists() else {}
+    failures = [f for name, result in results.items() for f in check_thresholds(name, result, thresholds)]
+    if failures:
+        print("\n⚠ 性能回帰:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\n閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
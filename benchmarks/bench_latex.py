@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Scirate Discord Bot - LaTeX→Unicode変換のスループットベンチマーク
+arXiv Abstract/タイトルのコーパスで、現行のトランスレータと旧実装を比較する
+
+使い方:
+  python benchmarks/bench_latex.py                          # 同梱の固定コーパス（benchmarks/data/arxiv_abstracts.json）
+  python benchmarks/bench_latex.py --corpus export.xml      # arXiv APIのAtomレスポンスを使用
+  python benchmarks/bench_latex.py --corpus abstracts.json  # [{"title": ..., "abstract": ...}, ...]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scirate_discord_bot import convert_latex_to_unicode  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "data" / "arxiv_abstracts.json"
+ATOM_NS = {'atom': 'http://www.w3.org/2005/Atom'}
+
+
+def parse_atom(content: bytes) -> list:
+    """arXiv APIのAtomレスポンスから (title, abstract) のリストを作る"""
+    root = ET.fromstring(content)
+    corpus = []
+    for entry in root.findall('atom:entry', ATOM_NS):
+        title = entry.findtext('atom:title', '', ATOM_NS).strip().replace('\n', ' ')
+        abstract = entry.findtext('atom:summary', '', ATOM_NS).strip().replace('\n', ' ')
+        if abstract:
+            corpus.append({'title': title, 'abstract': abstract})
+    return corpus
+
+
+def load_corpus(path: Path) -> list:
+    if not path.exists():
+        sys.exit(f"コーパスが見つかりません: {path}")
+    if path.suffix == '.xml':
+        return parse_atom(path.read_bytes())
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def bench(func, texts: list, repeat: int) -> float:
+    """最良の1周あたりの秒数を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ===== 比較用: 旧実装（呼び出し毎に対応表を構築し、順次 str.replace / re.sub を適用） =====
+def legacy_convert_latex_to_unicode(text: str) -> str:
+    """
+    LaTeX記法をUnicode文字に変換する
+    例: $alpha$ -> α, $Z^2$ -> Z², $psi_0$ -> ψ₀
+    """
+    # LaTeXコマンド→Unicode対応表
+    latex_to_unicode = {
+        # ギリシャ文字（小文字）
+        r'\alpha': 'α', r'\beta': 'β', r'\gamma': 'γ', r'\delta': 'δ',
+        r'\epsilon': 'ε', r'\varepsilon': 'ε', r'\zeta': 'ζ', r'\eta': 'η',
+        r'\theta': 'θ', r'\vartheta': 'ϑ', r'\iota': 'ι', r'\kappa': 'κ',
+        r'\lambda': 'λ', r'\mu': 'μ', r'\nu': 'ν', r'\xi': 'ξ',
+        r'\pi': 'π', r'\varpi': 'ϖ', r'\rho': 'ρ', r'\varrho': 'ϱ',
+        r'\sigma': 'σ', r'\varsigma': 'ς', r'\tau': 'τ', r'\upsilon': 'υ',
+        r'\phi': 'φ', r'\varphi': 'ϕ', r'\chi': 'χ', r'\psi': 'ψ', r'\omega': 'ω',
+        # ギリシャ文字（大文字）
+        r'\Gamma': 'Γ', r'\Delta': 'Δ', r'\Theta': 'Θ', r'\Lambda': 'Λ',
+        r'\Xi': 'Ξ', r'\Pi': 'Π', r'\Sigma': 'Σ', r'\Upsilon': 'Υ',
+        r'\Phi': 'Φ', r'\Psi': 'Ψ', r'\Omega': 'Ω',
+        # 数学記号
+        r'\times': '×', r'\div': '÷', r'\pm': '±', r'\mp': '∓',
+        r'\cdot': '·', r'\ast': '∗', r'\star': '☆',
+        r'\leq': '≤', r'\geq': '≥', r'\neq': '≠', r'\approx': '≈',
+        r'\equiv': '≡', r'\sim': '∼', r'\propto': '∝',
+        r'\infty': '∞', r'\partial': '∂', r'\nabla': '∇',
+        r'\sum': 'Σ', r'\prod': 'Π', r'\int': '∫',
+        r'\sqrt': '√', r'\hbar': 'ℏ', r'\ell': 'ℓ',
+        r'\rightarrow': '→', r'\leftarrow': '←', r'\leftrightarrow': '↔',
+        r'\Rightarrow': '⇒', r'\Leftarrow': '⇐', r'\Leftrightarrow': '⇔',
+        r'\uparrow': '↑', r'\downarrow': '↓',
+        r'\langle': '⟨', r'\rangle': '⟩',
+        r'\otimes': '⊗', r'\oplus': '⊕', r'\dagger': '†',
+        r'\in': '∈', r'\notin': '∉', r'\subset': '⊂', r'\supset': '⊃',
+        r'\cap': '∩', r'\cup': '∪', r'\forall': '∀', r'\exists': '∃',
+        # 特殊
+        r'\ket': '|⟩', r'\bra': '⟨|',
+    }
+
+    # 上付き文字の対応表
+    superscript_map = {
+        '0': '⁰', '1': '¹', '2': '²', '3': '³', '4': '⁴',
+        '5': '⁵', '6': '⁶', '7': '⁷', '8': '⁸', '9': '⁹',
+        '+': '⁺', '-': '⁻', '=': '⁼', '(': '⁽', ')': '⁾',
+        'n': 'ⁿ', 'i': 'ⁱ',
+    }
+
+    # 下付き文字の対応表
+    subscript_map = {
+        '0': '₀', '1': '₁', '2': '₂', '3': '₃', '4': '₄',
+        '5': '₅', '6': '₆', '7': '₇', '8': '₈', '9': '₉',
+        '+': '₊', '-': '₋', '=': '₌', '(': '₍', ')': '₎',
+        'a': 'ₐ', 'e': 'ₑ', 'o': 'ₒ', 'x': 'ₓ',
+        'i': 'ᵢ', 'j': 'ⱼ', 'k': 'ₖ', 'n': 'ₙ', 'p': 'ₚ',
+    }
+
+    def convert_super_sub(match):
+        """上付き・下付き文字を変換"""
+        content = match.group(1)
+        is_super = match.group(0).startswith('^')
+        char_map = superscript_map if is_super else subscript_map
+
+        # 中括弧を除去
+        content = content.strip('{}')
+
+        result = ''
+        for char in content:
+            result += char_map.get(char, char)
+        return result
+
+    # \mathcal{X} → Unicode数学筆記体
+    mathcal_map = {
+        'A': '𝒜', 'B': 'ℬ', 'C': '𝒞', 'D': '𝒟', 'E': 'ℰ', 'F': 'ℱ',
+        'G': '𝒢', 'H': 'ℋ', 'I': 'ℐ', 'J': '𝒥', 'K': '𝒦', 'L': 'ℒ',
+        'M': 'ℳ', 'N': '𝒩', 'O': '𝒪', 'P': '𝒫', 'Q': '𝒬', 'R': 'ℛ',
+        'S': '𝒮', 'T': '𝒯', 'U': '𝒰', 'V': '𝒱', 'W': '𝒲', 'X': '𝒳',
+        'Y': '𝒴', 'Z': '𝒵',
+    }
+
+    # \mathbb{X} → Unicode黒板太字
+    mathbb_map = {
+        'A': '𝔸', 'B': '𝔹', 'C': 'ℂ', 'D': '𝔻', 'E': '𝔼', 'F': '𝔽',
+        'G': '𝔾', 'H': 'ℍ', 'I': '𝕀', 'J': '𝕁', 'K': '𝕂', 'L': '𝕃',
+        'M': '𝕄', 'N': 'ℕ', 'O': '𝕆', 'P': 'ℙ', 'Q': 'ℚ', 'R': 'ℝ',
+        'S': '𝕊', 'T': '𝕋', 'U': '𝕌', 'V': '𝕍', 'W': '𝕎', 'X': '𝕏',
+        'Y': '𝕐', 'Z': 'ℤ',
+    }
+
+    def convert_mathfont(match, char_map):
+        """数学フォントコマンドを変換"""
+        content = match.group(1)
+        return ''.join(char_map.get(c, c) for c in content)
+
+    def process_latex_content(latex_str):
+        """LaTeX内容を処理"""
+        result = latex_str
+
+        # LaTeXコマンドを変換
+        for latex_cmd, unicode_char in latex_to_unicode.items():
+            result = result.replace(latex_cmd, unicode_char)
+
+        # \mathcal{...} → Unicode筆記体
+        result = re.sub(r'\\mathcal{([^}]+)}', lambda m: convert_mathfont(m, mathcal_map), result)
+
+        # \mathbb{...} → Unicode黒板太字
+        result = re.sub(r'\\mathbb{([^}]+)}', lambda m: convert_mathfont(m, mathbb_map), result)
+
+        # \widetilde{...} / \tilde{...} → x̃ (チルダ結合文字)
+        result = re.sub(r'\\(?:widetilde|tilde){([^}]+)}', lambda m: m.group(1) + '\u0303', result)
+
+        # \hat{...} → x̂ (ハット結合文字)
+        result = re.sub(r'\\hat{([^}]+)}', lambda m: m.group(1) + '\u0302', result)
+
+        # \bar{...} / \overline{...} → x̄ (バー結合文字)
+        result = re.sub(r'\\(?:bar|overline){([^}]+)}', lambda m: m.group(1) + '\u0304', result)
+
+        # \vec{...} → x⃗ (ベクトル結合文字)
+        result = re.sub(r'\\vec{([^}]+)}', lambda m: m.group(1) + '\u20D7', result)
+
+        # \dot{...} → ẋ (ドット結合文字)
+        result = re.sub(r'\\dot{([^}]+)}', lambda m: m.group(1) + '\u0307', result)
+
+        # \mathbf{...} / \boldsymbol{...} → そのまま（Unicodeボールド省略）
+        result = re.sub(r'\\(?:mathbf|boldsymbol){([^}]+)}', r'\1', result)
+
+        # 上付き文字: ^{...} または ^x
+        result = re.sub(r'\^{([^}]+)}', convert_super_sub, result)
+        result = re.sub(r'\^([0-9a-zA-Z])', convert_super_sub, result)
+
+        # 下付き文字: _{...} または _x
+        result = re.sub(r'_{([^}]+)}', convert_super_sub, result)
+        result = re.sub(r'_([0-9a-zA-Z])', convert_super_sub, result)
+
+        # \frac{a}{b} → a/b
+        result = re.sub(r'\\frac{([^}]+)}{([^}]+)}', r'\1/\2', result)
+
+        # \sqrt{x} → √x
+        result = re.sub(r'\\sqrt{([^}]+)}', r'√\1', result)
+
+        # \text{...} → ...
+        result = re.sub(r'\\text{([^}]+)}', r'\1', result)
+
+        # \mathrm{...} → ...
+        result = re.sub(r'\\mathrm{([^}]+)}', r'\1', result)
+
+        # 残った中括弧を除去
+        result = result.replace('{', '').replace('}', '')
+
+        # 残ったバックスラッシュを除去
+        result = re.sub(r'\\([a-zA-Z]+)', r'\1', result)
+
+        return result.strip()
+
+    # $...$ 形式のLaTeX数式を変換
+    result = re.sub(r'\$([^$]+)\$', lambda m: process_latex_content(m.group(1)), text)
+
+    # \(...\) 形式のLaTeX数式を変換
+    result = re.sub(r'\\\(([^)]+)\\\)', lambda m: process_latex_content(m.group(1)), result)
+
+    # \[...\] 形式のLaTeX数式を変換
+    result = re.sub(r'\\\[([^\]]+)\\\]', lambda m: process_latex_content(m.group(1)), result)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LaTeX→Unicode変換のスループットベンチマーク')
+    parser.add_argument('--corpus', type=Path, default=DEFAULT_CORPUS, help='コーパス（.json または Atom .xml）')
+    parser.add_argument('--repeat', type=int, default=20, help='計測の繰り返し回数（最良値を採用）')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [p['title'] for p in corpus] + [p['abstract'] for p in corpus]
+    total_bytes = sum(len(t.encode('utf-8')) for t in texts)
+    with_math = sum(1 for t in texts if re.search(r'\$|\\\(|\\\[', t))
+
+    print(f"コーパス: {len(corpus)}件（テキスト {len(texts)}本, {total_bytes / 1024:.0f}KB, 数式を含む: {with_math}本）")
+
+    results = {}
+    for name, func in (('current', convert_latex_to_unicode), ('legacy', legacy_convert_latex_to_unicode)):
+        elapsed = bench(func, texts, args.repeat)
+        results[name] = elapsed
+        print(f"  {name:8s}: {elapsed * 1000:8.2f} ms/周  "
+              f"{len(texts) / elapsed:10.0f} texts/s  {total_bytes / elapsed / 1e6:6.2f} MB/s")
+
+    print(f"  高速化: {results['legacy'] / results['current']:.1f}倍")
+
+    changed = sum(1 for t in texts if convert_latex_to_unicode(t) != legacy_convert_latex_to_unicode(t))
+    print(f"  旧実装と出力が異なるテキスト: {changed}本（\\in/\\infty 等の置換順バグ修正を含む）")
+
+
+if __name__ == "__main__":
+    main()
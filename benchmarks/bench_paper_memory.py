@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Scirate Discord Bot - 論文レコードのメモリベンチマーク
+従来の dict（URLを2本持つ）と Paper（__slots__・著者名をintern）で、N件を保持したときのメモリを比較する
+
+使い方:
+  python benchmarks/bench_paper_memory.py                # 5万件、アブストラクト無し（Scirateページ・履歴処理相当）
+  python benchmarks/bench_paper_memory.py --count 200000
+  python benchmarks/bench_paper_memory.py --abstracts    # アブストラクト付き（補完後相当）
+
+タイトル・著者名などの文字列はパースと同じく論文ごとに新しく作る（同じ著者名でも別の文字列になる）。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scirate_discord_bot import Paper  # noqa: E402
+
+AUTHOR_POOL = 5_000  # 著者の母集団（同じ著者が何度も論文を出す）
+FIRST_NAMES = [f"Given{i}" for i in range(300)]
+LAST_NAMES = [f"Family{i}" for i in range(2000)]
+
+
+def synthetic_rows(count: int, abstracts: bool, seed: int = 0) -> list:
+    """(番号, トピック, scites, 著者番号のリスト, アブストラクトの語番号) の合成データ（文字列はパース時に作る）"""
+    rng = random.Random(seed)
+    authors = [(rng.randrange(len(FIRST_NAMES)), rng.randrange(len(LAST_NAMES))) for _ in range(AUTHOR_POOL)]
+    return [
+        (i, rng.randrange(500), rng.randrange(100),
+         [authors[rng.randrange(AUTHOR_POOL)] for _ in range(rng.randint(1, 8))],
+         [rng.randrange(5000) for _ in range(150)] if abstracts else None)
+        for i in range(count)
+    ]
+
+
+def parse(row) -> tuple:
+    """Scirateページのパースと同じく、論文ごとに新しい文字列を作る"""
+    i, topic, scites, authors, words = row
+    arxiv_id = f"{2001 + (i // 100000) % 12}.{i % 100000:05d}"
+    abstract = " ".join(f"word{w}" for w in words) if words else None
+    return (arxiv_id, f"Title of paper {i} on topic {topic}", scites,
+            [f"{FIRST_NAMES[first]} {LAST_NAMES[last]}" for first, last in authors], abstract)
+
+
+def as_dict(row) -> dict:
+    """従来の形式（get_top_papers_from_scirate が返していたdict）"""
+    arxiv_id, title, scites, authors, abstract = parse(row)
+    return {
+        'arxiv_id': arxiv_id,
+        'title': title,
+        'scites': scites,
+        'authors': authors,
+        'url': f"https://arxiv.org/abs/{arxiv_id}",
+        'scirate_url': f"https://scirate.com/arxiv/{arxiv_id}",
+        'abstract': abstract,
+    }
+
+
+def as_paper(row) -> Paper:
+    return Paper(*parse(row))
+
+
+def measure(factory, rows: list) -> dict:
+    """factory で全行のレコードを作り、保持に使ったメモリと作成時間を測る"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = [factory(row) for row in rows]
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # 属性アクセスの速度（パイプラインでの典型的な読み方）
+    start = time.perf_counter()
+    for record in records:
+        record['arxiv_id'], record['scites'], record['title'], record['url']
+    access = time.perf_counter() - start
+
+    # JSONへのシリアライズ（Paperは dict() で同じキーの辞書にしてから）
+    start = time.perf_counter()
+    encoded = json.dumps([dict(r) for r in records])
+    serialize = time.perf_counter() - start
+
+    return {
+        'bytes': current,
+        'bytes_per_paper': current / len(rows),
+        'build_seconds': elapsed,
+        'access_seconds': access,
+        'serialize_seconds': serialize,
+        'serialized_bytes': len(encoded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dict と Paper のメモリ使用量を比較')
+    parser.add_argument('--count', type=int, default=50_000, help='論文数')
+    parser.add_argument('--abstracts', action='store_true', help='アブストラクト（約1KB）を付ける')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.count, args.abstracts)
+    results = {'dict': measure(as_dict, rows), 'Paper': measure(as_paper, rows)}
+
+    print(f"{args.count}件" + ("（アブストラクト付き）" if args.abstracts else ""))
+    print(f"{'':8s} {'合計':>10s} {'1件あたり':>10s} {'作成':>8s} {'読み取り':>8s} {'JSON化':>8s} {'JSONサイズ':>10s}")
+    for name, r in results.items():
+        print(f"{name:8s} {r['bytes'] / 1024 / 1024:8.1f}MB {r['bytes_per_paper']:9.0f}B "
+              f"{r['build_seconds']:7.2f}s {r['access_seconds']:7.2f}s {r['serialize_seconds']:7.2f}s "
+              f"{r['serialized_bytes'] / 1024 / 1024:8.1f}MB")
+    ratio = results['Paper']['bytes'] / results['dict']['bytes']
+    print(f"\nPaper は dict の {ratio:.0%} のメモリで保持できます")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,46 +15,156 @@ Scirateのquant-phトップページから、scites数上位10件の論文をAI
 2. このスクリプトを実行: python scirate_discord_bot_improved.py
 """
 
+import numpy as np
 import requests
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+from datetime import date as dt_date, datetime, time as dt_time, timedelta, timezone
 import time
 from typing import List, Dict, Optional
 import re
 import os
 import json
 import hashlib
+import hmac
+import io
+import math
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import asyncio
+import signal
+import sys
+import unicodedata
+import cProfile
+import pstats
+import tracemalloc
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import atexit
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
+from urllib.parse import urlparse, quote
 import argparse
+import httpx
 from google import genai
+from google.genai import types
 
 # ===== ドライランモード =====
 
-# ===== 平日チェック =====
-def is_weekday() -> bool:
+# ===== ログ設定 =====
+# 出力（コンソール・ファイル）は QueueListener のスレッドで行い、ログを書く側を待たせない
+LOGGER_NAME = "scirate_bot"
+LOG_TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FILE = os.environ.get('LOG_FILE', 'scirate_bot.log')  # 空ならファイルに書かない
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # このサイズでローテーション
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# ロガーごとのレベル（例: "scirate_bot.cache=WARNING,urllib3=ERROR"）
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # ファイル出力の形式（text / json）
+
+
+class JsonLogFormatter(logging.Formatter):
+    """1行1レコードのJSON（t, level, logger, msg, exc）。集計ツールから json.loads だけで読める"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            't': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_log_levels(spec: str) -> Dict[str, int]:
     """
-    今日が平日（月〜金）かどうかをチェック
-    土曜=5, 日曜=6
+    "ロガー名=レベル" のカンマ区切りをパース
+
+    Raises:
+        ValueError: 書式・レベル名が不正な場合
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, sep, level = item.partition('=')
+        level_no = logging.getLevelName(level.strip().upper())
+        if not sep or not name.strip() or not isinstance(level_no, int):
+            raise ValueError(f"ログレベルの指定が不正です: '{item}'（例: scirate_bot.cache=WARNING）")
+        levels[name.strip()] = level_no
+    return levels
+
+
+def setup_logging(log_file: Optional[str] = LOG_FILE, level: str = LOG_LEVEL, levels: str = LOG_LEVELS,
+                  log_format: str = LOG_FORMAT, max_bytes: int = LOG_MAX_BYTES,
+                  backup_count: int = LOG_BACKUP_COUNT, console: bool = True) -> logging.handlers.QueueListener:
+    """
+    ルートロガーを QueueHandler に付け替え、コンソール・ローテーション付きファイルへの出力を QueueListener で行う
+
+    Returns:
+        開始済みの QueueListener（終了時に stop() でキューを書き出す。atexit にも登録済み）
     """
-    return datetime.now().weekday() < 5
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_TEXT_FORMAT))
+        handlers.append(console_handler)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonLogFormatter() if log_format == 'json' else logging.Formatter(LOG_TEXT_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    invalid = []
+    root_level = logging.getLevelName(level.upper())
+    if not isinstance(root_level, int):
+        invalid.append(f"LOG_LEVEL={level}")
+        root_level = logging.INFO
+    root.setLevel(root_level)
+    try:
+        for name, level_no in parse_log_levels(levels).items():
+            logging.getLogger(name).setLevel(level_no)
+    except ValueError as e:
+        invalid.append(f"LOG_LEVELS（{e}）")
 
+    listener.start()
+    atexit.register(stop_logging, listener)
+    if invalid:
+        logging.getLogger(LOGGER_NAME).warning(f"不正なログ設定を無視しました: {', '.join(invalid)}")
+    return listener
 
-# ===== ログ設定 =====
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('scirate_bot.log', encoding='utf-8')
-    ]
-)
-logger = logging.getLogger(__name__)
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """キューに残ったログを書き出して QueueListener を止める（停止済みなら何もしない）"""
+    if getattr(listener, '_thread', None) is not None:
+        listener.stop()
+
+
+# ログ出力はスクリプトとして実行したときだけ setup_logging() で設定する（importしただけではルートロガーに触れない）
+logger = logging.getLogger(LOGGER_NAME)
+cache_logger = logger.getChild('cache')  # 要約キャッシュのヒット・保存（件数が多いので個別にレベルを変えられる）
 
 # ===== 設定（ここを編集してください） =====
 # 環境変数から取得（GitHub Actions用）、なければデフォルト値を使用
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK_URL', "")
+# 複数の投稿先（カンマ・空白・改行区切り）。DISCORD_WEBHOOK_URL と合わせて全てに同じダイジェストを投稿
+DISCORD_WEBHOOK_URLS = list(dict.fromkeys(
+    url for url in re.split(r'[\s,]+', f"{DISCORD_WEBHOOK_URL} {os.environ.get('DISCORD_WEBHOOK_URLS', '')}") if url
+))
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', "")  # Gemini APIキーを設定(空じゃないとだめ）
 ARXIV_CATEGORY = "quant-ph"  # カテゴリ (quant-ph, cs.AI, cs.LG など)
 TOP_N_PAPERS = 8  # 投稿する論文数
@@ -64,6 +174,14 @@ SUMMARY_LANGUAGE = "ja"  # 要約言語 (ja=日本語, en=英語)
 CACHE_DIR = Path("cache")
 CACHE_EXPIRY_HOURS = 24  # キャッシュの有効期限（時間）
 
+# テナント設定ファイル（JSON、空なら上の定数で1テナント）。複数のコミュニティに配信する場合に使用
+TENANTS_CONFIG = os.environ.get('TENANTS_CONFIG', "")
+DEFAULT_TENANT = "default"
+
+# 状態バックエンド（空なら無効）
+# 例: "dir:/data/scirate-state" / "s3://my-bucket/scirate"（S3互換はS3_ENDPOINT_URLで指定）
+STATE_BACKEND = os.environ.get('STATE_BACKEND', "")
+
 # モデル優先順位（コスト効率の良いモデルから順に試行）
 MODEL_PRIORITY = [
     {
@@ -78,8 +196,315 @@ MODEL_PRIORITY = [
     },
 ]
 
+# 接続先（ベンチマーク等でスタンドインサーバーに向ける場合に上書き）
+SCIRATE_BASE_URL = os.environ.get('SCIRATE_BASE_URL', "https://scirate.com").rstrip('/')
+ARXIV_API_URL = os.environ.get('ARXIV_API_URL', "https://export.arxiv.org/api/query")
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL', "")
+
 # Gemini APIクライアントを初期化
-gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
+gemini_client = genai.Client(
+    api_key=GEMINI_API_KEY,
+    http_options=types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None,
+) if GEMINI_API_KEY else None
+
+
+# ===== 時計 =====
+# レート制限・リトライ・バケット管理、キャッシュ・履歴の期限はすべてこの時計を通して時刻を取得・待機する
+CLOCK_MODE = os.environ.get('CLOCK_MODE', "real")  # real / virtual
+
+
+class SystemClock:
+    """実時間の時計"""
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def now(self, tz: Optional[timezone] = None) -> datetime:
+        """現在時刻（キャッシュの有効期限・履歴の整理・記録の時刻に使う）"""
+        return datetime.fromtimestamp(self.time(), tz)
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def elapsed_virtual(self) -> float:
+        """実際には待機せずに進めた秒数（実時間の時計では常に0）"""
+        return 0.0
+
+
+class VirtualClock(SystemClock):
+    """
+    シミュレーション用の仮想時計
+
+    sleep() は実際には待機せず、その秒数だけ時計を進める。処理にかかった実時間はそのまま加算されるため、
+    30秒のRetry-AfterやRPMの待機を含む実行を数秒で再生しつつ、本番相当の経過時間を得られる。
+    複数スレッドの待機は並行ではなく直列に加算される（経過時間の上限見積もりになる）。
+    """
+    def __init__(self):
+        self._skipped = 0.0
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return time.time() + self._skipped
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self._skipped
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._skipped += seconds
+
+    def elapsed_virtual(self) -> float:
+        return self._skipped
+
+
+# グローバル時計
+clock = VirtualClock() if CLOCK_MODE == 'virtual' else SystemClock()
+
+
+# ===== 待機時間の計測 =====
+class SleepTracker:
+    """
+    レート制限・リトライによる待機（sleep）時間を、実行中のステージ別に集計するクラス
+    """
+    def __init__(self):
+        self.totals = {}  # ステージ名 → 待機秒数
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def current_stage(self) -> str:
+        """このスレッドで実行中のステージ名"""
+        return getattr(self._local, 'stage', 'main')
+
+    def set_stage(self, name: str):
+        """このスレッドで実行中のステージ名を設定"""
+        self._local.stage = name
+
+    def sleep(self, seconds: float):
+        """待機して、待機時間を現在のステージに記録"""
+        if seconds <= 0:
+            return
+        start = clock.monotonic()
+        clock.sleep(seconds)
+        elapsed = clock.monotonic() - start
+        with self._lock:
+            stage = self.current_stage()
+            self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+
+    def total(self) -> float:
+        """全ステージの待機秒数の合計"""
+        with self._lock:
+            return sum(self.totals.values())
+
+    def reset(self):
+        """集計をクリア（常駐モードの実行ごと）"""
+        with self._lock:
+            self.totals.clear()
+
+
+# グローバル待機時間トラッカー
+sleep_tracker = SleepTracker()
+
+
+# ===== 実行メトリクス =====
+# OpenMetricsテキストファイル（node_exporterのtextfile collector等で収集）と実行履歴
+METRICS_TEXTFILE = Path(os.environ.get('METRICS_TEXTFILE', 'metrics/scirate_bot.prom'))
+METRICS_HISTORY_FILE = CACHE_DIR / "metrics_history.jsonl"
+METRICS_HISTORY_MAX_RUNS = 1000
+DELIVERY_DEADLINE_JST = os.environ.get('DELIVERY_DEADLINE_JST', '08:50')  # 配信締切（JST）
+JST = timezone(timedelta(hours=9))
+
+
+class RunMetrics:
+    """
+    1回の実行のメトリクスを集計するクラス
+
+    カウンター（HTTP呼び出し、リトライ、キャッシュ、Gemini、Discord）とゲージ（ステージ所要時間など）を
+    ラベル付きで保持し、OpenMetrics形式と履歴（JSON Lines）に書き出す。
+    """
+    PREFIX = "scirate_bot"
+
+    def __init__(self):
+        self.counters = {}  # (名前, ラベル) → 値
+        self.gauges = {}
+        self.started_at = clock.time()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """カウンターを加算"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """ゲージを設定"""
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def total(self, name: str) -> float:
+        """ラベルを問わずカウンターを合計"""
+        with self._lock:
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    @staticmethod
+    def _format_sample(name: str, labels) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{label_str}}}"
+
+    def to_openmetrics(self) -> str:
+        """OpenMetrics形式のテキストを生成"""
+        lines = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self.counters})
+            gauge_names = sorted({name for name, _ in self.gauges})
+            for name in counter_names:
+                family = f"{self.PREFIX}_{name}"
+                lines.append(f"# TYPE {family} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{self._format_sample(family + '_total', labels)} {self._format_value(value)}")
+            for name in gauge_names:
+                family = f"{self.PREFIX}_{name}"
+                lines.append(f"# TYPE {family} gauge")
+                for (n, labels), value in sorted(self.gauges.items()):
+                    if n == name:
+                        lines.append(f"{self._format_sample(family, labels)} {self._format_value(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def to_record(self) -> Dict:
+        """履歴用のコンパクトな記録を生成"""
+        with self._lock:
+            return {
+                't': round(self.started_at, 3),
+                'c': {self._format_sample(n, l): v for (n, l), v in sorted(self.counters.items())},
+                'g': {self._format_sample(n, l): round(v, 4) for (n, l), v in sorted(self.gauges.items())},
+            }
+
+    def finish(self, stage_seconds: Optional[Dict[str, float]] = None):
+        """実行終了時のゲージ（所要時間・待機時間・締切までの余裕）を設定"""
+        finished_at = clock.time()
+        for stage, seconds in (stage_seconds or {}).items():
+            self.set('stage_duration_seconds', seconds, stage=stage)
+        self.set('run_duration_seconds', finished_at - self.started_at)
+        self.set('slept_seconds', sleep_tracker.total())
+        self.set('last_run_timestamp_seconds', finished_at)
+
+        finished_jst = datetime.fromtimestamp(finished_at, JST)
+        hour, minute = (int(x) for x in DELIVERY_DEADLINE_JST.split(':'))
+        deadline = finished_jst.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        self.set('deadline_margin_seconds', (deadline - finished_jst).total_seconds())
+
+    def write(self, textfile: Optional[Path] = None, history_file: Optional[Path] = None):
+        """OpenMetricsテキストファイルを書き出し、履歴に1行追記"""
+        textfile = textfile or METRICS_TEXTFILE
+        history_file = history_file or METRICS_HISTORY_FILE
+        try:
+            textfile.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = textfile.with_name(textfile.name + '.tmp')
+            tmp_path.write_text(self.to_openmetrics(), encoding='utf-8')
+            os.replace(tmp_path, textfile)
+
+            history_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.to_record(), ensure_ascii=False, separators=(',', ':')) + "\n")
+            _trim_history(history_file, METRICS_HISTORY_MAX_RUNS)
+            logger.info(f"メトリクスを書き出しました: {textfile}")
+        except Exception as e:
+            logger.warning(f"メトリクス書き出しエラー: {e}")
+
+
+def _trim_history(history_file: Path, max_runs: int):
+    """履歴ファイルを直近max_runs件に切り詰める"""
+    lines = history_file.read_text(encoding='utf-8').splitlines()
+    if len(lines) > max_runs:
+        history_file.write_text("\n".join(lines[-max_runs:]) + "\n", encoding='utf-8')
+
+
+def load_metrics_history(last_n: int, history_file: Optional[Path] = None) -> List[Dict]:
+    """直近N回の実行メトリクスを読み込み"""
+    history_file = history_file or METRICS_HISTORY_FILE
+    if not history_file.exists():
+        return []
+    records = []
+    for line in history_file.read_text(encoding='utf-8').splitlines()[-last_n:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def format_metrics_report(records: List[Dict]) -> str:
+    """実行履歴から p50/p95 の傾向レポートを作成"""
+    if not records:
+        return "実行履歴がありません"
+
+    series = {}
+    for record in records:
+        for key, value in record.get('g', {}).items():
+            if key != 'last_run_timestamp_seconds':
+                series.setdefault(key, []).append(value)
+        # カウンターはラベルを集約してメトリクス名ごとに合計
+        totals = {}
+        for key, value in record.get('c', {}).items():
+            name = key.split('{', 1)[0]
+            totals[name] = totals.get(name, 0) + value
+        for name, value in totals.items():
+            series.setdefault(f"{name}_total", []).append(value)
+
+    first = datetime.fromtimestamp(records[0]['t'], JST).strftime('%Y-%m-%d')
+    last = datetime.fromtimestamp(records[-1]['t'], JST).strftime('%Y-%m-%d')
+    width = max(len(key) for key in series)
+    lines = [
+        f"直近{len(records)}回の実行（{first} 〜 {last}）",
+        f"{'metric':<{width}}  {'p50':>10}  {'p95':>10}  {'last':>10}",
+    ]
+    for key in sorted(series):
+        values = series[key]
+        lines.append(f"{key:<{width}}  {_percentile(values, 50):>10.2f}  {_percentile(values, 95):>10.2f}  {values[-1]:>10.2f}")
+
+    margins = series.get('deadline_margin_seconds')
+    if margins:
+        worst = _percentile(margins, 5)
+        lines.append("")
+        lines.append(f"配信締切（{DELIVERY_DEADLINE_JST} JST）までの余裕: p50 {_percentile(margins, 50):.0f}秒, "
+                     f"ワースト5% {worst:.0f}秒" + ("  ⚠ 締切超過の実行あり" if min(margins) < 0 else ""))
+    return "\n".join(lines)
+
+
+# グローバルメトリクスインスタンス
+metrics = RunMetrics()
+
+
+# ===== HTTPセッション =====
+def _count_http_response(response, *args, **kwargs):
+    """全HTTPレスポンスをホスト・ステータス別に数える"""
+    metrics.inc('http_requests', host=urlparse(response.url).hostname or '', status=f"{response.status_code // 100}xx")
+
+
+# 接続を使い回すための共有セッション
+http_session = requests.Session()
+http_session.hooks['response'].append(_count_http_response)
 
 
 # ===== レート制限管理クラス =====
@@ -92,11 +517,11 @@ class RateLimiter:
         self.interval = 60.0 / rpm_limit  # リクエスト間隔（秒）
         self.last_request_time = 0
         self.request_count = 0
-        self.minute_start = time.time()
+        self.minute_start = clock.time()
 
     def wait_if_needed(self):
         """必要に応じて待機"""
-        current_time = time.time()
+        current_time = clock.time()
 
         # 1分経過したらカウンターをリセット
         if current_time - self.minute_start >= 60:
@@ -108,17 +533,17 @@ class RateLimiter:
             wait_time = 60 - (current_time - self.minute_start)
             if wait_time > 0:
                 logger.info(f"RPM制限に達しました。{wait_time:.1f}秒待機します...")
-                time.sleep(wait_time)
+                sleep_tracker.sleep(wait_time)
                 self.request_count = 0
-                self.minute_start = time.time()
-                current_time = time.time()  # 待機後に現在時刻を再取得
+                self.minute_start = clock.time()
+                current_time = clock.time()  # 待機後に現在時刻を再取得
 
         # 最小間隔を確保
         elapsed = current_time - self.last_request_time
         if elapsed < self.interval:
-            time.sleep(self.interval - elapsed)
+            sleep_tracker.sleep(self.interval - elapsed)
 
-        self.last_request_time = time.time()
+        self.last_request_time = clock.time()
         self.request_count += 1
 
     def update_rpm(self, new_rpm: int):
@@ -160,36 +585,41 @@ class SummaryCache:
         except Exception as e:
             logger.warning(f"キャッシュ保存エラー: {e}")
 
-    def _generate_key(self, arxiv_id: str, abstract: str) -> str:
-        """キャッシュキーを生成"""
+    def _generate_key(self, arxiv_id: str, abstract: str, language: str = SUMMARY_LANGUAGE) -> str:
+        """キャッシュキーを生成（既定の言語は従来のキーのままにして既存のキャッシュを活かす）"""
         content = f"{arxiv_id}:{(abstract or '')[:200]}"
+        if language != SUMMARY_LANGUAGE:
+            content += f":{language}"
         return hashlib.md5(content.encode()).hexdigest()
 
-    def get(self, arxiv_id: str, abstract: str) -> Optional[str]:
+    def get(self, arxiv_id: str, abstract: str, language: str = SUMMARY_LANGUAGE) -> Optional[str]:
         """キャッシュから要約を取得"""
-        key = self._generate_key(arxiv_id, abstract)
+        key = self._generate_key(arxiv_id, abstract, language)
         if key in self.cache:
             entry = self.cache[key]
             # 有効期限チェック
             cached_time = datetime.fromisoformat(entry['timestamp'])
-            if (datetime.now() - cached_time).total_seconds() < CACHE_EXPIRY_HOURS * 3600:
-                logger.info(f"キャッシュヒット: {arxiv_id}")
+            if (clock.now() - cached_time).total_seconds() < CACHE_EXPIRY_HOURS * 3600:
+                cache_logger.info(f"キャッシュヒット: {arxiv_id}")
+                metrics.inc('summary_cache_lookups', result='hit')
                 return entry['summary']
             else:
-                logger.info(f"キャッシュ期限切れ: {arxiv_id}")
+                cache_logger.info(f"キャッシュ期限切れ: {arxiv_id}")
                 del self.cache[key]
+        metrics.inc('summary_cache_lookups', result='miss')
         return None
 
-    def set(self, arxiv_id: str, abstract: str, summary: str):
+    def set(self, arxiv_id: str, abstract: str, summary: str, language: str = SUMMARY_LANGUAGE):
         """要約をキャッシュに保存"""
-        key = self._generate_key(arxiv_id, abstract)
+        key = self._generate_key(arxiv_id, abstract, language)
         self.cache[key] = {
             'arxiv_id': arxiv_id,
+            'language': language,
             'summary': summary,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': clock.now().isoformat()
         }
         self._save_cache()
-        logger.info(f"キャッシュ保存: {arxiv_id}")
+        cache_logger.info(f"キャッシュ保存: {arxiv_id}")
 
     def get_stats(self) -> Dict:
         """キャッシュ統計を取得"""
@@ -231,15 +661,28 @@ class APIUsageTracker:
         except Exception as e:
             logger.warning(f"使用量保存エラー: {e}")
 
-    def record(self, model: str, tokens: int = 0):
-        """API使用を記録"""
-        today = datetime.now().strftime('%Y-%m-%d')
+    def record(self, model: str, tokens: int = 0, cached_tokens: int = 0):
+        """
+        API使用を記録
+
+        Args:
+            cached_tokens: 入力のうちキャッシュ済みコンテンツから読んだトークン数（再送せずに済んだ分）
+        """
+        metrics.inc('gemini_requests', model=model)
+        metrics.inc('gemini_tokens', tokens, model=model)
+        if cached_tokens:
+            metrics.inc('gemini_cached_tokens', cached_tokens, model=model)
+        today = clock.now().strftime('%Y-%m-%d')
 
         if today not in self.usage['daily']:
             self.usage['daily'][today] = {'requests': 0, 'tokens': 0, 'models': {}}
 
         self.usage['daily'][today]['requests'] += 1
         self.usage['daily'][today]['tokens'] += tokens
+        if cached_tokens:
+            daily = self.usage['daily'][today]
+            daily['cached_tokens'] = daily.get('cached_tokens', 0) + cached_tokens
+            self.usage['total']['cached_tokens'] = self.usage['total'].get('cached_tokens', 0) + cached_tokens
 
         if model not in self.usage['daily'][today]['models']:
             self.usage['daily'][today]['models'][model] = 0
@@ -252,7 +695,7 @@ class APIUsageTracker:
 
     def get_today_usage(self) -> Dict:
         """今日の使用量を取得"""
-        today = datetime.now().strftime('%Y-%m-%d')
+        today = clock.now().strftime('%Y-%m-%d')
         return self.usage['daily'].get(today, {'requests': 0, 'tokens': 0, 'models': {}})
 
     def print_summary(self):
@@ -261,10 +704,14 @@ class APIUsageTracker:
         logger.info("=" * 40)
         logger.info("API使用量サマリー")
         logger.info(f"  今日のリクエスト数: {today_usage['requests']}")
+        logger.info(f"  今日のトークン数: {today_usage['tokens']}"
+                    f"（うちキャッシュから読んだ入力: {today_usage.get('cached_tokens', 0)}）")
         logger.info(f"  今日のモデル別使用:")
         for model, count in today_usage.get('models', {}).items():
             logger.info(f"    - {model}: {count}回")
         logger.info(f"  累計リクエスト数: {self.usage['total']['requests']}")
+        if self.usage['total'].get('cached_tokens'):
+            logger.info(f"  累計でキャッシュにより再送を省いた入力トークン: {self.usage['total']['cached_tokens']}")
         logger.info("=" * 40)
 
 
@@ -273,13 +720,21 @@ usage_tracker = APIUsageTracker()
 
 
 # ===== 投稿済み論文トラッキング =====
+def webhook_target_key(url: str) -> str:
+    """Webhook URLから投稿先キーを生成（トークンを状態ファイルやログに残さないためハッシュ化）"""
+    return hashlib.sha256(url.split('?', 1)[0].encode('utf-8')).hexdigest()[:12]
+
+
 class PostedPapersTracker:
     """
     投稿済み論文IDを記録し、重複投稿を防ぐクラス
+
+    'papers' はいずれかの投稿先に投稿済みの論文、'targets' は投稿先（Webhook）ごとの記録。
     """
     def __init__(self):
         self.posted_file = CACHE_DIR / "posted_papers.json"
         self.posted = self._load_posted()
+        self._lock = threading.Lock()
 
     def _load_posted(self) -> Dict:
         """投稿済みデータを読み込み"""
@@ -287,10 +742,16 @@ class PostedPapersTracker:
         if self.posted_file.exists():
             try:
                 with open(self.posted_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    posted = json.load(f)
+                if 'targets' not in posted:
+                    # 旧形式（単一Webhook）の記録は先頭の投稿先のものとして引き継ぐ
+                    posted['targets'] = {}
+                    if DISCORD_WEBHOOK_URLS:
+                        posted['targets'][webhook_target_key(DISCORD_WEBHOOK_URLS[0])] = dict(posted['papers'])
+                return posted
             except Exception:
                 pass
-        return {'papers': {}, 'last_date': None}
+        return {'papers': {}, 'targets': {}, 'last_date': None}
 
     def _save_posted(self):
         """投稿済みデータを保存"""
@@ -300,36 +761,60 @@ class PostedPapersTracker:
         except Exception as e:
             logger.warning(f"投稿済みデータ保存エラー: {e}")
 
-    def is_posted(self, arxiv_id: str) -> bool:
-        """この論文が過去30日以内に投稿済みかチェック"""
-        if arxiv_id not in self.posted['papers']:
+    def is_posted(self, arxiv_id: str, target: Optional[str] = None) -> bool:
+        """この論文が過去30日以内に投稿済みかチェック（targetを指定するとその投稿先について）"""
+        if target is None:
+            records = self.posted['papers']
+        else:
+            records = self.posted.setdefault('targets', {}).get(target, {})
+
+        if arxiv_id not in records:
             return False
 
         # 30日以上前の投稿は重複とみなさない
-        posted_date = datetime.fromisoformat(self.posted['papers'][arxiv_id])
-        if (datetime.now() - posted_date).days > 30:
+        posted_date = datetime.fromisoformat(records[arxiv_id])
+        if (clock.now() - posted_date).days > 30:
             return False
 
         return True
 
-    def mark_as_posted(self, arxiv_id: str):
-        """論文を投稿済みとしてマーク"""
-        self.posted['papers'][arxiv_id] = datetime.now().isoformat()
-        self.posted['last_date'] = datetime.now().strftime('%Y-%m-%d')
-        self._save_posted()
-        logger.info(f"投稿済みとしてマーク: {arxiv_id}")
+    def mark_as_posted(self, arxiv_id: str, target: Optional[str] = None):
+        """論文を投稿済みとしてマーク（targetを指定するとその投稿先にも記録）"""
+        with self._lock:
+            now = clock.now()
+            self.posted['papers'][arxiv_id] = now.isoformat()
+            if target is not None:
+                self.posted.setdefault('targets', {}).setdefault(target, {})[arxiv_id] = now.isoformat()
+            self.posted['last_date'] = now.strftime('%Y-%m-%d')
+            self._save_posted()
+        logger.info(f"投稿済みとしてマーク: {arxiv_id}" + (f" (投稿先 {target})" if target else ""))
 
-    def filter_new_papers(self, papers: List[Dict]) -> List[Dict]:
-        """投稿済みの論文をフィルタリングして、新規論文のみを返す"""
-        new_papers = []
-        skipped = 0
+    def iter_new_papers(self, papers: List[Dict], targets: Optional[List[str]] = None):
+        """
+        未投稿の論文を順に返すジェネレータ（必要な件数だけ取り出せば、残りは判定しない）
 
+        targetsを指定した場合は、いずれかの投稿先で未投稿の論文を返す
+        """
         for paper in papers:
-            if self.is_posted(paper['arxiv_id']):
-                logger.info(f"スキップ（投稿済み）: {paper['arxiv_id']}")
-                skipped += 1
+            if self.is_new(paper['arxiv_id'], targets):
+                yield paper
             else:
-                new_papers.append(paper)
+                logger.info(f"スキップ（投稿済み）: {paper['arxiv_id']}")
+
+    def is_new(self, arxiv_id: str, targets: Optional[List[str]] = None) -> bool:
+        """未投稿か（targetsを指定した場合は、いずれかの投稿先で未投稿か）"""
+        if targets is None:
+            return not self.is_posted(arxiv_id)
+        return not all(self.is_posted(arxiv_id, target) for target in targets)
+
+    def filter_new_papers(self, papers: List[Dict], targets: Optional[List[str]] = None) -> List[Dict]:
+        """
+        投稿済みの論文をフィルタリングして、新規論文のみを返す
+
+        targetsを指定した場合は、いずれかの投稿先で未投稿の論文を残す
+        """
+        new_papers = list(self.iter_new_papers(papers, targets))
+        skipped = len(papers) - len(new_papers)
 
         if skipped > 0:
             logger.info(f"{skipped}件の論文をスキップしました（過去30日以内に投稿済み）")
@@ -338,18 +823,19 @@ class PostedPapersTracker:
 
     def cleanup_old_entries(self, days: int = 60):
         """古いエントリを削除（60日以上前）"""
-        cutoff = datetime.now()
+        cutoff = clock.now()
         removed = 0
 
-        papers_to_remove = []
-        for arxiv_id, posted_date_str in self.posted['papers'].items():
-            posted_date = datetime.fromisoformat(posted_date_str)
-            if (cutoff - posted_date).days > days:
-                papers_to_remove.append(arxiv_id)
+        for records in [self.posted['papers']] + list(self.posted.setdefault('targets', {}).values()):
+            papers_to_remove = []
+            for arxiv_id, posted_date_str in records.items():
+                posted_date = datetime.fromisoformat(posted_date_str)
+                if (cutoff - posted_date).days > days:
+                    papers_to_remove.append(arxiv_id)
 
-        for arxiv_id in papers_to_remove:
-            del self.posted['papers'][arxiv_id]
-            removed += 1
+            for arxiv_id in papers_to_remove:
+                del records[arxiv_id]
+                removed += 1
 
         if removed > 0:
             self._save_posted()
@@ -360,189 +846,1043 @@ class PostedPapersTracker:
 posted_tracker = PostedPapersTracker()
 
 
-# ===== LaTeX→Unicode変換 =====
-def convert_latex_to_unicode(text: str) -> str:
+# ===== 投稿ジャーナル（再開可能な投稿） =====
+class PostingJournal:
     """
-    LaTeX記法をUnicode文字に変換する
-    例: $alpha$ -> α, $Z^2$ -> Z², $psi_0$ -> ψ₀
+    Scirate日付ごとの投稿ジャーナル
+
+    生成した要約と、投稿先ごとに確認できたメッセージ（?wait=true で取得したメッセージID）を
+    その都度記録する。同じ日付で再実行すると、未確認の論文から再開し、生成済みの要約を再利用する。
     """
-    # LaTeXコマンド→Unicode対応表
-    latex_to_unicode = {
-        # ギリシャ文字（小文字）
-        r'\alpha': 'α', r'\beta': 'β', r'\gamma': 'γ', r'\delta': 'δ',
-        r'\epsilon': 'ε', r'\varepsilon': 'ε', r'\zeta': 'ζ', r'\eta': 'η',
-        r'\theta': 'θ', r'\vartheta': 'ϑ', r'\iota': 'ι', r'\kappa': 'κ',
-        r'\lambda': 'λ', r'\mu': 'μ', r'\nu': 'ν', r'\xi': 'ξ',
-        r'\pi': 'π', r'\varpi': 'ϖ', r'\rho': 'ρ', r'\varrho': 'ϱ',
-        r'\sigma': 'σ', r'\varsigma': 'ς', r'\tau': 'τ', r'\upsilon': 'υ',
-        r'\phi': 'φ', r'\varphi': 'ϕ', r'\chi': 'χ', r'\psi': 'ψ', r'\omega': 'ω',
-        # ギリシャ文字（大文字）
-        r'\Gamma': 'Γ', r'\Delta': 'Δ', r'\Theta': 'Θ', r'\Lambda': 'Λ',
-        r'\Xi': 'Ξ', r'\Pi': 'Π', r'\Sigma': 'Σ', r'\Upsilon': 'Υ',
-        r'\Phi': 'Φ', r'\Psi': 'Ψ', r'\Omega': 'Ω',
-        # 数学記号
-        r'\times': '×', r'\div': '÷', r'\pm': '±', r'\mp': '∓',
-        r'\cdot': '·', r'\ast': '∗', r'\star': '☆',
-        r'\leq': '≤', r'\geq': '≥', r'\neq': '≠', r'\approx': '≈',
-        r'\equiv': '≡', r'\sim': '∼', r'\propto': '∝',
-        r'\infty': '∞', r'\partial': '∂', r'\nabla': '∇',
-        r'\sum': 'Σ', r'\prod': 'Π', r'\int': '∫',
-        r'\sqrt': '√', r'\hbar': 'ℏ', r'\ell': 'ℓ',
-        r'\rightarrow': '→', r'\leftarrow': '←', r'\leftrightarrow': '↔',
-        r'\Rightarrow': '⇒', r'\Leftarrow': '⇐', r'\Leftrightarrow': '⇔',
-        r'\uparrow': '↑', r'\downarrow': '↓',
-        r'\langle': '⟨', r'\rangle': '⟩',
-        r'\otimes': '⊗', r'\oplus': '⊕', r'\dagger': '†',
-        r'\in': '∈', r'\notin': '∉', r'\subset': '⊂', r'\supset': '⊃',
-        r'\cap': '∩', r'\cup': '∪', r'\forall': '∀', r'\exists': '∃',
-        # 特殊
-        r'\ket': '|⟩', r'\bra': '⟨|',
-    }
+    def __init__(self, date: str, journal_dir: Optional[Path] = None, tenant: str = DEFAULT_TENANT):
+        self.date = date
+        self.journal_dir = journal_dir or CACHE_DIR / "journal"
+        # 既定のテナントは従来のファイル名（テナントごとに順位・投稿先の記録が別）
+        suffix = "" if tenant == DEFAULT_TENANT else f".{tenant}"
+        self.journal_file = self.journal_dir / f"{date}{suffix}.json"
+        self.data = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict:
+        """ジャーナルを読み込み"""
+        if self.journal_file.exists():
+            try:
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"ジャーナル読み込みエラー: {e}")
+        return {'date': self.date, 'ranks': {}, 'summaries': {}, 'targets': {}}
 
-    # 上付き文字の対応表
-    superscript_map = {
-        '0': '⁰', '1': '¹', '2': '²', '3': '³', '4': '⁴',
-        '5': '⁵', '6': '⁶', '7': '⁷', '8': '⁸', '9': '⁹',
-        '+': '⁺', '-': '⁻', '=': '⁼', '(': '⁽', ')': '⁾',
-        'n': 'ⁿ', 'i': 'ⁱ',
-    }
+    def _save(self):
+        """ジャーナルを保存（途中で強制終了されても壊れないよう一時ファイル経由）"""
+        try:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.journal_file.with_name(self.journal_file.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.journal_file)
+        except Exception as e:
+            logger.warning(f"ジャーナル保存エラー: {e}")
+
+    def _target(self, target: str) -> Dict:
+        return self.data['targets'].setdefault(target, {'header_sent': False, 'acked': {}, 'messages': []})
+
+    def assign_ranks(self, arxiv_ids: List[str]) -> Dict[str, int]:
+        """ダイジェスト内の順位を確定（再開時も最初の実行の順位を使う）"""
+        with self._lock:
+            ranks = self.data['ranks']
+            for arxiv_id in arxiv_ids:
+                if arxiv_id not in ranks:
+                    ranks[arxiv_id] = len(ranks) + 1
+            self._save()
+            return dict(ranks)
+
+    def get_summary(self, arxiv_id: str) -> Optional[str]:
+        """生成済みの要約を取得"""
+        return self.data['summaries'].get(arxiv_id)
+
+    def record_summary(self, arxiv_id: str, summary: str):
+        """生成した要約を記録"""
+        with self._lock:
+            self.data['summaries'][arxiv_id] = summary
+            self._save()
+
+    def is_acknowledged(self, target: str, arxiv_id: str) -> bool:
+        """この投稿先でメッセージの受信が確認済みか"""
+        return arxiv_id in self.data['targets'].get(target, {}).get('acked', {})
+
+    def header_sent(self, target: str) -> bool:
+        """この投稿先にヘッダーを送信済みか"""
+        return self.data['targets'].get(target, {}).get('header_sent', False)
+
+    def record_message(self, target: str, message_id: Optional[str], arxiv_ids: List[str], has_header: bool):
+        """確認できたメッセージを記録"""
+        with self._lock:
+            entry = self._target(target)
+            entry['messages'].append({
+                'id': message_id,
+                'papers': arxiv_ids,
+                'posted_at': clock.now().isoformat(),
+            })
+            for arxiv_id in arxiv_ids:
+                entry['acked'][arxiv_id] = message_id
+            if has_header:
+                entry['header_sent'] = True
+            self._save()
+
+    @staticmethod
+    def cleanup(days: int = 14, journal_dir: Optional[Path] = None):
+        """古いジャーナルを削除"""
+        journal_dir = journal_dir or CACHE_DIR / "journal"
+        if not journal_dir.exists():
+            return
+        cutoff = (clock.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        for path in journal_dir.glob('*.json'):
+            if path.name[:10] < cutoff:
+                path.unlink()
 
-    # 下付き文字の対応表
-    subscript_map = {
-        '0': '₀', '1': '₁', '2': '₂', '3': '₃', '4': '₄',
-        '5': '₅', '6': '₆', '7': '₇', '8': '₈', '9': '₉',
-        '+': '₊', '-': '₋', '=': '₌', '(': '₍', ')': '₎',
-        'a': 'ₐ', 'e': 'ₑ', 'o': 'ₒ', 'x': 'ₓ',
-        'i': 'ᵢ', 'j': 'ⱼ', 'k': 'ₖ', 'n': 'ₙ', 'p': 'ₚ',
-    }
 
-    def convert_super_sub(match):
-        """上付き・下付き文字を変換"""
-        content = match.group(1)
-        is_super = match.group(0).startswith('^')
-        char_map = superscript_map if is_super else subscript_map
+# ===== scites履歴ストア =====
+class ScitesHistory:
+    """
+    Scirateの日次ランキングを列指向で蓄積するストア
 
-        # 中括弧を除去
-        content = content.strip('{}')
+    カテゴリごとに1ファイル（cache/history/<category>.npz）で、1行 = (arXiv ID, 掲載日, scites, 取得日)。
+    arXiv IDは整数（YYMM * 100000 + 番号）、日付は datetime64[D] で持ち、集計はnumpyでまとめて行う。
+    """
+    COLUMNS = ('ids', 'dates', 'scites', 'observed')
+
+    def __init__(self, history_dir: Optional[Path] = None):
+        self.history_dir = history_dir or CACHE_DIR / "history"
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def encode_id(arxiv_id: str) -> Optional[int]:
+        """新形式のarXiv ID（YYMM.NNNN / YYMM.NNNNN）を整数に変換（旧形式はNone）"""
+        match = re.match(r'^(\d{4})\.(\d{4,5})$', arxiv_id)
+        if not match:
+            return None
+        return int(match.group(1)) * 100000 + int(match.group(2))
+
+    @staticmethod
+    def decode_id(code: int) -> str:
+        """整数からarXiv IDに戻す（1501以降は番号5桁）"""
+        yymm, number = divmod(int(code), 100000)
+        return f"{yymm:04d}.{number:05d}" if yymm >= 1501 else f"{yymm:04d}.{number:04d}"
+
+    def _path(self, category: str) -> Path:
+        return self.history_dir / f"{category}.npz"
+
+    def load(self, category: str) -> Dict[str, np.ndarray]:
+        """カテゴリの全列と取得済みの掲載日（fetched）を読み込み"""
+        path = self._path(category)
+        if path.exists():
+            try:
+                with np.load(path) as data:
+                    return {name: data[name] for name in self.COLUMNS + ('fetched',)}
+            except Exception as e:
+                logger.warning(f"履歴の読み込みエラー ({category}): {e}")
+        return {
+            'ids': np.empty(0, dtype=np.int64),
+            'dates': np.empty(0, dtype='datetime64[D]'),
+            'scites': np.empty(0, dtype=np.int32),
+            'observed': np.empty(0, dtype='datetime64[D]'),
+            'fetched': np.empty(0, dtype='datetime64[D]'),
+        }
 
-        result = ''
-        for char in content:
-            result += char_map.get(char, char)
-        return result
+    def record(self, category: str, listing_date: str, papers: List[Dict]):
+        """1日分のランキング全体をスナップショットとして追記"""
+        codes = [(self.encode_id(p['arxiv_id']), p['scites']) for p in papers]
+        codes = [(code, scites) for code, scites in codes if code is not None]
+        day = np.datetime64(listing_date, 'D')
+        today = np.datetime64(clock.now().strftime('%Y-%m-%d'), 'D')
+
+        with self._lock:
+            data = self.load(category)
+            # 同じ日に取得し直した分は置き換える
+            keep = ~((data['dates'] == day) & (data['observed'] == today))
+            for name in self.COLUMNS:
+                data[name] = data[name][keep]
+            data['ids'] = np.concatenate([data['ids'], np.array([c for c, _ in codes], dtype=np.int64)])
+            data['dates'] = np.concatenate([data['dates'], np.full(len(codes), day)])
+            data['scites'] = np.concatenate([data['scites'], np.array([s for _, s in codes], dtype=np.int32)])
+            data['observed'] = np.concatenate([data['observed'], np.full(len(codes), today)])
+            data['fetched'] = np.union1d(data['fetched'], np.array([day]))
 
-    # \mathcal{X} → Unicode数学筆記体
-    mathcal_map = {
-        'A': '𝒜', 'B': 'ℬ', 'C': '𝒞', 'D': '𝒟', 'E': 'ℰ', 'F': 'ℱ',
-        'G': '𝒢', 'H': 'ℋ', 'I': 'ℐ', 'J': '𝒥', 'K': '𝒦', 'L': 'ℒ',
-        'M': 'ℳ', 'N': '𝒩', 'O': '𝒪', 'P': '𝒫', 'Q': '𝒬', 'R': 'ℛ',
-        'S': '𝒮', 'T': '𝒯', 'U': '𝒰', 'V': '𝒱', 'W': '𝒲', 'X': '𝒳',
-        'Y': '𝒴', 'Z': '𝒵',
-    }
+            try:
+                self.history_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = self._path(category).with_name(f"{category}.npz.tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.savez_compressed(f, **data)
+                os.replace(tmp_path, self._path(category))
+            except Exception as e:
+                logger.warning(f"履歴の保存エラー ({category}): {e}")
+
+    def missing_dates(self, category: str, dates: List[str]) -> List[str]:
+        """まだ取得していない掲載日"""
+        fetched = self.load(category)['fetched']
+        wanted = np.array(dates, dtype='datetime64[D]')
+        return [str(day) for day in wanted[~np.isin(wanted, fetched)]]
+
+    def top(self, category: str, start: str, end: str, n: int) -> List[Dict]:
+        """
+        掲載日が期間内の論文を、観測した最大のscites順に上位n件
+
+        Returns:
+            [{'arxiv_id', 'scites', 'date'}, ...]
+        """
+        data = self.load(category)
+        mask = (data['dates'] >= np.datetime64(start, 'D')) & (data['dates'] <= np.datetime64(end, 'D'))
+        ids, scites, dates = data['ids'][mask], data['scites'][mask], data['dates'][mask]
+        if ids.size == 0:
+            return []
 
-    # \mathbb{X} → Unicode黒板太字
-    mathbb_map = {
-        'A': '𝔸', 'B': '𝔹', 'C': 'ℂ', 'D': '𝔻', 'E': '𝔼', 'F': '𝔽',
-        'G': '𝔾', 'H': 'ℍ', 'I': '𝕀', 'J': '𝕁', 'K': '𝕂', 'L': '𝕃',
-        'M': '𝕄', 'N': 'ℕ', 'O': '𝕆', 'P': 'ℙ', 'Q': 'ℚ', 'R': 'ℝ',
-        'S': '𝕊', 'T': '𝕋', 'U': '𝕌', 'V': '𝕍', 'W': '𝕎', 'X': '𝕏',
-        'Y': '𝕐', 'Z': 'ℤ',
-    }
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        best = np.zeros(unique_ids.size, dtype=np.int64)
+        np.maximum.at(best, inverse, scites)
+        first_date = np.full(unique_ids.size, np.datetime64('9999-12-31', 'D'))
+        np.minimum.at(first_date, inverse, dates)
+
+        order = np.lexsort((unique_ids, -best))[:n]
+        return [
+            {'arxiv_id': self.decode_id(unique_ids[i]), 'scites': int(best[i]), 'date': str(first_date[i])}
+            for i in order
+        ]
+
+
+# グローバル履歴ストア
+scites_history = ScitesHistory()
+
+
+# ===== 全文検索インデックス =====
+SEARCH_RECENCY_DAYS = 180  # 経過日数がこの日数で関連度スコアが半分になる
+
+
+class SearchIndex:
+    """
+    投稿済み論文の全文検索インデックス（SQLite FTS5, cache/search.db）
+
+    タイトル・著者・アブストラクト・要約を索引し、投稿のたびに追加する。
+    日本語の要約も部分一致で引けるよう trigram トークナイザを使う（使えない環境では unicode61）。
+    trigram では2文字以下の語（「量子」など）は索引を引けないため、その語だけ LIKE で絞り込む。
+    """
+    WEIGHTS = (10.0, 5.0, 1.0, 2.0)  # title, authors, abstract, summary
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or CACHE_DIR / "search.db"
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """接続を開き、必要ならテーブルを作成"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "id INTEGER PRIMARY KEY, arxiv_id TEXT UNIQUE NOT NULL, title TEXT, authors TEXT, "
+            "abstract TEXT, summaries TEXT, category TEXT, posted_date TEXT)"
+        )
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+                         "title, authors, abstract, summary, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+                         "title, authors, abstract, summary)")
+        return conn
+
+    @staticmethod
+    def _uses_trigram(conn: sqlite3.Connection) -> bool:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'papers_fts'").fetchone()
+        return bool(row) and 'trigram' in row[0]
+
+    def add(self, papers: List[Dict], summaries: Dict[str, str], language: str = SUMMARY_LANGUAGE,
+            category: str = ARXIV_CATEGORY, posted_date: Optional[str] = None) -> int:
+        """
+        投稿した論文を索引に追加（既にあれば要約の言語を追加して更新、投稿日は最初のものを残す）
+
+        Returns:
+            追加・更新した件数
+        """
+        posted_date = posted_date or clock.now().strftime('%Y-%m-%d')
+        with self._lock, closing(self._connect()) as conn, conn:
+            for paper in papers:
+                arxiv_id = paper['arxiv_id']
+                row = conn.execute("SELECT summaries FROM papers WHERE arxiv_id = ?", (arxiv_id,)).fetchone()
+                paper_summaries = json.loads(row[0]) if row and row[0] else {}
+                if summaries.get(arxiv_id):
+                    paper_summaries[language] = summaries[arxiv_id]
+                authors = ", ".join(paper.get('authors') or [])
+                conn.execute(
+                    "INSERT INTO papers (arxiv_id, title, authors, abstract, summaries, category, posted_date) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(arxiv_id) DO UPDATE SET "
+                    "title = excluded.title, authors = excluded.authors, abstract = excluded.abstract, "
+                    "summaries = excluded.summaries",
+                    (arxiv_id, paper.get('title', ''), authors, paper.get('abstract', ''),
+                     json.dumps(paper_summaries, ensure_ascii=False), category, posted_date)
+                )
+                rowid = conn.execute("SELECT id FROM papers WHERE arxiv_id = ?", (arxiv_id,)).fetchone()[0]
+                conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (rowid,))
+                conn.execute(
+                    "INSERT INTO papers_fts (rowid, title, authors, abstract, summary) VALUES (?, ?, ?, ?, ?)",
+                    (rowid, paper.get('title', ''), authors, paper.get('abstract', ''),
+                     "\n".join(paper_summaries.values()))
+                )
+        return len(papers)
+
+    def search(self, query: str, limit: int = 10, today: Optional[str] = None) -> List[Dict]:
+        """
+        関連度（bm25）と新しさで順位付けして検索
+
+        語はスペース区切りのAND。各語はフレーズとして扱うため、記号（surface-code 等）もそのまま書ける。
+
+        Returns:
+            [{'arxiv_id', 'title', 'authors', 'category', 'posted_date', 'snippet'}, ...]
+        """
+        terms = query.split()
+        if not terms or not self.db_path.exists():
+            return []
+        today = today or clock.now().strftime('%Y-%m-%d')
+
+        with closing(self._connect()) as conn:
+            short_limit = 3 if self._uses_trigram(conn) else 0
+            match_terms = [t for t in terms if len(t) >= short_limit]
+            like_terms = [t for t in terms if len(t) < short_limit]
+
+            conditions, params = [], []
+            for term in like_terms:
+                pattern = '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+                conditions.append("(" + " OR ".join(f"p.{column} LIKE ? ESCAPE '\\'"
+                                                     for column in ('summaries', 'title', 'abstract', 'authors')) + ")")
+                params.extend([pattern] * 4)
+
+            columns = "p.id, p.arxiv_id, p.title, p.authors, p.category, p.posted_date"
+            if match_terms:
+                # 順位付けは bm25 だけで行い、スニペットは上位の行についてのみ作る
+                match = " ".join('"' + t.replace('"', '""') + '"' for t in match_terms)
+                weights = ", ".join(str(w) for w in self.WEIGHTS)
+                sql = (
+                    f"WITH hits AS (SELECT rowid, bm25(papers_fts, {weights}) AS score "
+                    f"FROM papers_fts WHERE papers_fts MATCH ?) "
+                    f"SELECT {columns} FROM hits JOIN papers p ON p.id = hits.rowid "
+                    f"{'WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+                    f"ORDER BY hits.score / (1.0 + max(julianday(?) - julianday(p.posted_date), 0) / ?) LIMIT ?"
+                )
+                rows = conn.execute(sql, [match] + params + [today, SEARCH_RECENCY_DAYS, limit]).fetchall()
+                rowids = [row[0] for row in rows]
+                snippets = dict(conn.execute(
+                    f"SELECT rowid, snippet(papers_fts, -1, '**', '**', '…', 16) FROM papers_fts "
+                    f"WHERE papers_fts MATCH ? AND rowid IN ({', '.join('?' * len(rowids))})",
+                    [match] + rowids
+                ).fetchall()) if rowids else {}
+            else:
+                sql = (f"SELECT {columns} FROM papers p WHERE {' AND '.join(conditions)} "
+                       f"ORDER BY p.posted_date DESC LIMIT ?")
+                rows = conn.execute(sql, params + [limit]).fetchall()
+                snippets = {}
+
+        return [
+            {'arxiv_id': row[1], 'title': row[2], 'authors': row[3], 'category': row[4],
+             'posted_date': row[5], 'snippet': snippets.get(row[0])}
+            for row in rows
+        ]
+
+    def recent(self, days: int, today: Optional[str] = None) -> List[Dict]:
+        """
+        直近days日に投稿した論文
+
+        Returns:
+            [{'arxiv_id', 'title', 'abstract', 'posted_date'}, ...]
+        """
+        if not self.db_path.exists():
+            return []
+        today = today or clock.now().strftime('%Y-%m-%d')
+        since = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT arxiv_id, title, abstract, posted_date FROM papers "
+                                "WHERE posted_date >= ? ORDER BY posted_date DESC", (since,)).fetchall()
+        return [{'arxiv_id': row[0], 'title': row[1], 'abstract': row[2], 'posted_date': row[3]} for row in rows]
+
+
+# グローバル検索インデックス
+search_index = SearchIndex()
 
-    def convert_mathfont(match, char_map):
-        """数学フォントコマンドを変換"""
-        content = match.group(1)
-        return ''.join(char_map.get(c, c) for c in content)
 
-    def process_latex_content(latex_str):
-        """LaTeX内容を処理"""
-        result = latex_str
+def format_search_results(results: List[Dict]) -> str:
+    """検索結果をCLI表示用に整形"""
+    if not results:
+        return "該当する論文はありません"
+    lines = []
+    for i, result in enumerate(results, 1):
+        lines.append(f"{i}. [{result['posted_date']}] {result['arxiv_id']} {result['title']}")
+        if result['authors']:
+            lines.append(f"   {_truncate(result['authors'], 100)}")
+        if result['snippet']:
+            lines.append(f"   {' '.join(result['snippet'].split())}")
+        lines.append(f"   https://arxiv.org/abs/{result['arxiv_id']}")
+    return "\n".join(lines)
 
-        # LaTeXコマンドを変換
-        for latex_cmd, unicode_char in latex_to_unicode.items():
-            result = result.replace(latex_cmd, unicode_char)
 
-        # \mathcal{...} → Unicode筆記体
-        result = re.sub(r'\\mathcal{([^}]+)}', lambda m: convert_mathfont(m, mathcal_map), result)
+# ===== 状態スナップショット（エクスポート/インポート） =====
+STATE_BUNDLE_FORMAT = "scirate-state"
+STATE_BUNDLE_VERSION = 1
+STATE_BUNDLE_NAME = "scirate_state.tar.gz"
+STATE_MANIFEST_NAME = "manifest.json"
+
+
+def export_state_bundle(cache_dir: Path = CACHE_DIR) -> bytes:
+    """
+    キャッシュディレクトリ内の全状態ファイルを1つの圧縮バンドル（tar.gz）にまとめる
+
+    バンドルにはバージョン付きのマニフェスト（ファイル一覧とSHA-256）を含める
+    """
+    files = {}
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz', compresslevel=6) as tar:
+        if cache_dir.exists():
+            for path in sorted(cache_dir.rglob('*')):
+                if not path.is_file() or path.suffix == '.tmp':
+                    continue
+                rel_path = path.relative_to(cache_dir).as_posix()
+                data = path.read_bytes()
+                files[rel_path] = {
+                    'size': len(data),
+                    'sha256': hashlib.sha256(data).hexdigest(),
+                }
+                info = tarfile.TarInfo(name=f"state/{rel_path}")
+                info.size = len(data)
+                info.mtime = int(path.stat().st_mtime)
+                tar.addfile(info, io.BytesIO(data))
+
+        manifest = json.dumps({
+            'format': STATE_BUNDLE_FORMAT,
+            'version': STATE_BUNDLE_VERSION,
+            'created_at': clock.now().isoformat(),
+            'files': files,
+        }, ensure_ascii=False, indent=2).encode('utf-8')
+        info = tarfile.TarInfo(name=STATE_MANIFEST_NAME)
+        info.size = len(manifest)
+        info.mtime = int(clock.time())
+        tar.addfile(info, io.BytesIO(manifest))
+
+    return buffer.getvalue()
+
+
+def import_state_bundle(data: bytes, cache_dir: Path = CACHE_DIR) -> int:
+    """
+    状態バンドルをキャッシュディレクトリに展開する
 
-        # \mathbb{...} → Unicode黒板太字
-        result = re.sub(r'\\mathbb{([^}]+)}', lambda m: convert_mathfont(m, mathbb_map), result)
+    Returns:
+        復元したファイル数
 
-        # \widetilde{...} / \tilde{...} → x̃ (チルダ結合文字)
-        result = re.sub(r'\\(?:widetilde|tilde){([^}]+)}', lambda m: m.group(1) + '\u0303', result)
+    Raises:
+        ValueError: バンドルの形式・バージョン・チェックサムが不正な場合
+    """
+    try:
+        tar = tarfile.open(fileobj=io.BytesIO(data), mode='r:gz')
+    except (tarfile.TarError, OSError) as e:
+        raise ValueError(f"状態バンドルを開けません: {e}")
+
+    with tar:
+        members = {m.name: m for m in tar.getmembers() if m.isfile()}
+        if STATE_MANIFEST_NAME not in members:
+            raise ValueError("状態バンドルにマニフェストがありません")
+
+        manifest = json.loads(tar.extractfile(members[STATE_MANIFEST_NAME]).read().decode('utf-8'))
+        if manifest.get('format') != STATE_BUNDLE_FORMAT:
+            raise ValueError(f"未知のバンドル形式です: {manifest.get('format')}")
+        if manifest.get('version', 0) > STATE_BUNDLE_VERSION:
+            raise ValueError(
+                f"バンドルのバージョン {manifest.get('version')} はサポート外です"
+                f"（対応: {STATE_BUNDLE_VERSION}以下）"
+            )
 
-        # \hat{...} → x̂ (ハット結合文字)
-        result = re.sub(r'\\hat{([^}]+)}', lambda m: m.group(1) + '\u0302', result)
+        # 先に全ファイルを検証してから書き込む（中途半端な復元を防ぐ）
+        contents = {}
+        root = cache_dir.resolve()
+        for rel_path, meta in manifest.get('files', {}).items():
+            target = (cache_dir / rel_path).resolve()
+            if root != target and root not in target.parents:
+                raise ValueError(f"不正なパスを含むバンドルです: {rel_path}")
+            member = members.get(f"state/{rel_path}")
+            if member is None:
+                raise ValueError(f"バンドルにファイルがありません: {rel_path}")
+            file_data = tar.extractfile(member).read()
+            if hashlib.sha256(file_data).hexdigest() != meta.get('sha256'):
+                raise ValueError(f"チェックサムが一致しません: {rel_path}")
+            contents[target] = file_data
+
+    for target, file_data in contents.items():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + '.tmp')
+        tmp_path.write_bytes(file_data)
+        os.replace(tmp_path, target)
+
+    return len(contents)
+
+
+def reload_state():
+    """ディスク上の状態をグローバルインスタンスに再読み込み"""
+    summary_cache.cache = summary_cache._load_cache()
+    usage_tracker.usage = usage_tracker._load_usage()
+    posted_tracker.posted = posted_tracker._load_posted()
+
+
+class StateBackend:
+    """
+    状態バンドルの保存先の基底クラス
+    """
+    def load(self) -> Optional[bytes]:
+        """バンドルを読み込み（存在しなければNone）"""
+        raise NotImplementedError
 
-        # \bar{...} / \overline{...} → x̄ (バー結合文字)
-        result = re.sub(r'\\(?:bar|overline){([^}]+)}', lambda m: m.group(1) + '\u0304', result)
+    def save(self, data: bytes):
+        """バンドルを保存"""
+        raise NotImplementedError
 
-        # \vec{...} → x⃗ (ベクトル結合文字)
-        result = re.sub(r'\\vec{([^}]+)}', lambda m: m.group(1) + '\u20D7', result)
 
-        # \dot{...} → ẋ (ドット結合文字)
-        result = re.sub(r'\\dot{([^}]+)}', lambda m: m.group(1) + '\u0307', result)
+class LocalDirStateBackend(StateBackend):
+    """
+    ローカルディレクトリ（マウントしたボリュームなど）に保存するバックエンド
+    """
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.bundle_file = self.directory / STATE_BUNDLE_NAME
 
-        # \mathbf{...} / \boldsymbol{...} → そのまま（Unicodeボールド省略）
-        result = re.sub(r'\\(?:mathbf|boldsymbol){([^}]+)}', r'\1', result)
+    def load(self) -> Optional[bytes]:
+        if not self.bundle_file.exists():
+            return None
+        return self.bundle_file.read_bytes()
 
-        # 上付き文字: ^{...} または ^x
-        result = re.sub(r'\^{([^}]+)}', convert_super_sub, result)
-        result = re.sub(r'\^([0-9a-zA-Z])', convert_super_sub, result)
+    def save(self, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.bundle_file.with_name(self.bundle_file.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self.bundle_file)
 
-        # 下付き文字: _{...} または _x
-        result = re.sub(r'_{([^}]+)}', convert_super_sub, result)
-        result = re.sub(r'_([0-9a-zA-Z])', convert_super_sub, result)
+    def __repr__(self):
+        return f"LocalDirStateBackend({self.directory})"
 
-        # \frac{a}{b} → a/b
-        result = re.sub(r'\\frac{([^}]+)}{([^}]+)}', r'\1/\2', result)
 
-        # \sqrt{x} → √x
-        result = re.sub(r'\\sqrt{([^}]+)}', r'√\1', result)
+class S3StateBackend(StateBackend):
+    """
+    S3互換オブジェクトストレージに保存するバックエンド（AWS S3 / R2 / MinIO など）
 
-        # \text{...} → ...
-        result = re.sub(r'\\text{([^}]+)}', r'\1', result)
+    署名はAWS Signature Version 4をrequestsで直接生成する（パス形式のURLを使用）
+    """
+    def __init__(self, bucket: str, key: str, endpoint_url: str = "", region: str = "",
+                 access_key: str = "", secret_key: str = ""):
+        self.bucket = bucket
+        self.key = key
+        self.region = region or os.environ.get('AWS_REGION', 'us-east-1')
+        self.endpoint_url = (
+            endpoint_url or os.environ.get('S3_ENDPOINT_URL', '')
+            or f"https://s3.{self.region}.amazonaws.com"
+        ).rstrip('/')
+        self.access_key = access_key or os.environ.get('AWS_ACCESS_KEY_ID', '')
+        self.secret_key = secret_key or os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+
+    @property
+    def object_url(self) -> str:
+        return f"{self.endpoint_url}/{quote(self.bucket)}/{quote(self.key)}"
+
+    def _sign_headers(self, method: str, url: str, payload: bytes) -> Dict[str, str]:
+        """SigV4の署名ヘッダーを生成"""
+        now = datetime.now(timezone.utc)  # 署名はサーバーと比較されるため、仮想時計ではなく実時刻
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = now.strftime('%Y%m%d')
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        parsed = urlparse(url)
+
+        canonical_headers = (
+            f"host:{parsed.netloc}\n"
+            f"x-amz-content-sha256:{payload_hash}\n"
+            f"x-amz-date:{amz_date}\n"
+        )
+        signed_headers = "host;x-amz-content-sha256;x-amz-date"
+        canonical_request = "\n".join([
+            method, parsed.path or '/', parsed.query, canonical_headers, signed_headers, payload_hash
+        ])
+
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+        ])
+
+        signing_key = ("AWS4" + self.secret_key).encode('utf-8')
+        for part in (datestamp, self.region, 's3', 'aws4_request'):
+            signing_key = hmac.new(signing_key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
 
-        # \mathrm{...} → ...
-        result = re.sub(r'\\mathrm{([^}]+)}', r'\1', result)
+        return {
+            'x-amz-date': amz_date,
+            'x-amz-content-sha256': payload_hash,
+            'Authorization': (
+                f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                f"SignedHeaders={signed_headers}, Signature={signature}"
+            ),
+        }
 
-        # 残った中括弧を除去
-        result = result.replace('{', '').replace('}', '')
+    def load(self) -> Optional[bytes]:
+        url = self.object_url
+        response = http_session.get(url, headers=self._sign_headers('GET', url, b''), timeout=30)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise IOError(f"S3からの取得に失敗 (status: {response.status_code})")
+        return response.content
 
-        # 残ったバックスラッシュを除去
-        result = re.sub(r'\\([a-zA-Z]+)', r'\1', result)
+    def save(self, data: bytes):
+        url = self.object_url
+        headers = self._sign_headers('PUT', url, data)
+        headers['Content-Type'] = 'application/gzip'
+        response = http_session.put(url, data=data, headers=headers, timeout=30)
+        if response.status_code not in (200, 201, 204):
+            raise IOError(f"S3への保存に失敗 (status: {response.status_code})")
 
-        return result.strip()
+    def __repr__(self):
+        return f"S3StateBackend({self.endpoint_url}/{self.bucket}/{self.key})"
 
-    # $...$ 形式のLaTeX数式を変換
-    result = re.sub(r'\$([^$]+)\$', lambda m: process_latex_content(m.group(1)), text)
 
-    # \(...\) 形式のLaTeX数式を変換
-    result = re.sub(r'\\\(([^)]+)\\\)', lambda m: process_latex_content(m.group(1)), result)
+def get_state_backend(spec: str) -> Optional[StateBackend]:
+    """
+    バックエンド指定文字列からバックエンドを生成
 
-    # \[...\] 形式のLaTeX数式を変換
-    result = re.sub(r'\\\[([^\]]+)\\\]', lambda m: process_latex_content(m.group(1)), result)
+    "dir:/path" またはパス → ローカル、"s3://bucket/prefix" → S3互換
+    """
+    if not spec:
+        return None
+    if spec.startswith('s3://'):
+        parsed = urlparse(spec)
+        prefix = parsed.path.strip('/')
+        key = f"{prefix}/{STATE_BUNDLE_NAME}" if prefix else STATE_BUNDLE_NAME
+        return S3StateBackend(bucket=parsed.netloc, key=key)
+    if spec.startswith('dir:'):
+        spec = spec[len('dir:'):]
+    return LocalDirStateBackend(Path(spec))
+
+
+def restore_state(backend: StateBackend) -> bool:
+    """バックエンドから状態を復元（起動時に呼ぶ）"""
+    start = clock.monotonic()
+    try:
+        data = backend.load()
+    except Exception as e:
+        logger.warning(f"状態の取得に失敗: {e}")
+        return False
 
-    return result
+    if data is None:
+        logger.info(f"保存済みの状態がありません（{backend}）")
+        return False
+
+    try:
+        count = import_state_bundle(data)
+    except ValueError as e:
+        logger.warning(f"状態の復元に失敗: {e}")
+        return False
+
+    reload_state()
+    logger.info(f"状態を復元しました: {count}ファイル, {len(data) / 1024:.1f}KB, {clock.monotonic() - start:.3f}秒")
+    return True
+
+
+def persist_state(backend: StateBackend) -> bool:
+    """現在の状態をバックエンドに保存（終了時に呼ぶ）"""
+    try:
+        data = export_state_bundle()
+        backend.save(data)
+    except Exception as e:
+        logger.warning(f"状態の保存に失敗: {e}")
+        return False
+    logger.info(f"状態を保存しました: {len(data) / 1024:.1f}KB → {backend}")
+    return True
+
+
+# ===== LaTeX→Unicode変換 =====
+# 対応表はインポート時に1回だけ構築する
+
+# LaTeXコマンド→Unicode対応表
+LATEX_SYMBOLS = {
+    # ギリシャ文字（小文字）
+    'alpha': 'α', 'beta': 'β', 'gamma': 'γ', 'delta': 'δ',
+    'epsilon': 'ε', 'varepsilon': 'ε', 'zeta': 'ζ', 'eta': 'η',
+    'theta': 'θ', 'vartheta': 'ϑ', 'iota': 'ι', 'kappa': 'κ',
+    'lambda': 'λ', 'mu': 'μ', 'nu': 'ν', 'xi': 'ξ',
+    'pi': 'π', 'varpi': 'ϖ', 'rho': 'ρ', 'varrho': 'ϱ',
+    'sigma': 'σ', 'varsigma': 'ς', 'tau': 'τ', 'upsilon': 'υ',
+    'phi': 'φ', 'varphi': 'ϕ', 'chi': 'χ', 'psi': 'ψ', 'omega': 'ω',
+    # ギリシャ文字（大文字）
+    'Gamma': 'Γ', 'Delta': 'Δ', 'Theta': 'Θ', 'Lambda': 'Λ',
+    'Xi': 'Ξ', 'Pi': 'Π', 'Sigma': 'Σ', 'Upsilon': 'Υ',
+    'Phi': 'Φ', 'Psi': 'Ψ', 'Omega': 'Ω',
+    # 数学記号
+    'times': '×', 'div': '÷', 'pm': '±', 'mp': '∓',
+    'cdot': '·', 'ast': '∗', 'star': '☆',
+    'leq': '≤', 'le': '≤', 'geq': '≥', 'ge': '≥', 'neq': '≠', 'ne': '≠', 'approx': '≈',
+    'equiv': '≡', 'sim': '∼', 'simeq': '≃', 'propto': '∝', 'll': '≪', 'gg': '≫',
+    'infty': '∞', 'partial': '∂', 'nabla': '∇',
+    'sum': 'Σ', 'prod': 'Π', 'int': '∫',
+    'hbar': 'ℏ', 'ell': 'ℓ',
+    'rightarrow': '→', 'to': '→', 'leftarrow': '←', 'leftrightarrow': '↔', 'mapsto': '↦',
+    'Rightarrow': '⇒', 'Leftarrow': '⇐', 'Leftrightarrow': '⇔',
+    'uparrow': '↑', 'downarrow': '↓',
+    'langle': '⟨', 'rangle': '⟩',
+    'otimes': '⊗', 'oplus': '⊕', 'dagger': '†',
+    'in': '∈', 'notin': '∉', 'subset': '⊂', 'supset': '⊃', 'subseteq': '⊆', 'supseteq': '⊇',
+    'cap': '∩', 'cup': '∪', 'forall': '∀', 'exists': '∃',
+    'ldots': '…', 'cdots': '⋯', 'dots': '…',
+}
+
+# 上付き文字の対応表
+SUPERSCRIPT_MAP = {
+    '0': '⁰', '1': '¹', '2': '²', '3': '³', '4': '⁴',
+    '5': '⁵', '6': '⁶', '7': '⁷', '8': '⁸', '9': '⁹',
+    '+': '⁺', '-': '⁻', '=': '⁼', '(': '⁽', ')': '⁾',
+    'n': 'ⁿ', 'i': 'ⁱ',
+}
+
+# 下付き文字の対応表
+SUBSCRIPT_MAP = {
+    '0': '₀', '1': '₁', '2': '₂', '3': '₃', '4': '₄',
+    '5': '₅', '6': '₆', '7': '₇', '8': '₈', '9': '₉',
+    '+': '₊', '-': '₋', '=': '₌', '(': '₍', ')': '₎',
+    'a': 'ₐ', 'e': 'ₑ', 'o': 'ₒ', 'x': 'ₓ',
+    'i': 'ᵢ', 'j': 'ⱼ', 'k': 'ₖ', 'n': 'ₙ', 'p': 'ₚ',
+}
+
+# \mathcal{X} → Unicode数学筆記体
+MATHCAL_MAP = {
+    'A': '𝒜', 'B': 'ℬ', 'C': '𝒞', 'D': '𝒟', 'E': 'ℰ', 'F': 'ℱ',
+    'G': '𝒢', 'H': 'ℋ', 'I': 'ℐ', 'J': '𝒥', 'K': '𝒦', 'L': 'ℒ',
+    'M': 'ℳ', 'N': '𝒩', 'O': '𝒪', 'P': '𝒫', 'Q': '𝒬', 'R': 'ℛ',
+    'S': '𝒮', 'T': '𝒯', 'U': '𝒰', 'V': '𝒱', 'W': '𝒲', 'X': '𝒳',
+    'Y': '𝒴', 'Z': '𝒵',
+}
+
+# \mathbb{X} → Unicode黒板太字
+MATHBB_MAP = {
+    'A': '𝔸', 'B': '𝔹', 'C': 'ℂ', 'D': '𝔻', 'E': '𝔼', 'F': '𝔽',
+    'G': '𝔾', 'H': 'ℍ', 'I': '𝕀', 'J': '𝕁', 'K': '𝕂', 'L': '𝕃',
+    'M': '𝕄', 'N': 'ℕ', 'O': '𝕆', 'P': 'ℙ', 'Q': 'ℚ', 'R': 'ℝ',
+    'S': '𝕊', 'T': '𝕋', 'U': '𝕌', 'V': '𝕍', 'W': '𝕎', 'X': '𝕏',
+    'Y': '𝕐', 'Z': 'ℤ',
+}
+
+# 引数に結合文字を付けるコマンド（\hat{H} → Ĥ など）
+LATEX_ACCENTS = {
+    'tilde': '\u0303', 'widetilde': '\u0303',
+    'hat': '\u0302', 'widehat': '\u0302',
+    'bar': '\u0304', 'overline': '\u0304',
+    'vec': '\u20D7',
+    'dot': '\u0307', 'ddot': '\u0308',
+}
+
+# 引数をそのまま出力するコマンド（Unicodeボールド等は省略）
+LATEX_PASSTHROUGH = {
+    'mathbf', 'boldsymbol', 'text', 'textrm', 'textit', 'textbf',
+    'mathrm', 'mathit', 'mathsf', 'mathtt', 'operatorname',
+}
+
+# 記号1文字のエスケープ（\, \% など）
+LATEX_ESCAPES = {
+    ',': ' ', ';': ' ', ':': ' ', ' ': ' ', '!': '', '\\': ' ', '|': '‖',
+}
+
+
+class LatexTranslator:
+    """
+    テキスト中のLaTeX数式をUnicodeに変換するトランスレータ
+
+    数式区間ごとに左から右へ1回だけ走査し、コマンド名は最長一致（\\infty を \\in と誤認しない）で
+    対応表を引く。正規表現と対応表はインスタンス生成時に1回だけ構築する。
+    """
+    # $$...$$ / $...$ / \(...\) / \[...\]
+    # $...$ は開きの直後・閉じの直前が空白でなく、閉じの直後が数字でないものだけ（"cost $5 and $10" は通貨）
+    MATH_SPAN_RE = re.compile(
+        r'\$\$(.+?)\$\$|\$(?!\s)([^$]+)(?<!\s)\$(?!\d)|\\\((.+?)\\\)|\\\[(.+?)\\\]', re.DOTALL)
+    # 数式内のトークン: コマンド名 / 記号エスケープ / 上付き・下付き・中括弧
+    TOKEN_RE = re.compile(r'\\([a-zA-Z]+)|\\(.)|([\^_{}])', re.DOTALL)
+
+    def __init__(self):
+        self.symbols = dict(LATEX_SYMBOLS)
+        self.superscript_table = str.maketrans(SUPERSCRIPT_MAP)
+        self.subscript_table = str.maketrans(SUBSCRIPT_MAP)
+        self.font_tables = {
+            'mathcal': str.maketrans(MATHCAL_MAP),
+            'mathbb': str.maketrans(MATHBB_MAP),
+        }
+
+    def convert(self, text: str) -> str:
+        """テキスト中の全ての数式区間を変換"""
+        if not text or ('$' not in text and '\\' not in text):
+            return text
+        return self.MATH_SPAN_RE.sub(self._convert_span, text)
+
+    def _convert_span(self, match) -> str:
+        return self.translate_math(match.group(match.lastindex)).strip()
+
+    def translate_math(self, latex_str: str) -> str:
+        """数式区間の中身（$や\\(を除いた部分）を変換"""
+        result, _ = self._parse(latex_str, 0, in_group=False)
+        return result
+
+    def _parse(self, s: str, pos: int, in_group: bool):
+        """posから走査し、(変換結果, 終了位置) を返す。in_groupなら対応する}で止まる"""
+        out = []
+        n = len(s)
+        while pos < n:
+            m = self.TOKEN_RE.search(s, pos)
+            if m is None:
+                out.append(s[pos:])
+                pos = n
+                break
+            out.append(s[pos:m.start()])
+            pos = m.end()
+            command, escaped, char = m.groups()
+
+            if command is not None:
+                text, pos = self._command(command, s, pos)
+                out.append(text)
+            elif escaped is not None:
+                out.append(LATEX_ESCAPES.get(escaped, escaped))
+            elif char == '{':
+                text, pos = self._parse(s, pos, in_group=True)
+                out.append(text)
+            elif char == '}':
+                if in_group:
+                    return ''.join(out), pos
+                # 対応しない閉じ括弧は除去
+            else:
+                arg, pos = self._argument(s, pos)
+                if arg is None:
+                    out.append(char)
+                else:
+                    table = self.superscript_table if char == '^' else self.subscript_table
+                    out.append(arg.translate(table))
+        return ''.join(out), pos
+
+    def _group(self, s: str, pos: int):
+        """{...} 形式の引数を読む（無ければ (None, pos)）"""
+        start = pos
+        while pos < len(s) and s[pos] == ' ':
+            pos += 1
+        if pos < len(s) and s[pos] == '{':
+            return self._parse(s, pos + 1, in_group=True)
+        return None, start
+
+    def _argument(self, s: str, pos: int):
+        """上付き・下付きの引数を読む: {...} / \\command / 英数字1文字"""
+        if pos >= len(s):
+            return None, pos
+        if s[pos] == '{':
+            return self._parse(s, pos + 1, in_group=True)
+        if s[pos] == '\\':
+            m = self.TOKEN_RE.match(s, pos)
+            if m and m.group(1) is not None:
+                return self._command(m.group(1), s, m.end())
+            return None, pos
+        if s[pos].isascii() and s[pos].isalnum():
+            return s[pos], pos + 1
+        return None, pos
+
+    def _frac_argument(self, s: str, pos: int):
+        """\\frac の引数を読む: {...} か、中括弧なしの1トークン（\\frac12 → 1 と 2）"""
+        while pos < len(s) and s[pos] == ' ':
+            pos += 1
+        return self._argument(s, pos)
+
+    def _command(self, name: str, s: str, pos: int):
+        """コマンド1つを変換し、(変換結果, 終了位置) を返す"""
+        symbol = self.symbols.get(name)
+        if symbol is not None:
+            return symbol, pos
+
+        if name in self.font_tables:
+            arg, pos = self._group(s, pos)
+            return (name if arg is None else arg.translate(self.font_tables[name])), pos
+
+        if name in LATEX_ACCENTS:
+            arg, pos = self._group(s, pos)
+            return (name if arg is None else arg + LATEX_ACCENTS[name]), pos
+
+        if name in LATEX_PASSTHROUGH:
+            arg, pos = self._group(s, pos)
+            return (name if arg is None else arg), pos
+
+        if name in ('frac', 'dfrac', 'tfrac'):
+            numerator, num_end = self._frac_argument(s, pos)
+            if numerator is None:
+                return name, pos
+            denominator, den_end = self._frac_argument(s, num_end)
+            if denominator is None:
+                return name, pos
+            return f"{numerator}/{denominator}", den_end
+
+        if name == 'sqrt':
+            arg, pos = self._group(s, pos)
+            return '√' + (arg or ''), pos
+
+        if name in ('ket', 'bra'):
+            arg, pos = self._group(s, pos)
+            if arg is None:
+                return ('|⟩' if name == 'ket' else '⟨|'), pos
+            return (f"|{arg}⟩" if name == 'ket' else f"⟨{arg}|"), pos
+
+        if name in ('left', 'right', 'big', 'Big', 'bigg', 'Bigg'):
+            return '', pos
+
+        # 未知のコマンドはバックスラッシュだけ除去
+        return name, pos
+
+
+# グローバルトランスレータインスタンス
+latex_translator = LatexTranslator()
+
+
+def convert_latex_to_unicode(text: str) -> str:
+    """
+    LaTeX記法をUnicode文字に変換する
+    例: $alpha$ -> α, $Z^2$ -> Z², $psi_0$ -> ψ₀
+    """
+    return latex_translator.convert(text)
+
+
+# ===== 論文レコード =====
+UNKNOWN_TITLE = "タイトル不明"
+
+
+class Paper(MutableMapping):
+    """
+    論文1件のレコード（__slots__ で属性を固定し、dictと同じ paper['title'] 形式でも読み書きできる）
+
+    - url / scirate_url は arxiv_id から都度作る（レコードには持たない）
+    - 著者名は sys.intern で共有し、タプルで持つ（同じ著者が何千回出てきても文字列は1つ）
+    - タイトル不明は None で持ち、paper['title'] では UNKNOWN_TITLE を返す
+    - パイプラインが付ける注記（tenants, summaries など）は必要になった時だけ作る辞書に入れる
+    """
+    __slots__ = ('arxiv_id', 'title', 'scites', 'authors', 'abstract', 'category', '_extra')
+    FIELDS = ('arxiv_id', 'title', 'scites', 'authors', 'abstract', 'category')
+    DERIVED = ('url', 'scirate_url')
+
+    def __init__(self, arxiv_id: str, title: Optional[str] = None, scites: int = 0, authors=(),
+                 abstract: Optional[str] = None, category: Optional[str] = None, **extra):
+        self.arxiv_id = arxiv_id
+        self.title = title
+        self.scites = scites
+        self.authors = self._intern_authors(authors)
+        self.abstract = abstract
+        self.category = sys.intern(category) if category else None
+        self._extra = extra or None
+
+    @staticmethod
+    def _intern_authors(authors) -> tuple:
+        return tuple(sys.intern(name) for name in authors or ())
+
+    @property
+    def url(self) -> str:
+        return f"https://arxiv.org/abs/{self.arxiv_id}"
+
+    @property
+    def scirate_url(self) -> str:
+        return f"https://scirate.com/arxiv/{self.arxiv_id}"
+
+    # --- dictとしてのアクセス ---
+    def __getitem__(self, key: str):
+        if key == 'title':
+            return self.title if self.title is not None else UNKNOWN_TITLE
+        if key in Paper.FIELDS or key in Paper.DERIVED:
+            value = getattr(self, key)
+            if key == 'category' and value is None:
+                raise KeyError(key)
+            return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key in Paper.DERIVED:
+            raise KeyError(f"{key} は arxiv_id から作られるため設定できません")
+        if key == 'authors':
+            value = self._intern_authors(value)
+        elif key == 'title' and value == UNKNOWN_TITLE:
+            value = None
+        elif key == 'category' and value:
+            value = sys.intern(value)
+        if key in Paper.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self):
+        for key in Paper.FIELDS:
+            if key != 'category' or self.category is not None:
+                yield key
+        yield from Paper.DERIVED
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Paper({self.arxiv_id!r}, scites={self.scites})"
+
+    # 同一性で比較・ハッシュする（Mappingの__eq__は全キーを比べるうえ、__hash__を無効にする）
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    @classmethod
+    def from_mapping(cls, paper) -> 'Paper':
+        """dict（旧形式）やPaperから作る（url / scirate_url は捨て、それ以外のキーは注記として残す）"""
+        if isinstance(paper, Paper):
+            return paper
+        extra = {k: v for k, v in paper.items() if k not in cls.FIELDS and k not in cls.DERIVED}
+        title = paper.get('title')
+        return cls(paper['arxiv_id'], None if title == UNKNOWN_TITLE else title, paper.get('scites', 0),
+                   paper.get('authors') or (), paper.get('abstract'), paper.get('category'), **extra)
 
 
 # ===== Scirateトップページから論文を取得 =====
-def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[str] = None) -> tuple:
+def _page_listing_date(soup) -> Optional[str]:
+    """ページが表示している掲載日（"Next day"リンクの日付-1日 or "Prev day"リンクの日付+1日。読めなければNone）"""
+    for a_tag in soup.find_all('a', href=True):
+        if a_tag.get_text(strip=True) == 'Next day':
+            date_match = re.search(r'date=(\d{4}-\d{2}-\d{2})', a_tag.get('href', ''))
+            if date_match:
+                next_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
+                return (next_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    for a_tag in soup.find_all('a', href=True):
+        if a_tag.get_text(strip=True) == 'Prev day':
+            date_match = re.search(r'date=(\d{4}-\d{2}-\d{2})', a_tag.get('href', ''))
+            if date_match:
+                prev_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
+                return (prev_date + timedelta(days=1)).strftime('%Y-%m-%d')
+    return None
+
+
+def fetch_scirate_ranking(category: str, date: Optional[str] = None) -> tuple:
     """
-    Scirateの���ップページから、scites順の論文を取得
+    Scirateのカテゴリページを1回取得し、ページ内の全論文をscites順に返す（履歴には記録しない）
 
     Args:
         category: arXivカテゴリ（例: quant-ph）
-        top_n: 取得する論文数
         date: 日付指定（例: 2026-03-02）。Noneの場合は最新
 
     Returns:
-        (papers, scirate_date): 論文リストとScirateが表示している日付（YYYY-MM-DD）
+        (papers, page_date): 論文リスト（取得・解析に失敗した場合はNone）と、
+        ページのリンクから読んだ表示日付（YYYY-MM-DD。読めなければNone）
     """
     date_msg = f"（日付: {date}）" if date else "（最新）"
     logger.info(f"Scirate {category}カテゴリの論文を取得中... {date_msg}")
 
     # 日付指定がある場合はクエリパラメータを付与
-    url = f"https://scirate.com/arxiv/{category}"
+    url = f"{SCIRATE_BASE_URL}/arxiv/{category}"
     if date:
         url += f"?date={date}"
     logger.info(f"アクセスURL: {url}")
@@ -563,40 +1903,14 @@ def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[s
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=15)
+        response = http_session.get(url, headers=headers, timeout=15)
 
         if response.status_code != 200:
             logger.error(f"Scirateからの取得に失敗 (status: {response.status_code})")
-            return []
+            return None, None
 
         soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Scirateが表示している日付を取得（"Prev day"リンクの日付+1日 or "Next day"リンクの日付-1日）
-        scirate_date = date  # 日付指定がある場合はそのまま使う
-        if not scirate_date:
-            for a_tag in soup.find_all('a', href=True):
-                href = a_tag.get('href', '')
-                link_text = a_tag.get_text(strip=True)
-                if link_text == 'Next day':
-                    # Next dayリンクの日付 - 1日 = 現在表示中の日付
-                    date_match = re.search(r'date=(\d{4}-\d{2}-\d{2})', href)
-                    if date_match:
-                        next_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
-                        scirate_date = (next_date - timedelta(days=1)).strftime('%Y-%m-%d')
-                        break
-            if not scirate_date:
-                # フォールバック: Prev dayリンクから
-                for a_tag in soup.find_all('a', href=True):
-                    link_text = a_tag.get_text(strip=True)
-                    if link_text == 'Prev day':
-                        date_match = re.search(r'date=(\d{4}-\d{2}-\d{2})', a_tag.get('href', ''))
-                        if date_match:
-                            prev_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
-                            scirate_date = (prev_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                            break
-            if not scirate_date:
-                scirate_date = datetime.now().strftime('%Y-%m-%d')
-            logger.info(f"Scirate表示日付: {scirate_date}")
+        page_date = _page_listing_date(soup)
 
         papers = []
 
@@ -605,13 +1919,13 @@ def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[s
 
         if not paperlist:
             logger.error("paperlist要素が見つかりません")
-            return []
+            return None, None
 
         papers_ul = paperlist.find('ul', class_='papers')
 
         if not papers_ul:
             logger.error("ul.papers要素が見つかりません")
-            return []
+            return None, None
 
         # 各論文要素（div.row）を取得
         paper_rows = papers_ul.find_all('div', class_='row')
@@ -638,8 +1952,9 @@ def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[s
                 if title_elem:
                     title_link = title_elem.find('a')
                     title = title_link.get_text(strip=True) if title_link else title_elem.get_text(strip=True)
+                    title = convert_latex_to_unicode(title)
                 else:
-                    title = "タイトル不明"
+                    title = None
 
                 # Scites数を取得
                 scites = 0
@@ -665,15 +1980,15 @@ def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[s
                         if author_name:
                             authors.append(author_name)
 
-                papers.append({
-                    'arxiv_id': arxiv_id,
-                    'title': title,
-                    'scites': scites,
-                    'authors': authors,
-                    'url': f"https://arxiv.org/abs/{arxiv_id}",
-                    'scirate_url': f"https://scirate.com/arxiv/{arxiv_id}",
-                    'abstract': None
-                })
+                # Abstractを取得（ページに載っていればarXiv APIへの問い合わせを省ける）
+                abstract = None
+                abstract_elem = paper_row.find('div', class_='abstract')
+                if abstract_elem:
+                    abstract_text = " ".join(abstract_elem.get_text(" ", strip=True).split())
+                    if abstract_text:
+                        abstract = convert_latex_to_unicode(abstract_text)
+
+                papers.append(Paper(arxiv_id, title, scites, authors, abstract))
 
             except Exception as e:
                 logger.warning(f"論文の解析エラー: {e}")
@@ -682,22 +1997,52 @@ def get_top_papers_from_scirate(category: str, top_n: int = 10, date: Optional[s
         # Scites順にソート（降順）
         papers.sort(key=lambda x: x['scites'], reverse=True)
 
-        logger.info(f"{len(papers)}件の論文を取得しました")
-
-        # 上位10件を表示
-        if papers:
-            logger.info(f"Scites数上位{min(10, len(papers))}件:")
-            for i, paper in enumerate(papers[:10], 1):
-                logger.info(f"  {i}. [{paper['scites']:3d} scites] {paper['arxiv_id']} - {paper['title'][:50]}...")
+        # Scites順にソート（降順）
+        papers.sort(key=lambda x: x['scites'], reverse=True)
 
-        return papers[:top_n], scirate_date
+        with_abstract = sum(1 for paper in papers if paper.abstract)
+        logger.info(f"{len(papers)}件の論文を取得しました（Abstract付き: {with_abstract}件）")
+        return papers, page_date
 
     except Exception as e:
         logger.error(f"エラー: {e}")
         import traceback
         traceback.print_exc()
+        return None, None
+
+
+def get_top_papers_from_scirate(category: str, top_n: Optional[int] = 10, date: Optional[str] = None) -> tuple:
+    """
+    Scirateのトップページから、scites順の論文を取得（ランキング全体を履歴にも記録する）
+
+    Args:
+        category: arXivカテゴリ（例: quant-ph）
+        top_n: 取得する論文数（Noneでページ内の全件）
+        date: 日付指定（例: 2026-03-02）。Noneの場合は最新
+
+    Returns:
+        (papers, scirate_date): 論文リストとScirateが表示している日付（YYYY-MM-DD）
+    """
+    papers, page_date = fetch_scirate_ranking(category, date)
+    if papers is None:
         return [], None
 
+    # 日付指定がある場合はそのまま使う
+    scirate_date = date or page_date or clock.now().strftime('%Y-%m-%d')
+    if not date:
+        logger.info(f"Scirate表示日付: {scirate_date}")
+
+    # ランキング全体を履歴に残す（週間・月間ダイジェスト用）
+    scites_history.record(category, scirate_date, papers)
+
+    # 上位10件を表示
+    if papers:
+        logger.info(f"Scites数上位{min(10, len(papers))}件:")
+        for i, paper in enumerate(papers[:10], 1):
+            logger.info(f"  {i}. [{paper['scites']:3d} scites] {paper['arxiv_id']} - {paper['title'][:50]}...")
+
+    return papers[:top_n], scirate_date
+
 
 # ===== 論文の詳細情報を補完 =====
 def _extract_arxiv_id(entry_id_url: str) -> str:
@@ -725,37 +2070,96 @@ def _is_valid_entry(entry, ns: dict) -> bool:
     return True
 
 
+def _entry_to_record(entry, ns: dict) -> Dict:
+    """arXiv APIエントリを論文メタデータのdictに変換（LaTeXはUnicodeに変換済み）"""
+    def text(tag):
+        elem = entry.find(tag, ns)
+        return elem.text.strip().replace('\n', ' ') if elem is not None and elem.text else None
+
+    title, abstract = text('atom:title'), text('atom:summary')
+    authors = []
+    for author in entry.findall('atom:author', ns):
+        name = author.find('atom:name', ns)
+        if name is not None:
+            authors.append(name.text)
+    return {
+        'arxiv_id': _extract_arxiv_id(text('atom:id') or ''),
+        'title': convert_latex_to_unicode(title) if title else None,
+        'abstract': convert_latex_to_unicode(abstract) if abstract else None,
+        'authors': authors,
+        'published': (text('atom:published') or '')[:10] or None,
+    }
+
+
+def _apply_record_to_paper(paper: dict, record: Dict):
+    """arXivのメタデータを論文dictに反映（タイトル・著者はScirateで欠けていた場合のみ）"""
+    if record.get('abstract'):
+        paper['abstract'] = record['abstract']
+    if paper['title'] == UNKNOWN_TITLE and record.get('title'):
+        paper['title'] = record['title']
+    if not paper['authors']:
+        paper['authors'] = record.get('authors') or []
+
+
 def _apply_entry_to_paper(paper: dict, entry, ns: dict):
     """arXiv APIエントリの情報を論文dictに反映"""
-    abstract_elem = entry.find('atom:summary', ns)
-    if abstract_elem is not None and abstract_elem.text:
-        paper['abstract'] = abstract_elem.text.strip().replace('\n', ' ')
+    _apply_record_to_paper(paper, _entry_to_record(entry, ns))
 
-    if paper['title'] == "タイトル不明":
-        title_elem = entry.find('atom:title', ns)
-        if title_elem is not None and title_elem.text:
-            paper['title'] = title_elem.text.strip().replace('\n', ' ')
 
-    if not paper['authors']:
-        authors = []
-        for author in entry.findall('atom:author', ns):
-            name = author.find('atom:name', ns)
-            if name is not None:
-                authors.append(name.text)
-        paper['authors'] = authors
+def _arxiv_retry_sleep(seconds: float):
+    """arXiv APIのリトライ前の待機（リトライ回数を記録）"""
+    metrics.inc('http_retries', host=urlparse(ARXIV_API_URL).hostname or '')
+    sleep_tracker.sleep(seconds)
+
+
+def _needs_arxiv_lookup(paper: Dict) -> bool:
+    """Scirateページだけでは情報が欠けている（arXiv APIで補う必要がある）か"""
+    return not paper.get('abstract') or paper['title'] == UNKNOWN_TITLE or not paper['authors']
 
 
 def enrich_papers_with_abstracts(papers: List[Dict]) -> List[Dict]:
     """
     各論文のAbstractをarXiv APIからバッチ取得（フォールバック付き）
+
+    Scirateページから取得済みの論文は問い合わせず、欠けている論文はプリフェッチ済みのローカルストア
+    （--prefetch-arxiv）から補い、それでも欠けている論文だけをarXiv APIに問い合わせる。
     """
     if not papers:
         return papers
 
+    all_papers, papers = papers, [paper for paper in papers if _needs_arxiv_lookup(paper)]
+    from_page = len(all_papers) - len(papers)
+    if from_page:
+        metrics.inc('arxiv_lookups_avoided', from_page, source='scirate')
+
+    from_store = 0
+    if papers:
+        try:
+            stored = arxiv_store.get_many([paper['arxiv_id'] for paper in papers])
+        except sqlite3.Error as e:
+            logger.warning(f"arXivメタデータストアを読み込めません: {e}")
+            stored = {}
+        for paper in papers:
+            if paper['arxiv_id'] in stored:
+                _apply_record_to_paper(paper, stored[paper['arxiv_id']])
+        papers = [paper for paper in papers if _needs_arxiv_lookup(paper)]
+        from_store = len(all_papers) - from_page - len(papers)
+        if from_store:
+            metrics.inc('arxiv_lookups_avoided', from_store, source='store')
+
+    if not papers:
+        metrics.inc('arxiv_requests_avoided')
+        logger.info(f"全{len(all_papers)}件の詳細情報を取得済み（Scirateページ: {from_page}件, "
+                    f"ローカルストア: {from_store}件）。arXiv APIの呼び出しを省略")
+        return all_papers
+    if from_page or from_store:
+        logger.info(f"Scirateページから{from_page}件・ローカルストアから{from_store}件を補完、"
+                    f"残り{len(papers)}件をarXiv APIで補完")
+
     logger.info(f"各論文の詳細情報をバッチ取得中（{len(papers)}件）...")
 
     # httpsを使用（httpよりTLS経由の方が安定）
-    base_url = "https://export.arxiv.org/api/query"
+    base_url = ARXIV_API_URL
     headers = {
         'User-Agent': 'Mozilla/5.0 (compatible; ScirateBot/1.0)'
     }
@@ -773,19 +2177,19 @@ def enrich_papers_with_abstracts(papers: List[Dict]) -> List[Dict]:
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(base_url, params=params, headers=headers, timeout=30)
+            response = http_session.get(base_url, params=params, headers=headers, timeout=30)
             logger.info(f"   arXiv API レスポンス: status={response.status_code}, length={len(response.content)}")
 
             if response.status_code == 503:
                 # arXiv APIがメンテナンス中・過負荷の場合、長めに待つ
                 retry_after = int(response.headers.get('Retry-After', 30))
                 logger.warning(f"   arXiv API 503 (過負荷), {retry_after}秒待機後リトライ {attempt + 1}/{max_retries}")
-                time.sleep(retry_after)
+                _arxiv_retry_sleep(retry_after)
                 continue
 
             if response.status_code != 200:
                 logger.warning(f"   arXiv API エラー (status: {response.status_code}), リトライ {attempt + 1}/{max_retries}")
-                time.sleep(5 * (attempt + 1))
+                _arxiv_retry_sleep(5 * (attempt + 1))
                 continue
 
             root = ET.fromstring(response.content)
@@ -810,17 +2214,17 @@ def enrich_papers_with_abstracts(papers: List[Dict]) -> List[Dict]:
                 break
             elif not entries_by_id:
                 logger.warning(f"   有効エントリが0件、リトライ {attempt + 1}/{max_retries}")
-                time.sleep(5 * (attempt + 1))
+                _arxiv_retry_sleep(5 * (attempt + 1))
 
         except ET.ParseError as e:
             logger.warning(f"   XMLパースエラー: {e}, リトライ {attempt + 1}/{max_retries}")
-            time.sleep(5 * (attempt + 1))
+            _arxiv_retry_sleep(5 * (attempt + 1))
         except requests.exceptions.Timeout:
             logger.warning(f"   タイムアウト、リトライ {attempt + 1}/{max_retries}")
-            time.sleep(5 * (attempt + 1))
+            _arxiv_retry_sleep(5 * (attempt + 1))
         except Exception as e:
             logger.warning(f"   arXiv API 例外: {e}, リトライ {attempt + 1}/{max_retries}")
-            time.sleep(5 * (attempt + 1))
+            _arxiv_retry_sleep(5 * (attempt + 1))
 
     # バッチ結果を反映
     for paper in papers:
@@ -836,11 +2240,11 @@ def enrich_papers_with_abstracts(papers: List[Dict]) -> List[Dict]:
             for attempt in range(3):
                 try:
                     params_single = {"id_list": paper['arxiv_id'], "max_results": 1}
-                    response = requests.get(base_url, params=params_single, headers=headers, timeout=15)
+                    response = http_session.get(base_url, params=params_single, headers=headers, timeout=15)
 
                     if response.status_code == 503:
                         retry_after = int(response.headers.get('Retry-After', 15))
-                        time.sleep(retry_after)
+                        _arxiv_retry_sleep(retry_after)
                         continue
 
                     if response.status_code == 200:
@@ -850,39 +2254,180 @@ def enrich_papers_with_abstracts(papers: List[Dict]) -> List[Dict]:
                             _apply_entry_to_paper(paper, entry, ns)
                             break
 
-                    time.sleep(5 * (attempt + 1))
+                    _arxiv_retry_sleep(5 * (attempt + 1))
                 except Exception as e:
                     logger.warning(f"   個別リトライ失敗 {paper['arxiv_id']}: {e}")
-                    time.sleep(5 * (attempt + 1))
+                    _arxiv_retry_sleep(5 * (attempt + 1))
 
             if paper['abstract'] is None:
                 logger.error(f"   {paper['arxiv_id']} のAbstract取得に最終的に失敗")
 
     success_count = sum(1 for p in papers if p['abstract'] is not None)
     logger.info(f"詳細情報取得完了: {success_count}/{len(papers)}件成功")
-    return papers
+    return all_papers
 
 
-# ===== Google Gemini APIで要約を生成（改善版） =====
-def generate_summary(title: str, abstract: str, arxiv_id: str, language: str = "ja") -> str:
-    """
-    Google Gemini APIを使って論文を2-3文で要約（キャッシュ・レート制限対応）
-    """
-    logger.info(f"要約生成中: {title[:40]}...")
+# ===== arXivメタデータストア（一括プリフェッチ） =====
+ARXIV_PREFETCH_PAGE_SIZE = int(os.environ.get('ARXIV_PREFETCH_PAGE_SIZE', '200'))  # 1リクエストの件数
+ARXIV_PREFETCH_MAX_RESULTS = int(os.environ.get('ARXIV_PREFETCH_MAX_RESULTS', '2000'))  # 1カテゴリの上限
+ARXIV_PREFETCH_PAGE_INTERVAL = 3.0  # ページ間の待機（arXiv APIの利用ガイドラインは3秒に1回）
+ARXIV_STORE_RETENTION_DAYS = 30  # 取得からこの日数を過ぎたメタデータは削除
+ARXIV_ATOM_NS = {'atom': 'http://www.w3.org/2005/Atom', 'opensearch': 'http://a9.com/-/spec/opensearch/1.1/'}
 
-    if not abstract:
-        return "Abstractが取得できませんでした。"
 
-    if not gemini_client:
-        return "Gemini APIキーが設定されていません。"
+class ArxivMetadataStore:
+    """
+    arXivのメタデータ（タイトル・著者・Abstract）のローカルストア（SQLite, cache/arxiv_metadata.db）
 
-    # キャッシュをチェック
-    cached_summary = summary_cache.get(arxiv_id, abstract)
-    if cached_summary:
-        return cached_summary
+    harvest() でカテゴリの新着を投稿時刻より前にまとめて取得しておき、
+    投稿時の詳細情報の補完（enrich_papers_with_abstracts）をローカルだけで済ませる。
+    """
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or CACHE_DIR / "arxiv_metadata.db"
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """接続を開き、必要ならテーブルを作成"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "arxiv_id TEXT PRIMARY KEY, title TEXT, authors TEXT, abstract TEXT, "
+            "category TEXT, published TEXT, harvested_at TEXT)"
+        )
+        return conn
+
+    def get_many(self, arxiv_ids: List[str]) -> Dict[str, Dict]:
+        """
+        保存済みのメタデータを取得
+
+        Returns:
+            {arxiv_id: {'arxiv_id', 'title', 'authors', 'abstract', 'published'}}（無いIDは含まない）
+        """
+        if not arxiv_ids or not self.db_path.exists():
+            return {}
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT arxiv_id, title, authors, abstract, published FROM papers "
+                f"WHERE arxiv_id IN ({', '.join('?' * len(arxiv_ids))})", list(arxiv_ids)
+            ).fetchall()
+        return {
+            row[0]: {'arxiv_id': row[0], 'title': row[1], 'authors': json.loads(row[2] or '[]'),
+                     'abstract': row[3], 'published': row[4]}
+            for row in rows
+        }
 
-    if language == "ja":
-        prompt = f"""以下の論文を2-3文の日本語で簡潔に要約してください。
+    def add(self, records: List[Dict], category: str) -> int:
+        """
+        未保存のメタデータだけを追加
+
+        Returns:
+            新しく追加した件数
+        """
+        harvested_at = clock.now().isoformat(timespec='seconds')
+        with self._lock, closing(self._connect()) as conn, conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO papers (arxiv_id, title, authors, abstract, category, published, harvested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(r['arxiv_id'], r['title'], json.dumps(r['authors'], ensure_ascii=False), r['abstract'],
+                  category, r['published'], harvested_at) for r in records]
+            )
+            return conn.total_changes - before
+
+    def cleanup(self, days: int = ARXIV_STORE_RETENTION_DAYS) -> int:
+        """取得からdays日を過ぎたメタデータを削除（削除件数を返す）"""
+        if not self.db_path.exists():
+            return 0
+        cutoff = (clock.now() - timedelta(days=days)).isoformat(timespec='seconds')
+        with self._lock, closing(self._connect()) as conn, conn:
+            return conn.execute("DELETE FROM papers WHERE harvested_at < ?", (cutoff,)).rowcount
+
+    def _fetch_page(self, category: str, start: int, page_size: int) -> tuple:
+        """
+        新着順の一覧を1ページ取得し、ストリーミングでパースする
+
+        Returns:
+            (records, total_results)。取得に失敗した場合は (None, None)
+        """
+        params = {
+            'search_query': f"cat:{category}",
+            'sortBy': 'submittedDate',
+            'sortOrder': 'descending',
+            'start': start,
+            'max_results': page_size,
+        }
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; ScirateBot/1.0)'}
+        entry_tag = f"{{{ARXIV_ATOM_NS['atom']}}}entry"
+        total_tag = f"{{{ARXIV_ATOM_NS['opensearch']}}}totalResults"
+
+        for attempt in range(3):
+            try:
+                with http_session.get(ARXIV_API_URL, params=params, headers=headers, timeout=60,
+                                      stream=True) as response:
+                    if response.status_code != 200:
+                        retry_after = int(response.headers.get('Retry-After', 5 * (attempt + 1)))
+                        logger.warning(f"   arXiv一覧 (status: {response.status_code}), "
+                                       f"{retry_after}秒待機後リトライ {attempt + 1}/3")
+                        _arxiv_retry_sleep(retry_after)
+                        continue
+
+                    # フィード全体を保持せず、エントリごとに変換して捨てる
+                    response.raw.decode_content = True
+                    records, total = [], None
+                    for _, elem in ET.iterparse(response.raw):
+                        if elem.tag == entry_tag:
+                            if _is_valid_entry(elem, ARXIV_ATOM_NS):
+                                records.append(_entry_to_record(elem, ARXIV_ATOM_NS))
+                            elem.clear()
+                        elif elem.tag == total_tag and elem.text:
+                            total = int(elem.text)
+                    return records, total
+            except (ET.ParseError, requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"   arXiv一覧の取得エラー: {e}, リトライ {attempt + 1}/3")
+                _arxiv_retry_sleep(5 * (attempt + 1))
+        return None, None
+
+    def harvest(self, category: str, page_size: int = ARXIV_PREFETCH_PAGE_SIZE,
+                max_results: int = ARXIV_PREFETCH_MAX_RESULTS) -> int:
+        """
+        カテゴリの新着を新しい順にページ単位で取得し、前回までに無かった論文だけを保存する
+
+        クロスリストは投稿日が古いことがあるため、既知の論文が現れた時点ではなく、
+        新しい論文が1件も無いページに達した時点で止める。
+
+        Returns:
+            新しく保存した件数
+        """
+        logger.info(f"arXiv {category} の新着を一括取得中（1ページ{page_size}件, 上限{max_results}件）...")
+        added, start, total = 0, 0, None
+        while start < max_results and (total is None or start < total):
+            if start:
+                sleep_tracker.sleep(ARXIV_PREFETCH_PAGE_INTERVAL)
+            records, page_total = self._fetch_page(category, start, min(page_size, max_results - start))
+            if records is None:
+                logger.error(f"arXiv {category} の一覧取得に失敗（{start}件目から）")
+                break
+            total = page_total if page_total is not None else total
+            page_added = self.add(records, category) if records else 0
+            added += page_added
+            logger.info(f"   {start}-{start + len(records)}件目: 新規 {page_added}件")
+            if not records or not page_added:
+                break
+            start += len(records)
+        self.cleanup()
+        metrics.inc('arxiv_prefetched', added, category=category)
+        logger.info(f"arXiv {category}: {added}件を保存しました")
+        return added
+
+
+# グローバルarXivメタデータストア
+arxiv_store = ArxivMetadataStore()
+
+
+# ===== 要約の指示（プロンプトの固定部分） =====
+SUMMARY_INSTRUCTIONS = {
+    'ja': """以下の論文を2-3文の日本語で簡潔に要約してください。
 
 【重要な指示】
 - 具体的な主語（手法名、対象、提案内容など）から始めてください
@@ -890,24 +2435,127 @@ def generate_summary(title: str, abstract: str, arxiv_id: str, language: str = "
 - 良い例: 「トラップドイオンと自由電子を結合させる新手法を提案。」「量子誤り訂正符号の新しい構成法を示した。」
 - 専門用語は残しつつ、何を研究したかが分かるように説明してください
 - 数式はLaTeXではなく、Discordで読める形式で表記してください
-  例: μ_c², P_{{11→11}}(E), Δt(E), φ⁴, ⟨ψ|H|ψ⟩
+  例: μ_c², P_{11→11}(E), Δt(E), φ⁴, ⟨ψ|H|ψ⟩
 - 具体的な数値（パラメータ値、精度、誤差など）があれば正確に含めてください
 - ギリシャ文字はそのまま使用: α, β, γ, δ, ε, θ, λ, μ, ν, π, σ, φ, ψ, ω
 - 上付き・下付き文字: ₀₁₂₃₄₅₆₇₈₉, ⁰¹²³⁴⁵⁶⁷⁸⁹
 
-タイトル: {title}
+""",
+    'en': """Summarize the following paper in 2-3 sentences. Keep technical terms and explain what was studied.
 
-要旨: {abstract}
+""",
+}
 
-要約:"""
-    else:
-        prompt = f"""Summarize the following paper in 2-3 sentences. Keep technical terms and explain what was studied.
+BATCH_SUMMARY_INSTRUCTIONS = {
+    'ja': """以下の複数の論文を、各2-3文の日本語で簡潔に要約してください。
+
+【重要な指示】
+- 各論文の要約を「[論文番号] 要約内容」の形式で出力してください
+- 具体的な主語（手法名、対象、提案内容など）から始めてください
+- 悪い例: 「は、〜を提案している」「この研究では」「本研究では」
+- 良い例: 「トラップドイオンと自由電子を結合させる新手法を提案。」
+- 専門用語は残しつつ、何を研究したかが分かるように説明してください
+- 数式はDiscordで読める形式で表記してください
+
+""",
+    'en': """Summarize each of the following papers in 2-3 sentences.
+
+Format: [Paper number] Summary content
+
+""",
+}
 
-Title: {title}
 
-Abstract: {abstract}
+# ===== Geminiのコンテキストキャッシュ =====
+# off: 指示を毎回プロンプトに含める / system: システム指示として送る
+# （指示は約300トークンで、キャッシュ済みコンテンツの最小サイズに満たないため登録はしない）
+GEMINI_CONTEXT_CACHE_MODES = ('off', 'system')
+GEMINI_CONTEXT_CACHE = os.environ.get('GEMINI_CONTEXT_CACHE', 'off')
 
-Summary:"""
+
+class GeminiContextCache:
+    """
+    要約の指示（固定部分）と論文ごとの部分を分けて送るクラス
+
+    system では指示をシステム指示として送り、プロンプトはタイトル・要旨だけにする。
+    以前の cached（キャッシュ済みコンテンツとして登録）は、指示がGeminiの最小キャッシュサイズに
+    満たず作成に失敗するだけだったため廃止し、system として扱う。
+    """
+    def __init__(self, mode: str = GEMINI_CONTEXT_CACHE):
+        if mode == 'cached':
+            logger.warning("GEMINI_CONTEXT_CACHE=cached は廃止しました（指示が最小キャッシュサイズに満たないため）。"
+                           "system として扱います")
+            mode = 'system'
+        elif mode not in GEMINI_CONTEXT_CACHE_MODES:
+            logger.warning(f"GEMINI_CONTEXT_CACHE={mode} は不明な値です（{', '.join(GEMINI_CONTEXT_CACHE_MODES)}）。off として扱います")
+            mode = 'off'
+        self.mode = mode
+
+    def request(self, model: str, instructions: str, delta: str, **config) -> Dict:
+        """
+        generate_content に渡す引数（contents と config）を作る
+
+        Args:
+            instructions: プロンプトの固定部分（要約の指示）
+            delta: 論文ごとの部分（タイトル・要旨）
+            config: GenerateContentConfig に渡す追加の設定
+        """
+        if self.mode == 'off' or not gemini_client:
+            return {'contents': instructions + delta,
+                    'config': types.GenerateContentConfig(**config) if config else None}
+        return {'contents': delta, 'config': types.GenerateContentConfig(system_instruction=instructions, **config)}
+
+
+# グローバルコンテキストキャッシュ
+context_cache = GeminiContextCache()
+
+
+# ===== Google Gemini APIで要約を生成（改善版） =====
+def _response_tokens(response) -> int:
+    """Geminiレスポンスの合計トークン数（取得できなければ0）"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) or 0
+
+
+def _cached_tokens(response) -> int:
+    """Geminiレスポンスのうち、キャッシュ済みコンテンツから読んだ入力トークン数（取得できなければ0）"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'cached_content_token_count', None) or 0
+
+
+class SummaryFailure(str):
+    """
+    要約を生成できなかったときの表示用メッセージ
+
+    そのまま投稿できる文字列だが、キャッシュ・ジャーナルには記録しない（再実行時に生成し直す）。
+    """
+
+
+def generate_summary(title: str, abstract: str, arxiv_id: str, language: str = "ja") -> str:
+    """
+    Google Gemini APIを使って論文を2-3文で要約（キャッシュ・レート制限対応）
+
+    生成できなかった場合は SummaryFailure を返す。
+    """
+    logger.info(f"要約生成中: {title[:40]}...")
+
+    if not abstract:
+        return SummaryFailure("Abstractが取得できませんでした。")
+
+    if not gemini_client:
+        return SummaryFailure("Gemini APIキーが設定されていません。")
+
+    # キャッシュをチェック
+    cached_summary = summary_cache.get(arxiv_id, abstract, language)
+    if cached_summary:
+        return cached_summary
+
+    # 固定の指示と論文ごとの部分に分けて送る（指示はコンテキストキャッシュに載せられる）
+    instructions = SUMMARY_INSTRUCTIONS['ja' if language == "ja" else 'en']
+    if language == "ja":
+        delta = f"タイトル: {title}\n\n要旨: {abstract}\n\n要約:"
+    else:
+        delta = f"Title: {title}\n\nAbstract: {abstract}\n\nSummary:"
 
     # モデル優先順位に従って試行
     for model_info in MODEL_PRIORITY:
@@ -921,11 +2569,11 @@ Summary:"""
             logger.info(f"   Using model: {model_name} (RPM: {model_info['rpm']})")
             response = gemini_client.models.generate_content(
                 model=model_name,
-                contents=prompt
+                **context_cache.request(model_name, instructions, delta)
             )
 
             # 使用量を記録
-            usage_tracker.record(model_name)
+            usage_tracker.record(model_name, _response_tokens(response), _cached_tokens(response))
 
             # 安全性フィルタでブロックされたかチェック
             if not response.candidates:
@@ -950,7 +2598,7 @@ Summary:"""
                     # LaTeX記法をUnicodeに変換
                     summary = convert_latex_to_unicode(summary)
                     # キャッシュに保存
-                    summary_cache.set(arxiv_id, abstract, summary)
+                    summary_cache.set(arxiv_id, abstract, summary, language)
                     return summary
                 else:
                     logger.warning(f"   Empty text in response")
@@ -964,8 +2612,9 @@ Summary:"""
             # クォータ超過エラーの場合は次のモデルを試す
             if '429' in error_str or 'quota' in error_str.lower() or 'rate' in error_str.lower():
                 logger.warning(f"   {model_name} クォータ/レート制限、次のモデルを試します...")
+                metrics.inc('gemini_errors', model=model_name, kind='quota')
                 # エクスポネンシャルバックオフ
-                time.sleep(5)
+                sleep_tracker.sleep(5)
                 continue
             else:
                 logger.error(f"要約生成エラー: {e}")
@@ -975,7 +2624,7 @@ Summary:"""
 
     # すべてのモデルが失敗した場合
     logger.error("すべてのモデルで要約生成に失敗")
-    return "要約の生成に失敗しました（全モデルで失敗）。"
+    return SummaryFailure("要約の生成に失敗しました（全モデルで失敗）。")
 
 
 # ===== バッチ要約生成（オプション機能） =====
@@ -987,14 +2636,14 @@ def generate_batch_summaries(papers: List[Dict], language: str = "ja") -> Dict[s
     logger.info(f"バッチ要約生成中 ({len(papers)}件)...")
 
     if not gemini_client:
-        return {p['arxiv_id']: "Gemini APIキーが設定されていません。" for p in papers}
+        return {p['arxiv_id']: SummaryFailure("Gemini APIキーが設定されていません。") for p in papers}
 
     # キャッシュ済みの論文を除外
     uncached_papers = []
     cached_summaries = {}
 
     for paper in papers:
-        cached = summary_cache.get(paper['arxiv_id'], paper.get('abstract', ''))
+        cached = summary_cache.get(paper['arxiv_id'], paper.get('abstract', ''), language)
         if cached:
             cached_summaries[paper['arxiv_id']] = cached
         elif paper.get('abstract'):
@@ -1006,30 +2655,13 @@ def generate_batch_summaries(papers: List[Dict], language: str = "ja") -> Dict[s
 
     logger.info(f"キャッシュヒット: {len(cached_summaries)}件, 新規生成: {len(uncached_papers)}件")
 
-    # バッチプロンプトを構築
-    if language == "ja":
-        prompt = """以下の複数の論文を、各2-3文の日本語で簡潔に要約してください。
-
-【重要な指示】
-- 各論文の要約を「[論文番号] 要約内容」の形式で出力してください
-- 具体的な主語（手法名、対象、提案内容など）から始めてください
-- 悪い例: 「は、〜を提案している」「この研究では」「本研究では」
-- 良い例: 「トラップドイオンと自由電子を結合させる新手法を提案。」
-- 専門用語は残しつつ、何を研究したかが分かるように説明してください
-- 数式はDiscordで読める形式で表記してください
-
-"""
-    else:
-        prompt = """Summarize each of the following papers in 2-3 sentences.
-
-Format: [Paper number] Summary content
-
-"""
-
+    # バッチプロンプトを構築（固定の指示 + 論文ごとの部分）
+    instructions = BATCH_SUMMARY_INSTRUCTIONS['ja' if language == "ja" else 'en']
+    delta = ""
     for i, paper in enumerate(uncached_papers, 1):
-        prompt += f"\n[{i}] タイトル: {paper['title']}\n要旨: {paper.get('abstract', 'N/A')[:500]}\n"
+        delta += f"\n[{i}] タイトル: {paper['title']}\n要旨: {paper.get('abstract', 'N/A')[:500]}\n"
 
-    prompt += "\n要約:"
+    delta += "\n要約:"
 
     # APIを呼び出し
     for model_info in MODEL_PRIORITY:
@@ -1042,10 +2674,10 @@ Format: [Paper number] Summary content
             logger.info(f"   バッチ処理に {model_name} を使用")
             response = gemini_client.models.generate_content(
                 model=model_name,
-                contents=prompt
+                **context_cache.request(model_name, instructions, delta)
             )
 
-            usage_tracker.record(model_name)
+            usage_tracker.record(model_name, _response_tokens(response), _cached_tokens(response))
 
             if hasattr(response, 'text') and response.text:
                 # レスポンスをパース
@@ -1064,7 +2696,7 @@ Format: [Paper number] Summary content
                         # LaTeX記法をUnicodeに変換
                         clean_summary = convert_latex_to_unicode(clean_summary)
                         summaries[paper['arxiv_id']] = clean_summary
-                        summary_cache.set(paper['arxiv_id'], paper.get('abstract', ''), clean_summary)
+                        summary_cache.set(paper['arxiv_id'], paper.get('abstract', ''), clean_summary, language)
 
                 # キャッシュ済みと結合
                 summaries.update(cached_summaries)
@@ -1074,7 +2706,8 @@ Format: [Paper number] Summary content
             error_str = str(e)
             if '429' in error_str or 'quota' in error_str.lower():
                 logger.warning(f"   {model_name} クォータ超過、次のモデルを試します...")
-                time.sleep(5)
+                metrics.inc('gemini_errors', model=model_name, kind='quota')
+                sleep_tracker.sleep(5)
                 continue
             else:
                 logger.error(f"バッチ要約生成エラー: {e}")
@@ -1089,99 +2722,1454 @@ Format: [Paper number] Summary content
     return cached_summaries
 
 
-# ===== Discordに投稿 =====
-def post_to_discord(papers: List[Dict], language: str = "ja", use_batch: bool = False, date: Optional[str] = None):
+# ===== 多言語要約（1回のAPI呼び出しで複数言語） =====
+# 複数言語の要約が必要な場合に、1回のリクエストで全言語をJSONで生成する（無効にすると言語ごとに要約）
+MULTILINGUAL_SUMMARIES = os.environ.get('MULTILINGUAL_SUMMARIES', '1') != '0'
+MULTILINGUAL_BATCH_SIZE = int(os.environ.get('MULTILINGUAL_BATCH_SIZE', '5'))  # 1回の呼び出しでまとめる論文数の上限
+
+MULTILINGUAL_INSTRUCTIONS = {
+    'ja': """【"ja" の要約の指示】
+- 2-3文の日本語で、具体的な主語（手法名、対象、提案内容など）から始めてください
+- 悪い例: 「は、〜を提案している」「この研究では」「本研究では」
+- 専門用語は残しつつ、何を研究したかが分かるように説明してください
+- 数式はLaTeXではなく、Discordで読める形式（μ_c², ⟨ψ|H|ψ⟩ など）で表記してください""",
+    'en': """[Instructions for "en"]
+- 2-3 sentences in English. Keep technical terms and explain what was studied
+- Write formulas in a Discord-readable form (μ_c², ⟨ψ|H|ψ⟩), not LaTeX""",
+}
+
+
+def generate_multilingual_summaries(papers: List[Dict], languages: List[str]) -> Dict[str, Dict[str, str]]:
     """
-    論文リストをDiscordに投稿
+    複数論文を複数言語で、1回のAPI呼び出し（JSONの構造化レスポンス）で要約
+
+    要約は言語ごとにキャッシュする。キャッシュ済みの言語は再生成しない。
+    JSONとして解釈できなかった論文・言語は結果に含めない（呼び出し元で言語ごとの要約にフォールバックする）。
+
+    Returns:
+        言語 → (arXiv ID → 要約)
     """
-    logger.info(f"Discordに投稿中...")
+    results = {language: {} for language in languages}
+    uncached_papers = []
+    for paper in papers:
+        missing = False
+        for language in languages:
+            cached = summary_cache.get(paper['arxiv_id'], paper.get('abstract', ''), language)
+            if cached:
+                results[language][paper['arxiv_id']] = cached
+            else:
+                missing = True
+        if missing and paper.get('abstract'):
+            uncached_papers.append(paper)
+
+    if not uncached_papers or not gemini_client:
+        return results
+
+    logger.info(f"多言語要約生成中 ({len(uncached_papers)}件 × {', '.join(languages)})...")
+    example = json.dumps([{'id': 1, **{language: "..." for language in languages}}], ensure_ascii=False)
+    instructions = "以下の各論文を、指定した各言語で要約し、JSONの配列だけを出力してください。\n\n"
+    instructions += f"出力形式: {example}\n\n"
+    instructions += "\n\n".join(MULTILINGUAL_INSTRUCTIONS[language] for language in languages) + "\n"
+    # 要旨は言語ごとの要約（generate_summary）と同じく全文を渡し、論文数の上限ごとに呼び出しを分ける
+    for start in range(0, len(uncached_papers), MULTILINGUAL_BATCH_SIZE):
+        batch = uncached_papers[start:start + MULTILINGUAL_BATCH_SIZE]
+        if not _generate_multilingual_batch(batch, languages, instructions, results):
+            logger.warning("多言語要約に失敗、言語ごとの要約にフォールバック")
+    return results
+
+
+def _generate_multilingual_batch(papers: List[Dict], languages: List[str], instructions: str,
+                                 results: Dict[str, Dict[str, str]]) -> bool:
+    """論文のまとまり1つを1回の呼び出しで要約して results に加える（いずれのモデルでも応答が無ければ False）"""
+    delta = ""
+    for i, paper in enumerate(papers, 1):
+        delta += f"\n[{i}] タイトル: {paper['title']}\n要旨: {paper['abstract']}\n"
+
+    for model_info in MODEL_PRIORITY:
+        model_name = model_info['name']
+
+        try:
+            rate_limiter.update_rpm(model_info['rpm'])
+            rate_limiter.wait_if_needed()
+
+            logger.info(f"   多言語要約に {model_name} を使用（{len(papers)}件）")
+            response = gemini_client.models.generate_content(
+                model=model_name,
+                **context_cache.request(model_name, instructions, delta, response_mime_type='application/json')
+            )
+            usage_tracker.record(model_name, _response_tokens(response), _cached_tokens(response))
+        except Exception as e:
+            error_str = str(e)
+            if '429' in error_str or 'quota' in error_str.lower():
+                logger.warning(f"   {model_name} クォータ超過、次のモデルを試します...")
+                metrics.inc('gemini_errors', model=model_name, kind='quota')
+                sleep_tracker.sleep(5)
+            else:
+                logger.error(f"多言語要約生成エラー: {e}")
+            continue
+
+        try:
+            items = json.loads(response.text or '')
+            for item in items:
+                num = int(item['id']) - 1
+                if not 0 <= num < len(papers):
+                    continue
+                paper = papers[num]
+                for language in languages:
+                    summary = (item.get(language) or '').strip()
+                    if summary and paper['arxiv_id'] not in results[language]:
+                        summary = convert_latex_to_unicode(summary)
+                        results[language][paper['arxiv_id']] = summary
+                        summary_cache.set(paper['arxiv_id'], paper['abstract'], summary, language)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"   多言語要約のJSONを解釈できません: {e}")
+        return True
+    return False
+
+
+# ===== Discordに投稿 =====
+# Discordのメッセージ制限（https://discord.com/developers/docs/resources/message#embed-object-embed-limits）
+DISCORD_MAX_EMBEDS_PER_MESSAGE = 10
+DISCORD_MAX_EMBED_TOTAL_CHARS = 6000  # 1メッセージ内の全Embedの合計文字数
+DISCORD_MAX_CONTENT_CHARS = 2000
+DISCORD_MAX_TITLE_CHARS = 256
+DISCORD_MAX_DESCRIPTION_CHARS = 4096
+DISCORD_MAX_FIELD_VALUE_CHARS = 1024
+
+
+def _truncate(text: str, limit: int) -> str:
+    """制限文字数を超える場合は末尾を…で切り詰める"""
+    return text if len(text) <= limit else text[:limit - 1] + '…'
 
-    # バッチモードの場合は事前に全要約を生成
-    summaries = {}
-    if use_batch:
-        summaries = generate_batch_summaries(papers, language)
 
+def build_digest_header(count: int, language: str = "ja", date: Optional[str] = None,
+                        category: str = ARXIV_CATEGORY) -> str:
+    """ダイジェストのヘッダーメッセージを作成"""
     # ヘッダーメッセージ（日付指定がある場合はその日付を使用）
     if date:
         # YYYY-MM-DD → YYYY年MM月DD日
         parts = date.split('-')
         date_str = f"{parts[0]}年{parts[1]}月{parts[2]}日"
     else:
-        date_str = datetime.now().strftime("%Y年%m月%d日")
+        date_str = clock.now().strftime("%Y年%m月%d日")
     if language == "ja":
-        header = f"## {date_str} の quant-ph 人気論文 Top {len(papers)}\n\n**SciRate**: https://scirate.com/?range=1\n"
+        return f"## {date_str} の {category} 人気論文 Top {count}\n\n**SciRate**: https://scirate.com/?range=1\n"
+    return f"## Top {count} {category} Papers - {date or clock.now().strftime('%Y-%m-%d')}\n\n**SciRate**: https://scirate.com/?range=1\n"
+
+
+def build_paper_embed(rank: int, paper: Dict, summary: str, watch_terms: Optional[List[str]] = None) -> Dict:
+    """論文1件分のEmbedを作成（Discordの制限内に収める。watch_terms は投稿先テナントのウォッチリストで一致した語）"""
+    # 著者リスト
+    if paper['authors']:
+        authors_str = ", ".join(paper['authors'][:3])
+        if len(paper['authors']) > 3:
+            authors_str += " et al."
     else:
-        header = f"## Top {len(papers)} quant-ph Papers - {date or datetime.now().strftime('%Y-%m-%d')}\n\n**SciRate**: https://scirate.com/?range=1\n"
+        authors_str = "著者情報なし"
 
-    message = {
-        "content": header
+    fields = [
+        {
+            "name": "リンク",
+            "value": f"[arXiv]({paper['url']}) | [SciRate]({paper['scirate_url']})",
+            "inline": False
+        }
+    ]
+    # 近似重複としてまとめた論文
+    if paper.get('related'):
+        fields.append({
+            "name": "関連論文",
+            "value": _truncate("\n".join(f"[{r['arxiv_id']}]({r['url']}) {r['title']}" for r in paper['related']),
+                               DISCORD_MAX_FIELD_VALUE_CHARS),
+            "inline": False
+        })
+    if watch_terms:
+        fields.append({
+            "name": "ウォッチリスト",
+            "value": _truncate(", ".join(watch_terms), DISCORD_MAX_FIELD_VALUE_CHARS),
+            "inline": False
+        })
+    if paper.get('similar_posted'):
+        similar = paper['similar_posted']
+        fields.append({
+            "name": "過去の投稿に類似",
+            "value": _truncate(f"[{similar['arxiv_id']}](https://arxiv.org/abs/{similar['arxiv_id']}) "
+                               f"{similar['title']}（{similar['posted_date']}）", DISCORD_MAX_FIELD_VALUE_CHARS),
+            "inline": False
+        })
+
+    return {
+        "title": _truncate(f"{rank}. {paper['title']}", DISCORD_MAX_TITLE_CHARS),
+        "url": paper['url'],
+        "description": _truncate(
+            f"**要約**\n{summary}\n\n**著者:** {authors_str}\n**Scites:** {paper['scites']}",
+            DISCORD_MAX_DESCRIPTION_CHARS
+        ),
+        "color": 5814783,
+        "footer": {
+            "text": f"arXiv: {paper['arxiv_id']}"
+        },
+        "fields": fields
     }
 
-    # ヘッダーを投稿
-    try:
-        response = requests.post(DISCORD_WEBHOOK_URL, json=message, timeout=10)
-        if response.status_code != 204:
-            logger.error(f"Discord投稿エラー (status: {response.status_code})")
-            return
-    except Exception as e:
-        logger.error(f"Discord投稿エラー: {e}")
-        return
 
-    time.sleep(1)
+def embed_char_count(embed: Dict) -> int:
+    """Discordの合計文字数制限に数えられる文字数（title, description, fields, footer, author）"""
+    count = len(embed.get('title', '')) + len(embed.get('description', ''))
+    count += len(embed.get('footer', {}).get('text', ''))
+    count += len(embed.get('author', {}).get('name', ''))
+    for field in embed.get('fields', []):
+        count += len(field.get('name', '')) + len(field.get('value', ''))
+    return count
 
-    # 各論文を投稿
-    for i, paper in enumerate(papers, 1):
-        # 要約を取得（バッチモードか個別生成か）
-        if use_batch and paper['arxiv_id'] in summaries:
-            summary = summaries[paper['arxiv_id']]
+
+def fit_embed(embed: Dict) -> Dict:
+    """
+    1件で合計6000文字を超えるEmbedを制限内に切り詰める（超えていなければそのまま返す）
+
+    追加のフィールド（関連論文・ウォッチリストなど）の値を後ろから、次に description（要約）を切り詰める。
+    タイトルとリンクのフィールドは残す。
+    """
+    over = embed_char_count(embed) - DISCORD_MAX_EMBED_TOTAL_CHARS
+    if over <= 0:
+        return embed
+
+    embed = dict(embed, fields=[dict(field) for field in embed.get('fields', [])])
+    for field in reversed(embed['fields'][1:]):
+        if over <= 0:
+            break
+        value = _truncate(field['value'], max(1, len(field['value']) - over))
+        over -= len(field['value']) - len(value)
+        field['value'] = value
+    if over > 0 and embed.get('description'):
+        description = _truncate(embed['description'], max(1, len(embed['description']) - over))
+        over -= len(embed['description']) - len(description)
+        embed['description'] = description
+    return embed
+
+
+def pack_embed_messages(header: str, embeds: List[Dict]) -> List[Dict]:
+    """
+    Embedを順序を保ったまま、Discordの制限内でできるだけ少ないメッセージに詰める
+
+    ヘッダーは最初のメッセージの content に入れる。
+    1メッセージあたり最大10 Embed・合計6000文字を超える場合のみ次のメッセージに分割する。
+    1件で6000文字を超えるEmbedは fit_embed() で切り詰めてから詰める。
+    """
+    messages = []
+    current = []
+    current_chars = 0
+
+    for embed in map(fit_embed, embeds):
+        chars = embed_char_count(embed)
+        if current and (len(current) >= DISCORD_MAX_EMBEDS_PER_MESSAGE
+                        or current_chars + chars > DISCORD_MAX_EMBED_TOTAL_CHARS):
+            messages.append({"embeds": current})
+            current = []
+            current_chars = 0
+        current.append(embed)
+        current_chars += chars
+
+    if current:
+        messages.append({"embeds": current})
+
+    if header:
+        content = _truncate(header, DISCORD_MAX_CONTENT_CHARS)
+        if messages:
+            messages[0] = {"content": content, **messages[0]}
         else:
+            messages.append({"content": content})
+
+    return messages
+
+
+class DiscordClient:
+    """
+    Discord Webhookクライアント（レート制限ヘッダー対応）
+
+    レスポンスの X-RateLimit-* ヘッダーからバケットごとの残り回数とリセット時刻を追跡し、
+    残りがある間は待たずに送信、使い切ったらリセットまでだけ待機する。
+    429の場合は retry_after の秒数だけ待ってリトライする。
+    """
+    def __init__(self, session: Optional[requests.Session] = None, max_retries: int = 5, timeout: float = 10):
+        self.session = session or http_session
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._route_buckets = {}  # ルート（Webhook URL）→ バケットID
+        self.buckets = {}  # バケットID → 状態と統計
+        self._global_reset_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _route(url: str) -> str:
+        """クエリを除いたURLをルートとする（Webhook ID/トークン単位）"""
+        return url.split('?', 1)[0]
+
+    def _bucket(self, route: str) -> Dict:
+        bucket_id = self._route_buckets.get(route, route)
+        if bucket_id not in self.buckets:
+            self.buckets[bucket_id] = {
+                'limit': None, 'remaining': None, 'reset_at': 0.0,
+                'requests': 0, 'rate_limited': 0, 'retries': 0, 'waited': 0.0,
+            }
+        return self.buckets[bucket_id]
+
+    def _wait_for_bucket(self, route: str):
+        """バケットを使い切っている場合だけリセットまで待機"""
+        with self._lock:
+            bucket = self._bucket(route)
+            now = clock.time()
+            wait_time = max(0.0, self._global_reset_at - now)
+            if bucket['remaining'] == 0 and bucket['reset_at'] > now:
+                wait_time = max(wait_time, bucket['reset_at'] - now)
+            bucket['waited'] += wait_time
+        if wait_time > 0:
+            logger.info(f"   Discordレート制限: {wait_time:.2f}秒待機します")
+            sleep_tracker.sleep(wait_time)
+
+    def _update_bucket(self, route: str, response: requests.Response):
+        """レスポンスヘッダーからバケットの状態を更新"""
+        headers = response.headers
+        with self._lock:
+            bucket_id = headers.get('X-RateLimit-Bucket')
+            if bucket_id and self._route_buckets.get(route) != bucket_id:
+                # ルート単位で仮に作った統計をバケットIDに引き継ぐ
+                old = self.buckets.pop(self._route_buckets.get(route, route), None)
+                self._route_buckets[route] = bucket_id
+                if old and bucket_id not in self.buckets:
+                    self.buckets[bucket_id] = old
+
+            bucket = self._bucket(route)
+            bucket['requests'] += 1
+            try:
+                if 'X-RateLimit-Limit' in headers:
+                    bucket['limit'] = int(headers['X-RateLimit-Limit'])
+                if 'X-RateLimit-Remaining' in headers:
+                    bucket['remaining'] = int(headers['X-RateLimit-Remaining'])
+                if 'X-RateLimit-Reset-After' in headers:
+                    bucket['reset_at'] = clock.time() + float(headers['X-RateLimit-Reset-After'])
+            except ValueError:
+                pass
+
+    def _retry_after(self, response: requests.Response) -> float:
+        """429レスポンスから待機秒数を取得（本文のretry_after → Retry-Afterヘッダー）"""
+        retry_after = None
+        is_global = response.headers.get('X-RateLimit-Global', '').lower() == 'true'
+        try:
+            body = response.json()
+            retry_after = body.get('retry_after')
+            is_global = is_global or bool(body.get('global'))
+        except ValueError:
+            pass
+        if retry_after is None:
+            retry_after = response.headers.get('Retry-After', 1)
+        retry_after = max(0.0, float(retry_after))
+        if is_global:
+            with self._lock:
+                self._global_reset_at = clock.time() + retry_after
+        return retry_after
+
+    def execute_webhook(self, url: str, payload: Dict) -> Optional[requests.Response]:
+        """
+        Webhookにメッセージを送信（レート制限・一時的なエラーはリトライ）
+
+        Returns:
+            最終的なレスポンス（送信できなかった場合はNone）
+        """
+        route = self._route(url)
+        host = urlparse(url).hostname or ''
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                metrics.inc('http_retries', host=host)
+            self._wait_for_bucket(route)
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"   Discord送信エラー: {e}, リトライ {attempt + 1}/{self.max_retries}")
+                with self._lock:
+                    self._bucket(route)['retries'] += 1
+                sleep_tracker.sleep(min(2 ** attempt, 30))
+                continue
+
+            self._update_bucket(route, response)
+
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                with self._lock:
+                    bucket = self._bucket(route)
+                    bucket['rate_limited'] += 1
+                    bucket['retries'] += 1
+                    bucket['waited'] += retry_after
+                metrics.inc('discord_rate_limited')
+                logger.warning(f"   Discord 429: {retry_after:.2f}秒後にリトライ {attempt + 1}/{self.max_retries}")
+                sleep_tracker.sleep(retry_after)
+                continue
+
+            if response.status_code >= 500:
+                with self._lock:
+                    self._bucket(route)['retries'] += 1
+                logger.warning(f"   Discord {response.status_code}: リトライ {attempt + 1}/{self.max_retries}")
+                sleep_tracker.sleep(min(2 ** attempt, 30))
+                continue
+
+            metrics.inc('discord_posts', result='ok' if response.status_code < 400 else 'failed')
+            return response
+
+        metrics.inc('discord_posts', result='failed')
+        return response
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """バケットごとの統計を取得"""
+        with self._lock:
+            return {
+                bucket_id: {k: bucket[k] for k in ('limit', 'requests', 'rate_limited', 'retries', 'waited')}
+                for bucket_id, bucket in self.buckets.items()
+            }
+
+    def print_stats(self):
+        """バケットごとの統計を表示"""
+        for bucket_id, stats in self.get_stats().items():
+            logger.info(
+                f"Discordバケット {bucket_id[-12:]}: リクエスト {stats['requests']}回, "
+                f"429 {stats['rate_limited']}回, 待機 {stats['waited']:.2f}秒"
+            )
+
+
+# グローバルDiscordクライアント
+discord_client = DiscordClient()
+
+
+def _with_wait(url: str) -> str:
+    """?wait=true を付けて、送信したメッセージ（ID）を返してもらう"""
+    return url + ('&' if '?' in url else '?') + 'wait=true'
+
+
+def _post_messages_to_target(url: str, target: str, messages: List[Dict], paper_ids: List[List[str]],
+                             journal: PostingJournal) -> List[str]:
+    """1つの投稿先にメッセージを順に送信し、確認できた論文IDを返す（確認できた分からジャーナルと投稿済みに記録）"""
+    acknowledged = []
+    for message_index, (message, ids) in enumerate(zip(messages, paper_ids), 1):
+        has_header = 'content' in message
+        response = discord_client.execute_webhook(_with_wait(url), message)
+
+        if response is None or response.status_code not in (200, 204):
+            status = response.status_code if response is not None else '接続エラー'
+            logger.error(f"[{target}] Discord投稿エラー (status: {status})")
+            # ヘッダーを含む最初のメッセージが失敗した場合は中止
+            if has_header:
+                break
+            continue
+
+        message_id = None
+        if response.status_code == 200:
+            try:
+                message_id = response.json().get('id')
+            except ValueError:
+                pass
+
+        journal.record_message(target, message_id, ids, has_header)
+        for arxiv_id in ids:
+            posted_tracker.mark_as_posted(arxiv_id, target=target)
+        acknowledged.extend(ids)
+        logger.info(f"[{target}] {message_index}/{len(messages)}件目のメッセージを投稿しました"
+                    f"（論文 {len(ids)}件, message_id={message_id}）")
+
+    return acknowledged
+
+
+def post_to_discord(papers: List[Dict], language: str = "ja", use_batch: bool = False, date: Optional[str] = None,
+                    webhook_urls: Optional[List[str]] = None, journal: Optional[PostingJournal] = None,
+                    category: str = ARXIV_CATEGORY, respect_posted: bool = True,
+                    target_keys: Optional[Dict[str, str]] = None, tenant: str = DEFAULT_TENANT) -> Dict[str, List[str]]:
+    """
+    論文リストを全ての投稿先（Webhook）にDiscord投稿
+
+    要約とEmbedは1回だけ生成し、各投稿先には未投稿の論文だけを並行して送信する。
+    1つの投稿先が遅い・失敗しても他の投稿先は待たない。
+    同じ日付の再実行では、ジャーナルから未確認の論文だけを再開し、生成済みの要約を再利用する。
+    respect_posted=False（週間・月間ダイジェスト）では、日次で投稿済みの論文も投稿する。
+    target_keys（Webhook URL → 投稿先キー）を渡すと、URLから求める代わりにそのキーで投稿済み・ジャーナルを照合する。
+    Embedのウォッチリスト欄には、論文の 'watched' のうち tenant の分を載せる。
+
+    Returns:
+        投稿先キー → 投稿できた論文IDのリスト
+    """
+    webhook_urls = DISCORD_WEBHOOK_URLS if webhook_urls is None else webhook_urls
+    journal = journal or PostingJournal(date or clock.now().strftime('%Y-%m-%d'))
+    logger.info(f"Discordに投稿中...（投稿先 {len(webhook_urls)}件）")
+
+    # ダイジェスト内の順位は最初の実行で確定したものを使う
+    ranks = journal.assign_ranks([p['arxiv_id'] for p in papers])
+
+    # 投稿先ごとに未投稿の論文を決める
+    targets = {url: (target_keys or {}).get(url) or webhook_target_key(url) for url in webhook_urls}
+    pending = {
+        url: [p for p in papers
+              if not journal.is_acknowledged(target, p['arxiv_id'])
+              and not (respect_posted and posted_tracker.is_posted(p['arxiv_id'], target))]
+        for url, target in targets.items()
+    }
+    needed_ids = {p['arxiv_id'] for target_papers in pending.values() for p in target_papers}
+    papers = [p for p in papers if p['arxiv_id'] in needed_ids]
+    if not papers:
+        logger.info("全ての投稿先に投稿済みです")
+        return {target: [] for target in targets.values()}
+
+    # 生成済みの要約はジャーナルから再利用
+    summaries = {p['arxiv_id']: journal.get_summary(p['arxiv_id']) for p in papers if journal.get_summary(p['arxiv_id'])}
+    if summaries:
+        logger.info(f"ジャーナルから要約を再利用: {len(summaries)}件")
+    unsummarized = [p for p in papers if p['arxiv_id'] not in summaries]
+
+    # バッチモードの場合は事前に全要約を生成（失敗した要約は記録せず、再実行時に生成し直す）
+    if use_batch and unsummarized:
+        for arxiv_id, summary in generate_batch_summaries(unsummarized, language).items():
+            summaries[arxiv_id] = summary
+            if not isinstance(summary, SummaryFailure):
+                journal.record_summary(arxiv_id, summary)
+
+    # 各論文のEmbedを1回だけ作成
+    embeds = {}
+    for paper in papers:
+        # 要約を取得（ジャーナル・バッチ結果になければ個別生成）
+        summary = summaries.get(paper['arxiv_id'])
+        if summary is None:
             summary = generate_summary(paper['title'], paper.get('abstract', ''), paper['arxiv_id'], language)
+            if not isinstance(summary, SummaryFailure):
+                journal.record_summary(paper['arxiv_id'], summary)
+            summaries[paper['arxiv_id']] = summary
+        embeds[paper['arxiv_id']] = build_paper_embed(ranks[paper['arxiv_id']], paper, summary,
+                                                      watch_terms=paper.get('watched', {}).get(tenant))
+
+    # 投稿先ごとにメッセージを組み立てて並行送信（待機時間は呼び出し元のステージに記録）
+    results = {}
+    stage_name = sleep_tracker.current_stage()
+    with ThreadPoolExecutor(max_workers=max(1, len(webhook_urls)),
+                            initializer=sleep_tracker.set_stage, initargs=(stage_name,)) as executor:
+        futures = {}
+        for url, target_papers in pending.items():
+            target = targets[url]
+            if not target_papers:
+                logger.info(f"[{target}] 投稿済みのためスキップ")
+                results[target] = []
+                continue
+            # 再開時、ヘッダーを送信済みなら付けない
+            header = "" if journal.header_sent(target) else build_digest_header(len(target_papers), language, date, category)
+            target_embeds = [embeds[p['arxiv_id']] for p in target_papers]
+            messages = pack_embed_messages(header, target_embeds)
+            # メッセージごとに含まれる論文IDを対応付ける
+            paper_ids, offset = [], 0
+            for message in messages:
+                count = len(message.get('embeds', []))
+                paper_ids.append([p['arxiv_id'] for p in target_papers[offset:offset + count]])
+                offset += count
+            logger.info(f"[{target}] {len(target_papers)}件の論文を{len(messages)}件のメッセージにまとめて投稿します")
+            futures[executor.submit(_post_messages_to_target, url, target, messages, paper_ids, journal)] = target
+
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                results[target] = future.result()
+            except Exception as e:
+                logger.error(f"[{target}] 投稿中にエラー: {e}")
+                results[target] = []
+
+    # いずれかの投稿先に投稿できた論文を検索インデックスに追加
+    posted_ids = {arxiv_id for ids in results.values() for arxiv_id in ids}
+    if posted_ids:
+        try:
+            search_index.add([p for p in papers if p['arxiv_id'] in posted_ids], summaries, language, category, date)
+        except sqlite3.Error as e:
+            logger.warning(f"検索インデックスの更新エラー: {e}")
+
+    discord_client.print_stats()
+    for url, target in targets.items():
+        logger.info(f"[{target}] 完了: {len(results.get(target, []))}/{len(pending[url])}件を投稿")
+    logger.info(f"完了！{len(papers)}件の論文をDiscordに投稿しました（投稿先 {len(webhook_urls)}件）")
+    return results
+
+
+# ===== テナント設定 =====
+SUPPORTED_LANGUAGES = ("ja", "en")
+TENANT_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+# ウォッチリストに一致した論文の扱い（boost: 優先して枠に入れる / filter: 一致した論文だけを投稿）
+ROUTE_MODES = ("boost", "filter")
+# テナント設定ファイルを使わない場合のウォッチリスト（; 区切り）
+WATCH_KEYWORDS = os.environ.get('WATCH_KEYWORDS', "")
+WATCH_AUTHORS = os.environ.get('WATCH_AUTHORS', "")
+WATCH_ROUTE = os.environ.get('WATCH_ROUTE', "boost")
+
+
+def _resolve_webhook(value: str) -> str:
+    """Webhookの指定を解決（"env:NAME" は環境変数から読む。設定ファイルにトークンを書かないため）"""
+    if value.startswith('env:'):
+        return os.environ.get(value[4:], "")
+    return value
+
+
+def load_tenants(path: Optional[str] = None) -> List[Dict]:
+    """
+    テナント設定を読み込む
+
+    設定ファイルの形式:
+        {"tenants": [{"name": "qc-ja", "categories": ["quant-ph"], "top_n": 8,
+                      "language": "ja", "webhooks": ["env:QC_JA_WEBHOOK"],
+                      "keywords": ["surface code"], "authors": ["J. Preskill"], "route": "boost"}, ...]}
+
+    Returns:
+        テナントのリスト（name, categories, top_n, language, webhooks, keywords, authors, route）
+    """
+    path = TENANTS_CONFIG if path is None else path
+    if not path:
+        return [{
+            'name': DEFAULT_TENANT,
+            'categories': [ARXIV_CATEGORY],
+            'top_n': TOP_N_PAPERS,
+            'language': SUMMARY_LANGUAGE,
+            'webhooks': list(DISCORD_WEBHOOK_URLS),
+            'keywords': [k.strip() for k in WATCH_KEYWORDS.split(';') if k.strip()],
+            'authors': [a.strip() for a in WATCH_AUTHORS.split(';') if a.strip()],
+            'route': WATCH_ROUTE if WATCH_ROUTE in ROUTE_MODES else "boost",
+        }]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    tenants = []
+    for entry in config.get('tenants', []):
+        name = entry.get('name', '')
+        if not TENANT_NAME_RE.match(name):
+            raise ValueError(f"テナント名が不正です: {name!r}（英数字・-・_ のみ）")
+        if any(t['name'] == name for t in tenants):
+            raise ValueError(f"テナント名が重複しています: {name}")
+        language = entry.get('language', SUMMARY_LANGUAGE)
+        if language not in SUPPORTED_LANGUAGES:
+            raise ValueError(f"[{name}] 未対応の言語です: {language}")
+        categories = entry.get('categories') or [ARXIV_CATEGORY]
+        route = entry.get('route', "boost")
+        if route not in ROUTE_MODES:
+            raise ValueError(f"[{name}] 未知のrouteです: {route}（{', '.join(ROUTE_MODES)}）")
+        keywords, authors = entry.get('keywords', []), entry.get('authors', [])
+        if not all(isinstance(v, str) for v in keywords + authors):
+            raise ValueError(f"[{name}] keywords・authors は文字列のリストで指定してください")
+        webhooks = [url for url in (_resolve_webhook(w) for w in entry.get('webhooks', [])) if url]
+        if not webhooks:
+            logger.warning(f"[{name}] 投稿先のWebhookがありません")
+        tenants.append({
+            'name': name,
+            'categories': list(dict.fromkeys(categories)),
+            'top_n': int(entry.get('top_n', TOP_N_PAPERS)),
+            'language': language,
+            'webhooks': list(dict.fromkeys(webhooks)),
+            'keywords': keywords,
+            'authors': authors,
+            'route': route,
+        })
+    if not tenants:
+        raise ValueError(f"テナントが定義されていません: {path}")
+    return tenants
+
+
+def tenant_target_keys(tenant: Dict) -> Dict[str, str]:
+    """
+    テナントの投稿先 Webhook URL → 投稿先キー
+
+    --replay のテナントはWebhookのトークンを置き換えてあるため、記録時のキー（'target_keys'）を使う。
+    """
+    recorded = tenant.get('target_keys', {})
+    return {url: recorded.get(url) or webhook_target_key(url) for url in tenant['webhooks']}
+
+
+# ===== ウォッチリスト（キーワード・著者による振り分け） =====
+def normalize_text(text: str) -> str:
+    """照合用に正規化（アクセント除去・小文字化・記号を空白に。例: Surface-Code → surface code）"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def author_key(name: str) -> str:
+    """
+    著者名の照合キー（"姓 名の頭文字"）
+
+    "John Preskill" / "J. Preskill" / "Preskill, John" → "preskill j"、姓だけなら "preskill"
+    """
+    if ',' in name:
+        last, _, first = name.partition(',')
+        name = f"{first} {last}"
+    parts = normalize_text(name).split()
+    if not parts:
+        return ""
+    return f"{parts[-1]} {parts[0][0]}" if len(parts) > 1 else parts[0]
+
+
+def _trie_regex(keywords: List[str]) -> str:
+    """
+    キーワードの集合を文字のトライにした正規表現（共通の接頭辞をまとめ、分岐を1文字ずつ絞り込む）
+
+    単純な選択（a|b|c...）では各位置で全キーワードを順に試すため、数百語では遅くなる。
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # ここで終わるキーワードがあれば、より長い一致を優先して試す
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
+
+class WatchlistMatcher:
+    """
+    全テナントのキーワードと著者を1つの照合器にまとめたもの
+
+    キーワードはトライから作った1つの正規表現（先読みで重なった一致も拾う）、著者は正規化したキーの辞書で引く。
+    同じ位置で短いキーワードも一致する場合（"quantum error correction" と "quantum error"）は、
+    コンパイル時に求めた前方一致の組で補う。
+    """
+    def __init__(self, tenants: List[Dict]):
+        self.keyword_owners = {}  # 正規化したキーワード → テナント名の集合
+        self.author_owners = {}   # 著者キー → テナント名の集合
+        for tenant in tenants:
+            for keyword in tenant.get('keywords', []):
+                if normalize_text(keyword):
+                    self.keyword_owners.setdefault(normalize_text(keyword), set()).add(tenant['name'])
+            for author in tenant.get('authors', []):
+                if author_key(author):
+                    self.author_owners.setdefault(author_key(author), set()).add(tenant['name'])
+
+        keywords = sorted(self.keyword_owners, key=len, reverse=True)
+        self._pattern = re.compile(r'\b(?=(' + _trie_regex(keywords) + r')\b)') if keywords else None
+        # キーワード → 同じ位置から始まる（語単位の）より短いキーワード
+        self._prefixes = {
+            keyword: [other for other in keywords if other != keyword and keyword.startswith(other + ' ')]
+            for keyword in keywords
+        }
+
+    def __bool__(self):
+        return bool(self.keyword_owners or self.author_owners)
+
+    def match(self, paper: Dict) -> Dict[str, List[str]]:
+        """
+        論文に一致したテナントと一致した語
+
+        キーワードはタイトルとアブストラクト（取得済みなら）、著者は著者リストに対して照合する。
+
+        Returns:
+            テナント名 → 一致したキーワード・著者のリスト
+        """
+        matched = {}
+        if self._pattern is not None:
+            text = normalize_text(f"{paper.get('title', '')} {paper.get('abstract') or ''}")
+            for found in self._pattern.finditer(text):
+                for keyword in [found.group(1)] + self._prefixes[found.group(1)]:
+                    for name in self.keyword_owners[keyword]:
+                        terms = matched.setdefault(name, [])
+                        if keyword not in terms:
+                            terms.append(keyword)
+        if self.author_owners:
+            for author in paper.get('authors') or []:
+                key = author_key(author)
+                for owner_key in (key, key.split(' ')[0]):
+                    for name in self.author_owners.get(owner_key, ()):
+                        terms = matched.setdefault(name, [])
+                        if author not in terms:
+                            terms.append(author)
+        return matched
+
+
+# ===== 近似重複の検出（コンパニオン論文をまとめる） =====
+# タイトル+アブストラクトのTF-IDFのコサイン類似度がしきい値以上の論文を、scitesが最も多い論文の1件にまとめる
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', '1') != '0'
+DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', '0.5'))
+DEDUP_RESERVE = int(os.environ.get('DEDUP_RESERVE', '5'))  # 空いた枠に繰り上げる候補数（0で繰り上げない）
+DEDUP_HISTORY_DAYS = int(os.environ.get('DEDUP_HISTORY_DAYS', '14'))  # 過去の投稿と比較する日数
+DEDUP_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have in into is it its of on or our that the their these "
+    "this to using via we which with".split()
+)
+
+
+def tfidf_vectors(texts: List[str]) -> np.ndarray:
+    """テキストごとのTF-IDFベクトル（行ごとにL2正規化、語は2文字以上の英数字の小文字）"""
+    tokens = [re.findall(r'[a-z0-9]{2,}', (text or '').lower()) for text in texts]
+    vocabulary = {}
+    columns = np.array([vocabulary.setdefault(token, len(vocabulary)) for t in tokens for token in t], dtype=np.intp)
+    rows = np.repeat(np.arange(len(texts)), [len(t) for t in tokens])
+    stop_columns = [vocabulary[word] for word in DEDUP_STOPWORDS if word in vocabulary]
+    keep = ~np.isin(columns, stop_columns)
+
+    # 出現した (行, 語) の組だけで重みを計算してから密行列に置く
+    keys, counts = np.unique(rows[keep] * len(vocabulary) + columns[keep], return_counts=True)
+    rows, columns = np.divmod(keys, max(len(vocabulary), 1))
+    document_frequency = np.bincount(columns, minlength=len(vocabulary))
+    idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+    weights = np.log1p(counts).astype(np.float32) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts))).astype(np.float32)
+    weights /= np.where(norms == 0, 1, norms)[rows]
+
+    vectors = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+    vectors[rows, columns] = weights
+    return vectors
+
+
+def _dedup_text(paper: Dict) -> str:
+    # タイトルは短いので2回数えて重みを上げる
+    return f"{paper['title']} {paper['title']} {paper.get('abstract') or ''}"
+
+
+def find_near_duplicates(papers: List[Dict], threshold: float = DEDUP_THRESHOLD,
+                         history: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    近似重複をまとめる（papers は scites の降順）
+
+    各論文について、それより上位で類似度がしきい値以上の論文を探し、
+    その論文が属するグループの代表（最上位）の 'related' に加える。まとめられた論文には 'duplicate_of' を付ける。
+    history（過去の投稿）に類似する論文には 'similar_posted' を付ける。
+
+    Returns:
+        グループの代表ではない（まとめられた）論文のリスト
+    """
+    history = [h for h in history or [] if h['arxiv_id'] not in {p['arxiv_id'] for p in papers}]
+    if not papers:
+        return []
+
+    start = time.perf_counter()
+    vectors = tfidf_vectors([_dedup_text(p) for p in papers] + [_dedup_text(h) for h in history])
+    candidates = vectors[:len(papers)]
+
+    # 自分より上位の論文との類似度だけを見る（下三角）
+    similar = np.tril(candidates @ candidates.T >= threshold, k=-1)
+    first_similar = np.where(similar.any(axis=1), similar.argmax(axis=1), -1)
+
+    leaders = list(range(len(papers)))
+    duplicates = []
+    for i, j in enumerate(first_similar):
+        if j < 0:
+            continue
+        leaders[i] = leaders[j]
+        leader = papers[leaders[i]]
+        papers[i]['duplicate_of'] = leader['arxiv_id']
+        leader.setdefault('related', []).append(
+            {'arxiv_id': papers[i]['arxiv_id'], 'title': papers[i]['title'], 'url': papers[i]['url']})
+        duplicates.append(papers[i])
+
+    if history:
+        history_similarity = candidates @ vectors[len(papers):].T
+        best = history_similarity.argmax(axis=1)
+        for i in np.flatnonzero(history_similarity[np.arange(len(papers)), best] >= threshold):
+            papers[i]['similar_posted'] = dict(history[best[i]])
+
+    logger.info(f"近似重複の検出: {len(papers)}件（過去の投稿 {len(history)}件）を"
+                f"{(time.perf_counter() - start) * 1000:.1f}msで比較、{len(duplicates)}件をまとめます")
+    return duplicates
+
+
+def collapse_near_duplicates(papers: List[Dict], tenants: List[Dict], reserve: int = DEDUP_RESERVE) -> List[Dict]:
+    """
+    テナントごとの上位N件から近似重複を除き、空いた枠を次点の論文で埋める
+
+    select_tenant_papers(reserve=...) で各テナントの上位N+reserve件が 'tenant_ranks' 付きで選ばれている前提。
+    reserve=0 では繰り上げず、重複分だけダイジェストが短くなる。
+    """
+    papers = sorted(papers, key=lambda p: p['scites'], reverse=True)
+    history = search_index.recent(DEDUP_HISTORY_DAYS) if DEDUP_HISTORY_DAYS > 0 else []
+    duplicates = {p['arxiv_id']: p['duplicate_of'] for p in find_near_duplicates(papers, history=history)}
+
+    selected = {}
+    for tenant in tenants:
+        name = tenant['name']
+        members = sorted((p for p in papers if name in p.get('tenant_ranks', {})),
+                         key=lambda p: p['tenant_ranks'][name])
+        member_ids = {p['arxiv_id'] for p in members}
+        # 代表が同じテナントに含まれる論文だけをまとめる
+        unique = [p for p in members if duplicates.get(p['arxiv_id']) not in member_ids]
+        base = [p for p in members if p['tenant_ranks'][name] < tenant['top_n']]
+        kept = [p for p in unique if p['tenant_ranks'][name] < tenant['top_n']]
+        promoted = [p for p in unique if p['tenant_ranks'][name] >= tenant['top_n']][:len(base) - len(kept)]
+        if promoted:
+            logger.info(f"[{name}] 近似重複で空いた{len(promoted)}枠に繰り上げ: "
+                        + ", ".join(p['arxiv_id'] for p in promoted))
+        for paper in kept + promoted:
+            selected.setdefault(paper['arxiv_id'], []).append(name)
+
+    result = []
+    for paper in papers:
+        if paper['arxiv_id'] in selected:
+            paper['tenants'] = selected[paper['arxiv_id']]
+            result.append(paper)
+    return result
+
+
+# ===== パイプライン =====
+# ステージごとの並行数とバッチサイズ（batch_size=None は全件が揃うまで待つ）
+PIPELINE_STAGE_SETTINGS = {
+    'fetch': {'concurrency': 1, 'batch_size': 1},
+    'filter': {'concurrency': 1, 'batch_size': None},  # テナントごとの上位N件を選び、近似重複をまとめるため全件を待つ
+    'enrich': {'concurrency': 1, 'batch_size': 4},     # arXiv APIへの負荷を抑えるため直列
+    'summarize': {'concurrency': 1, 'batch_size': 4},  # Gemini APIのRPM制限があるため直列
+    'post': {'concurrency': 1, 'batch_size': None},    # ダイジェストは全件揃ってから投稿
+    'report': {'concurrency': 1, 'batch_size': None},
+}
+PIPELINE_QUEUE_SIZE = 16
 
-        # 著者リスト
+_PIPELINE_END = object()
+
+
+class Stage:
+    """
+    パイプラインの1段
+
+    func はアイテムのリスト（バッチ）を受け取り、次の段へ流すアイテムのリストを返す同期関数。
+    ワーカースレッドで実行されるため、HTTP待ちの間も他の段は進む。
+    """
+    def __init__(self, name: str, func, concurrency: Optional[int] = None, batch_size: Optional[int] = -1):
+        settings = PIPELINE_STAGE_SETTINGS.get(name, {})
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency or settings.get('concurrency', 1)
+        self.batch_size = settings.get('batch_size', 1) if batch_size == -1 else batch_size
+
+
+class StageProfiler:
+    """
+    --profile 用: ステージごとに cProfile と tracemalloc で計測するクラス
+
+    計測を正確にステージへ割り当てるため、プロファイル中はステージの処理を1つずつ実行する。
+    """
+    def __init__(self, output_dir: Path, top_allocations: int = 15):
+        self.output_dir = Path(output_dir)
+        self.top_allocations = top_allocations
+        self.profiles = {}  # ステージ名 → pstats.Stats
+        self.allocations = {}  # ステージ名 → {行: 増加バイト数}
+        self.peak = {}  # ステージ名 → tracemalloc のピーク（バイト）
+        self.wall = {}  # ステージ名 → 実時間（秒）
+        self.calls = {}
+        self._snapshots = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """メモリ割り当ての追跡を開始"""
+        tracemalloc.start(10)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def run(self, stage_name: str, func, *args):
+        """ステージの処理を1回計測しながら実行"""
+        with self._lock:
+            profile = cProfile.Profile()
+            before = tracemalloc.take_snapshot()
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                tracemalloc.reset_peak()
+            base_memory, _ = tracemalloc.get_traced_memory()
+            start = clock.monotonic()
+            try:
+                return profile.runcall(func, *args)
+            finally:
+                elapsed = clock.monotonic() - start
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+
+                stats = pstats.Stats(profile)
+                if stage_name in self.profiles:
+                    self.profiles[stage_name].add(stats)
+                else:
+                    self.profiles[stage_name] = stats
+                self.wall[stage_name] = self.wall.get(stage_name, 0.0) + elapsed
+                self.calls[stage_name] = self.calls.get(stage_name, 0) + 1
+                self.peak[stage_name] = max(self.peak.get(stage_name, 0), peak - base_memory)
+
+                # スナップショットの比較は重いので、レポート作成時にまとめて行う
+                self._snapshots.append((stage_name, before, after))
+
+    def _collect_allocations(self):
+        """保存したスナップショットの差分から、ステージごとの割り当て増加量を集計"""
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+        for stage_name, before, after in self._snapshots:
+            allocations = self.allocations.setdefault(stage_name, {})
+            for diff in after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno'):
+                if diff.size_diff > 0:
+                    frame = diff.traceback[0]
+                    key = f"{frame.filename}:{frame.lineno}"
+                    allocations[key] = allocations.get(key, 0) + diff.size_diff
+        self._snapshots = []
+
+    def write_reports(self, total_wall: float) -> Path:
+        """ステージごとの .pstats、割り当て上位レポート、時間の内訳を書き出す"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._collect_allocations()
+        for stage_name, stats in self.profiles.items():
+            stats.dump_stats(str(self.output_dir / f"{stage_name}.pstats"))
+
+        with open(self.output_dir / "allocations.txt", 'w', encoding='utf-8') as f:
+            for stage_name, allocations in self.allocations.items():
+                f.write(f"== {stage_name} (peak {self.peak.get(stage_name, 0) / 1024:.1f} KiB) ==\n")
+                top = sorted(allocations.items(), key=lambda item: item[1], reverse=True)[:self.top_allocations]
+                for location, size in top:
+                    f.write(f"  {size / 1024:10.1f} KiB  {location}\n")
+                f.write("\n")
+
+        lines = [f"{'stage':<12}{'calls':>7}{'wall(s)':>10}{'sleep(s)':>10}{'work(s)':>10}{'peak(KiB)':>11}"]
+        for stage_name, wall in self.wall.items():
+            slept = sleep_tracker.totals.get(stage_name, 0.0)
+            lines.append(
+                f"{stage_name:<12}{self.calls[stage_name]:>7}{wall:>10.3f}{slept:>10.3f}"
+                f"{max(0.0, wall - slept):>10.3f}{self.peak.get(stage_name, 0) / 1024:>11.1f}"
+            )
+        slept_total = sleep_tracker.total()
+        lines.append(f"total wall {total_wall:.3f}s = sleep {slept_total:.3f}s + work {max(0.0, total_wall - slept_total):.3f}s")
+        (self.output_dir / "summary.txt").write_text("\n".join(lines) + "\n", encoding='utf-8')
+
+        logger.info("プロファイル結果:")
+        for line in lines:
+            logger.info(f"  {line}")
+        logger.info(f"プロファイルを書き出しました: {self.output_dir}")
+        return self.output_dir
+
+
+class PipelineError(RuntimeError):
+    """ステージが例外を出し、そのバッチのアイテムを破棄した（他のバッチを処理し終えてから実行を失敗にする）"""
+    def __init__(self, failures: List[tuple]):
+        self.failures = failures
+        super().__init__("パイプラインのステージが失敗しました: " + ", ".join(
+            f"{name}（{count}件を破棄: {error}）" for name, count, error in failures))
+
+
+class Pipeline:
+    """
+    段と段を上限付きの非同期キューでつなぐパイプライン
+
+    各アイテムは前の段が終わり次第次の段へ進む（論文2のAbstract取得と論文1の要約が重なる）。
+    最終段の出力を元の順序で返す。
+    段が例外を出したバッチは破棄して他のバッチの処理を続け、failures とメトリクス pipeline_items_dropped に残す。
+    """
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE,
+                 profiler: Optional[StageProfiler] = None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.profiler = profiler
+        self.stats = {
+            stage.name: {'items_in': 0, 'items_out': 0, 'batches': 0, 'errors': 0, 'busy': 0.0}
+            for stage in stages
+        }
+        self.failures = []  # (ステージ名, 破棄したアイテム数, 例外)
+
+    def run(self, items: List) -> List:
+        """パイプラインを実行し、最終段の出力を返す"""
+        return asyncio.run(self._run(list(items)))
+
+    async def _run(self, items: List) -> List:
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=sum(stage.concurrency for stage in self.stages))
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        async def feed():
+            for i, item in enumerate(items):
+                await queues[0].put(((i,), item))
+            await queues[0].put(_PIPELINE_END)
+
+        async def collect():
+            results = []
+            while True:
+                entry = await queues[-1].get()
+                if entry is _PIPELINE_END:
+                    return results
+                results.append(entry)
+
+        try:
+            tasks = [asyncio.ensure_future(feed())]
+            for i, stage in enumerate(self.stages):
+                tasks.append(asyncio.ensure_future(
+                    self._run_stage(stage, queues[i], queues[i + 1], loop, executor)
+                ))
+            results = await collect()
+            await asyncio.gather(*tasks)
+        finally:
+            executor.shutdown(wait=True)
+
+        results.sort(key=lambda entry: entry[0])
+        return [item for _, item in results]
+
+    @staticmethod
+    async def _take_batch(inbox: asyncio.Queue, size: Optional[int]) -> List:
+        """バッチサイズ分（または上流の終了まで）アイテムを取り出す"""
+        batch = []
+        while size is None or len(batch) < size:
+            entry = await inbox.get()
+            if entry is _PIPELINE_END:
+                # 同じ段の他のワーカーにも終了を伝える
+                await inbox.put(_PIPELINE_END)
+                break
+            batch.append(entry)
+        batch.sort(key=lambda entry: entry[0])
+        return batch
+
+    async def _run_stage(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue, loop, executor):
+        stats = self.stats[stage.name]
+
+        async def worker():
+            while True:
+                batch = await self._take_batch(inbox, stage.batch_size)
+                if not batch:
+                    return
+                stats['items_in'] += len(batch)
+                stats['batches'] += 1
+                start = clock.monotonic()
+                try:
+                    outputs = await loop.run_in_executor(executor, self._call_stage, stage, [item for _, item in batch])
+                except Exception as e:
+                    logger.error(f"[{stage.name}] ステージでエラー（{len(batch)}件を破棄）: {e}")
+                    stats['errors'] += 1
+                    self.failures.append((stage.name, len(batch), e))
+                    metrics.inc('pipeline_items_dropped', len(batch), stage=stage.name)
+                    outputs = []
+                stats['busy'] += clock.monotonic() - start
+
+                # 出力の順序はバッチ先頭のアイテムの順序を引き継ぐ
+                for j, output in enumerate(outputs or []):
+                    stats['items_out'] += 1
+                    await outbox.put((batch[0][0] + (j,), output))
+
+        await asyncio.gather(*(worker() for _ in range(stage.concurrency)))
+        await outbox.put(_PIPELINE_END)
+
+    def _call_stage(self, stage: Stage, items: List):
+        """ワーカースレッドでステージの処理を実行（待機時間の記録先とプロファイラを設定）"""
+        sleep_tracker.set_stage(stage.name)
+        if self.profiler:
+            return self.profiler.run(stage.name, stage.func, items)
+        return stage.func(items)
+
+    def print_stats(self):
+        """段ごとの統計を表示"""
+        for name, stats in self.stats.items():
+            slept = sleep_tracker.totals.get(name, 0.0)
+            logger.info(
+                f"  [{name}] 入力 {stats['items_in']}件 → 出力 {stats['items_out']}件, "
+                f"バッチ {stats['batches']}回, 処理時間 {stats['busy']:.2f}秒（うち待機 {slept:.2f}秒）"
+                + (f", エラー {stats['errors']}回" if stats['errors'] else "")
+            )
+
+
+def summarize_papers(papers: List[Dict], languages: List[str],
+                     journals: Dict[str, List[PostingJournal]]) -> List[Dict]:
+    """
+    論文の要約を言語ごとに生成して各ジャーナルに記録
+
+    同じ言語のテナントは要約を共有する。いずれかのジャーナルに生成済みなら再利用し、Geminiには問い合わせない。
+    複数言語が必要な場合は1回の呼び出しでまとめて生成する（MULTILINGUAL_SUMMARIES）。
+
+    Args:
+        papers: 論文のリスト
+        languages: 要約する言語
+        journals: 言語 → その言語のテナントのジャーナル
+    """
+    def recorded(arxiv_id: str, language: str) -> Optional[str]:
+        for journal in journals[language]:
+            summary = journal.get_summary(arxiv_id)
+            if summary is not None:
+                return summary
+        return None
+
+    pending = {language: [p for p in papers if recorded(p['arxiv_id'], language) is None] for language in languages}
+    pending = {language: todo for language, todo in pending.items() if todo}
+    summaries = {language: {} for language in languages}
+
+    if MULTILINGUAL_SUMMARIES and len(pending) > 1:
+        pending_ids = {p['arxiv_id'] for todo in pending.values() for p in todo}
+        multi = generate_multilingual_summaries([p for p in papers if p['arxiv_id'] in pending_ids], list(pending))
+        for language, generated in multi.items():
+            summaries[language].update(generated)
+
+    for language, todo in pending.items():
+        # 多言語生成で得られなかった分は言語ごとに生成
+        remaining = [p for p in todo if p['arxiv_id'] not in summaries[language]]
+        if remaining:
+            summaries[language].update(generate_batch_summaries(remaining, language))
+        for paper in todo:
+            if summaries[language].get(paper['arxiv_id']) is None:
+                summaries[language][paper['arxiv_id']] = generate_summary(
+                    paper['title'], paper.get('abstract', ''), paper['arxiv_id'], language)
+
+    for language in languages:
+        for paper in papers:
+            summary = summaries[language].get(paper['arxiv_id']) or recorded(paper['arxiv_id'], language)
+            # 失敗した要約は記録しない（同じ日付の再実行で生成し直す）
+            if not isinstance(summary, SummaryFailure):
+                for journal in journals[language]:
+                    if journal.get_summary(paper['arxiv_id']) is None:
+                        journal.record_summary(paper['arxiv_id'], summary)
+            paper.setdefault('summaries', {})[language] = summary
+    return papers
+
+
+def report_dry_run(papers: List[Dict], display_date: str) -> List[Dict]:
+    """ドライランで投稿予定の論文を表示"""
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info(f"[ドライラン] 以下の論文が投稿される予定です（Scirate日付: {display_date}）:")
+    logger.info("=" * 60)
+    for i, paper in enumerate(papers, 1):
+        logger.info(f"\n{i}. {paper['title']}")
+        logger.info(f"   arXiv: {paper['arxiv_id']}")
+        logger.info(f"   Scites: {paper['scites']}")
+        if paper.get('tenants', [DEFAULT_TENANT]) != [DEFAULT_TENANT]:
+            logger.info(f"   テナント: {', '.join(paper['tenants'])}")
+        for name, terms in paper.get('watched', {}).items():
+            label = "" if name == DEFAULT_TENANT else f" [{name}]"
+            logger.info(f"   ウォッチリスト一致{label}: {', '.join(terms)}")
         if paper['authors']:
-            authors_str = ", ".join(paper['authors'][:3])
+            authors = ', '.join(paper['authors'][:3])
             if len(paper['authors']) > 3:
-                authors_str += " et al."
-        else:
-            authors_str = "著者情報なし"
-
-        # Discordメッセージを作成
-        embed = {
-            "embeds": [{
-                "title": f"{i}. {paper['title']}",
-                "url": paper['url'],
-                "description": f"**要約**\n{summary}\n\n**著者:** {authors_str}\n**Scites:** {paper['scites']}",
-                "color": 5814783,
-                "footer": {
-                    "text": f"arXiv: {paper['arxiv_id']}"
-                },
-                "fields": [
-                    {
-                        "name": "リンク",
-                        "value": f"[arXiv]({paper['url']}) | [SciRate]({paper['scirate_url']})",
-                        "inline": False
-                    }
-                ]
-            }]
+                authors += ' et al.'
+            logger.info(f"   著者: {authors}")
+        if paper.get('abstract'):
+            logger.info(f"   Abstract: {paper['abstract'][:150]}...")
+        for related in paper.get('related', []):
+            logger.info(f"   近似重複: {related['arxiv_id']} - {related['title'][:60]}")
+        if paper.get('similar_posted'):
+            logger.info(f"   過去の投稿に類似: {paper['similar_posted']['arxiv_id']}"
+                        f"（{paper['similar_posted']['posted_date']}）")
+    logger.info("")
+    logger.info("[ドライラン] Discord投稿とGemini API呼び出しはスキップされました")
+    logger.info("[ドライラン] 投稿済みマークもスキップされました")
+    return papers
+
+
+def select_tenant_papers(papers: List[Dict], tenants: List[Dict], reserve: int = 0) -> List[Dict]:
+    """
+    テナントごとに担当カテゴリの上位N件から未投稿の論文を選び、論文ごとに1件にまとめる
+
+    各論文の 'tenants' に、その論文を投稿するテナント名を記録する。
+    投稿済みの論文は飛ばし、解析済みのランキング全体から次点を補充して枠（N件）を埋める（再取得はしない）。
+    'tenant_ranks'（テナント名 → 未投稿の中での順位）も付ける。
+    reserve を指定すると N+reserve 件を選ぶ（近似重複の繰り上げ用）。
+    ウォッチリストのあるテナントでは、一致した論文を優先し（route=filter では一致した論文だけを）選び、
+    'watched'（テナント名 → 一致した語）を付ける。
+    """
+    matcher = WatchlistMatcher(tenants)
+    matches = {}
+    if matcher:
+        start = time.perf_counter()
+        for paper in papers:
+            if paper['arxiv_id'] not in matches:
+                matches[paper['arxiv_id']] = matcher.match(paper)
+        logger.info(f"ウォッチリスト照合: {len(matches)}件中{sum(1 for m in matches.values() if m)}件が一致"
+                    f"（{(time.perf_counter() - start) * 1000:.1f}ms）")
+
+    by_id = {}
+    for tenant in tenants:
+        name = tenant['name']
+        candidates = {}
+        for paper in papers:
+            if paper.get('category') in tenant['categories']:
+                candidates.setdefault(paper['arxiv_id'], paper)
+        watched = {arxiv_id for arxiv_id, matched in matches.items() if name in matched}
+        if tenant.get('route') == 'filter' and (tenant.get('keywords') or tenant.get('authors')):
+            candidates = {arxiv_id: p for arxiv_id, p in candidates.items() if arxiv_id in watched}
+        # ウォッチリストに一致した論文を先に、それぞれscites順
+        ranked = sorted(candidates.values(), key=lambda p: (p['arxiv_id'] not in watched, -p['scites']))
+        targets = list(tenant_target_keys(tenant).values())
+        # 投稿済み（いずれの投稿先でも）を飛ばしながら、上位から N+reserve 件になるまで取り出す
+        quota = tenant['top_n'] + reserve
+        picked, scanned = [], 0
+        for scanned, paper in enumerate(ranked, 1):
+            if not posted_tracker.is_new(paper['arxiv_id'], targets or None):
+                logger.info(f"スキップ（投稿済み）: {paper['arxiv_id']}")
+                continue
+            picked.append(paper)
+            if len(picked) == quota:
+                break
+        if picked:
+            skipped = scanned - len(picked)
+            if skipped:
+                logger.info(f"  [{name}] 投稿済みの{skipped}件を飛ばし、{len(picked)}件目までを解析済みのランキングから補充")
+        if len(picked) < tenant['top_n']:
+            logger.warning(f"  [{name}] 未投稿の論文が{len(picked)}件しかありません（上位{tenant['top_n']}件の枠）")
+
+        for rank, paper in enumerate(picked):
+            if paper['arxiv_id'] in watched:
+                logger.info(f"  [{name}] ウォッチリスト一致: {paper['arxiv_id']}"
+                            f"（{', '.join(matches[paper['arxiv_id']][name])}）")
+            paper = by_id.setdefault(paper['arxiv_id'], paper)
+            paper.setdefault('tenants', []).append(name)
+            paper.setdefault('tenant_ranks', {})[name] = rank
+            if paper['arxiv_id'] in watched:
+                paper.setdefault('watched', {})[name] = matches[paper['arxiv_id']][name]
+    return list(by_id.values())
+
+
+def summarize_for_tenants(papers: List[Dict], tenants: List[Dict], journals: Dict[str, PostingJournal]) -> List[Dict]:
+    """必要な言語の組ごとに論文をまとめ、(論文, 言語) の組を1回ずつ要約する"""
+    languages = {}  # 言語 → その言語のテナント名
+    for tenant in tenants:
+        languages.setdefault(tenant['language'], []).append(tenant['name'])
+
+    groups = {}
+    for paper in papers:
+        needed = tuple(language for language, names in languages.items() if set(paper['tenants']) & set(names))
+        groups.setdefault(needed, []).append(paper)
+    for needed, group in groups.items():
+        summarize_papers(group, list(needed),
+                         {language: [journals[name] for name in languages[language]] for language in needed})
+    return papers
+
+
+def post_for_tenants(papers: List[Dict], tenants: List[Dict], journals: Dict[str, PostingJournal], date: str,
+                     period: Optional[str] = None):
+    """
+    テナントごとに、そのテナントが選んだ論文をscites順に投稿
+
+    period（week/month）を指定すると期間ダイジェストとして見出しに期間を付け、日次で投稿済みの論文も投稿する。
+    """
+    for tenant in tenants:
+        tenant_papers = sorted((p for p in papers if tenant['name'] in p['tenants']),
+                               key=lambda p: p['scites'], reverse=True)
+        if not tenant_papers:
+            continue
+        if len(tenants) > 1:
+            logger.info(f"[{tenant['name']}] {len(tenant_papers)}件を投稿します")
+        category = ", ".join(tenant['categories'])
+        if period:
+            label = DIGEST_LABELS[period][tenant['language']]
+            category = f"{category}（{label}）" if tenant['language'] == 'ja' else f"{category} ({label})"
+        # 投稿先ごとに、送信を確認できた論文から投稿済みとしてマークされる
+        post_to_discord(tenant_papers, tenant['language'], date=date, webhook_urls=tenant['webhooks'],
+                        journal=journals[tenant['name']], category=category, respect_posted=period is None,
+                        target_keys=tenant_target_keys(tenant), tenant=tenant['name'])
+
+
+def build_digest_pipeline(mode: str, date: str, profiler: Optional[StageProfiler] = None,
+                          tenants: Optional[List[Dict]] = None) -> Pipeline:
+    """
+    ダイジェストのパイプラインを構築
+
+    全テナントで必要な論文・(論文, 言語) の組を1回ずつ取得・要約し、投稿だけをテナントごとに行う。
+
+    Args:
+        mode: "normal"（通常）/ "dry_run"（投稿しない）/ "backfill"（日付指定で投稿）
+        date: 取得するScirateの日付（YYYY-MM-DD）
+        profiler: 指定するとステージごとにプロファイルする
+        tenants: テナントのリスト（省略時は load_tenants()）
+    """
+    tenants = tenants or load_tenants()
+    journals = {tenant['name']: PostingJournal(date, tenant=tenant['name']) for tenant in tenants}
+
+    # カテゴリごとに1回、ページ内のランキング全体を取得する
+    # （投稿済みの補充・ウォッチリストの照合・近似重複の繰り上げは、すべてこの解析済みリストから行う）
+    reserve = DEDUP_RESERVE if DEDUP_ENABLED else 0
+    categories = list(dict.fromkeys(category for tenant in tenants for category in tenant['categories']))
+
+    def fetch(dates):
+        papers = []
+        for d in dates:
+            for category in categories:
+                fetched, _ = get_top_papers_from_scirate(category, None, date=d)
+                for paper in fetched:
+                    paper['category'] = category
+                papers.extend(fetched)
+        return papers
+
+    def filter_new(papers):
+        papers = select_tenant_papers(papers, tenants, reserve=reserve)
+        if DEDUP_ENABLED:
+            # 近似重複はScirateページのタイトル・アブストラクトで、各テナントの上位N+reserve件の中だけを判定する
+            # （全件を待つfilterの中で行い、以降のenrich・summarizeはバッチごとに重ねて進める。
+            # 当日の全件をarXivで補完してから比較すると、enrichが全件を待つうえ問い合わせも全件分になる）
+            logger.info(f"  候補: {len(papers)}件（近似重複の繰り上げ候補 {reserve}件/テナントを含む）")
+            papers = collapse_near_duplicates(papers, tenants, reserve)
+        return log_selected(papers)
+
+    def log_selected(papers):
+        for paper in papers:
+            logger.info(f"  投稿対象: [{paper['scites']} scites] {paper['arxiv_id']} - {paper['title'][:60]}..."
+                        + (f" ({', '.join(paper['tenants'])})" if len(tenants) > 1 else ""))
+        return papers
+
+    def summarize(papers):
+        return summarize_for_tenants(papers, tenants, journals)
+
+    def post(papers):
+        post_for_tenants(papers, tenants, journals, date)
+        return papers
+
+    stages = [
+        Stage('fetch', fetch),
+        Stage('filter', filter_new),
+        Stage('enrich', enrich_papers_with_abstracts),
+    ]
+    if mode == 'dry_run':
+        stages.append(Stage('report', lambda papers: report_dry_run(papers, date)))
+    else:
+        stages.append(Stage('summarize', summarize))
+        stages.append(Stage('post', post))
+    return Pipeline(stages, profiler=profiler)
+
+
+# ===== 営業日スケジュール =====
+DAEMON_RUN_AT = os.environ.get('DAEMON_RUN_AT', '08:40')  # 常駐モードの実行時刻（JST）
+# 休業日（祝日・年末年始など）。カンマ・空白区切りの YYYY-MM-DD
+BOT_HOLIDAYS = os.environ.get('BOT_HOLIDAYS', "")
+
+
+class BusinessDaySchedule:
+    """
+    営業日（月〜金のうち休業日を除く日）の決まった時刻（JST）に実行するスケジュール
+    """
+    def __init__(self, run_at: str = DAEMON_RUN_AT, holidays: str = BOT_HOLIDAYS):
+        hour, minute = (int(x) for x in run_at.split(':'))
+        self.run_at = dt_time(hour, minute)
+        self.holidays = {
+            datetime.strptime(day, '%Y-%m-%d').date() for day in re.split(r'[\s,]+', holidays) if day
         }
 
-        try:
-            response = requests.post(DISCORD_WEBHOOK_URL, json=embed, timeout=10)
+    def is_business_day(self, day: dt_date) -> bool:
+        """営業日かどうか"""
+        return day.weekday() < 5 and day not in self.holidays
 
-            if response.status_code == 204:
-                logger.info(f"{i}件目を投稿しました: {paper['title'][:50]}...")
-            else:
-                logger.warning(f"{i}件目の投稿に失敗 (status: {response.status_code})")
-        except Exception as e:
-            logger.warning(f"{i}件目の投稿エラー: {e}")
+    def next_run(self, after: datetime) -> datetime:
+        """after より後の最初の実行時刻（JST）"""
+        after = after.astimezone(JST)
+        day = after.date()
+        while True:
+            candidate = datetime.combine(day, self.run_at, tzinfo=JST)
+            if candidate > after and self.is_business_day(day):
+                return candidate
+            day += timedelta(days=1)
+
+
+# グローバルスケジュール
+business_schedule = BusinessDaySchedule()
 
-        time.sleep(2)
 
-    logger.info(f"完了！{len(papers)}件の論文をDiscordに投稿しました")
+def previous_listing_date(today: Optional[datetime] = None) -> str:
+    """
+    前営業日（Scirateの掲載日）。日曜・土曜の前日は金曜に戻す
+
+    今日はスケジュールと同じく時計の現在時刻を日本時間で見る（UTCのホストでも朝の実行で前日を取り違えない）。
+    """
+    yesterday = (today or clock.now(JST)) - timedelta(days=1)
+    if yesterday.weekday() == 6:  # 日曜
+        yesterday -= timedelta(days=2)
+    elif yesterday.weekday() == 5:  # 土曜
+        yesterday -= timedelta(days=1)
+    return yesterday.strftime('%Y-%m-%d')
 
 
 # ===== メイン処理 =====
-def main(dry_run: bool = False, force_weekday: bool = False, date: Optional[str] = None):
+def main(dry_run: bool = False, force_weekday: bool = False, date: Optional[str] = None,
+         profile_dir: Optional[str] = None, tenants: Optional[List[Dict]] = None):
     """
     メイン処理
 
@@ -1189,6 +4177,8 @@ def main(dry_run: bool = False, force_weekday: bool = False, date: Optional[str]
         dry_run: Trueの場合、Discord投稿とGemini API呼び出しをスキップ
         force_weekday: Trueの場合、土日でも実行
         date: 日付指定（例: 2026-03-02）。指定時は平日チェックをスキップ
+        profile_dir: 指定するとステージごとのプロファイルをこのディレクトリに書き出す
+        tenants: テナントのリスト（省略時は load_tenants()。--replay で記録時の設定を使う）
     """
     logger.info("=" * 60)
     if dry_run:
@@ -1201,19 +4191,21 @@ def main(dry_run: bool = False, force_weekday: bool = False, date: Optional[str]
     if date:
         logger.info(f"日付指定モード: {date}")
 
-    # 平日チェック（土日はスキップ、ただしforce_weekdayまたはdate指定時は実行）
-    if not is_weekday() and not force_weekday and not date:
-        weekday_name = ['月', '火', '水', '木', '金', '土', '日'][datetime.now().weekday()]
-        logger.info(f"今日は{weekday_name}曜日です。平日のみ実行のためスキップします。")
-        logger.info("（土日でもテストしたい場合は --force-weekday オプションを使用）")
-        return
-
-    if not is_weekday() and force_weekday:
-        weekday_name = ['月', '火', '水', '木', '金', '土', '日'][datetime.now().weekday()]
-        logger.info(f"今日は{weekday_name}曜日ですが、--force-weekday により実行します。")
+    # 営業日チェック（土日・休業日はスキップ、ただしforce_weekdayまたはdate指定時は実行）
+    today = clock.now(JST).date()
+    if not business_schedule.is_business_day(today):
+        weekday_name = ['月', '火', '水', '木', '金', '土', '日'][today.weekday()]
+        day_desc = f"{weekday_name}曜日" if today.weekday() >= 5 else f"休業日（{today}）"
+        if not force_weekday and not date:
+            logger.info(f"今日は{day_desc}です。営業日のみ実行のためスキップします。")
+            logger.info("（土日でもテストしたい場合は --force-weekday オプションを使用）")
+            return
+        if force_weekday:
+            logger.info(f"今日は{day_desc}ですが、--force-weekday により実行します。")
 
     # 古いエントリをクリーンアップ
     posted_tracker.cleanup_old_entries()
+    PostingJournal.cleanup()
 
     # キャッシュ統計を表示
     cache_stats = summary_cache.get_stats()
@@ -1221,77 +4213,603 @@ def main(dry_run: bool = False, force_weekday: bool = False, date: Optional[str]
 
     # 日付指定がない場合は前日（前営業日）のScirateページを取得
     # （当日分はまだsciteが十分に集まっていないため）
+    date_specified = date is not None
     if not date:
-        yesterday = datetime.now() - timedelta(days=1)
-        # 日曜→金曜、土曜→金曜に戻す
-        if yesterday.weekday() == 6:  # 日曜
-            yesterday -= timedelta(days=2)
-        elif yesterday.weekday() == 5:  # 土曜
-            yesterday -= timedelta(days=1)
-        date = yesterday.strftime('%Y-%m-%d')
+        date = previous_listing_date()
         logger.info(f"前営業日の論文を取得: {date}")
 
-    # 1. Scirateから論文を取得
-    papers, scirate_date = get_top_papers_from_scirate(ARXIV_CATEGORY, TOP_N_PAPERS, date=date)
-
-    if not papers:
+    # パイプライン: 取得 → 投稿済み除外 → Abstract取得 → 要約 → 投稿
+    # （ドライランは Abstract取得 → 表示、日付指定はバックフィルとして同じパイプラインで実行）
+    mode = 'dry_run' if dry_run else ('backfill' if date_specified else 'normal')
+    logger.info(f"パイプライン実行: mode={mode}")
+    profiler = StageProfiler(Path(profile_dir)) if profile_dir else None
+    pipeline = build_digest_pipeline(mode, date, profiler=profiler, tenants=tenants)
+    if profiler:
+        profiler.start()
+    start = clock.monotonic()
+    try:
+        papers = pipeline.run([date])
+    finally:
+        if profiler:
+            profiler.write_reports(clock.monotonic() - start)
+            profiler.stop()
+
+    logger.info("パイプライン統計:")
+    pipeline.print_stats()
+    metrics.finish({name: stats['busy'] for name, stats in pipeline.stats.items()})
+    metrics.write()
+    avoided = metrics.total('arxiv_lookups_avoided')
+    if avoided:
+        logger.info(f"arXiv APIへの問い合わせを省略: {avoided:.0f}件（ScirateページのAbstract・ローカルストアを使用）")
+    if clock.elapsed_virtual():
+        logger.info(f"仮想時計: 経過 {clock.monotonic() - start:.1f}秒"
+                    f"（うち {clock.elapsed_virtual():.1f}秒の待機をスキップ）")
+    # 破棄した論文がある実行は、投稿できた分があっても失敗として終える（常駐モードでは last_result=error）
+    if pipeline.failures:
+        raise PipelineError(pipeline.failures)
+
+    if pipeline.stats['fetch']['items_out'] == 0:
         logger.error("論文が見つかりませんでした")
         return
+    if not papers:
+        logger.info("新規の論文がありませんでした（すべて投稿済み）")
+        return
+
+    if not dry_run:
+        # API使用量サマリーを表示
+        usage_tracker.print_summary()
 
-    # Scirateの表示日付をDiscordヘッダーに使用
-    display_date = scirate_date or date
+    logger.info("=" * 60)
+    logger.info("すべての処理が完了しました！")
+    logger.info("=" * 60)
 
-    logger.info(f"取得した論文: {len(papers)}件")
 
-    # 2. 投稿済みの論文をフィルタリング
-    papers = posted_tracker.filter_new_papers(papers)
+# ===== 週間・月間ダイジェスト =====
+DIGEST_PERIODS = {'week': 7, 'month': 30}  # 集計する日数
+DIGEST_LABELS = {'week': {'ja': '週間', 'en': 'weekly'}, 'month': {'ja': '月間', 'en': 'monthly'}}
+SCIRATE_PAGE_INTERVAL = 1.0  # 取得していないページを続けて取得する間隔（秒）
 
-    if not papers:
-        logger.info("新規の論文がありませんでした（すべて投稿済み）")
-        return
 
-    logger.info(f"投稿する論文（新規 {len(papers)}件）:")
-    for i, paper in enumerate(papers, 1):
-        logger.info(f"  {i}. [{paper['scites']} scites] {paper['arxiv_id']} - {paper['title'][:60]}...")
+def listing_dates(end: str, days: int) -> List[str]:
+    """end を含めて days 日間の平日（Scirateの掲載日）"""
+    end_day = datetime.strptime(end, '%Y-%m-%d')
+    dates = [end_day - timedelta(days=i) for i in range(days)]
+    return [d.strftime('%Y-%m-%d') for d in reversed(dates) if d.weekday() < 5]
+
+
+def rank_period(tenant: Dict, start: str, end: str) -> List[Dict]:
+    """履歴ストアからテナントの担当カテゴリを期間で集計し、上位N件を返す"""
+    best = {}
+    for category in tenant['categories']:
+        for entry in scites_history.top(category, start, end, tenant['top_n']):
+            if entry['scites'] > best.get(entry['arxiv_id'], {'scites': -1})['scites']:
+                best[entry['arxiv_id']] = entry
+    return sorted(best.values(), key=lambda e: e['scites'], reverse=True)[:tenant['top_n']]
+
+
+def record_scites_history(category: str, date: str) -> bool:
+    """
+    掲載日 date のScirateランキングを取得して履歴に記録する
+
+    ページのリンクから読んだ表示日付が date と異なる場合（掲載の無い日に別の日のページが返ったなど）は記録しない。
+
+    Returns:
+        履歴にその日が記録されたか（取得の失敗や、Scirateが別の日付を返した場合はFalse）
+    """
+    papers, page_date = fetch_scirate_ranking(category, date)
+    if papers is None:
+        logger.warning(f"[{category}] {date} のランキングを取得できず、履歴に記録できませんでした")
+        return False
+    if page_date and page_date != date:
+        logger.warning(f"[{category}] {date} を指定しましたがScirateは {page_date} のページを返しました。履歴には記録しません")
+        return False
+    scites_history.record(category, date, papers)
+    return True
 
-    # 3. 各論文のAbstractを取得
-    papers = enrich_papers_with_abstracts(papers)
 
+def run_period_digest(period: str, dry_run: bool = False, end_date: Optional[str] = None,
+                      tenants: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    週間・月間ダイジェスト
+
+    日次の実行で蓄積したランキングの履歴から期間の上位を集計する。履歴に無い掲載日のページだけを取得し、
+    上位N件だけをarXivで補完して要約・投稿する。
+    """
+    tenants = tenants or load_tenants()
+    end_date = end_date or previous_listing_date()
+    dates = listing_dates(end_date, DIGEST_PERIODS[period])
+    start_date = dates[0]
+    logger.info(f"{DIGEST_LABELS[period]['ja']}ダイジェスト: {start_date} 〜 {end_date}（掲載日 {len(dates)}日）")
+
+    # 履歴に無い日のページだけ取得して履歴に記録する
+    for category in dict.fromkeys(c for tenant in tenants for c in tenant['categories']):
+        missing = scites_history.missing_dates(category, dates)
+        if missing:
+            logger.info(f"[{category}] 履歴に無い{len(missing)}日分のページを取得します")
+        failed = []
+        for i, day in enumerate(missing):
+            if i:
+                sleep_tracker.sleep(SCIRATE_PAGE_INTERVAL)
+            if not record_scites_history(category, day):
+                failed.append(day)
+        if failed:
+            metrics.inc('period_days_missing', len(failed), category=category)
+            logger.error(f"[{category}] {len(failed)}日分の履歴がありません（{', '.join(failed)}）。"
+                         f"集計は残りの{len(dates) - len(failed)}日分だけで行います")
+
+    start = time.perf_counter()
+    by_id = {}
+    for tenant in tenants:
+        for entry in rank_period(tenant, start_date, end_date):
+            if entry['arxiv_id'] not in by_id:
+                by_id[entry['arxiv_id']] = Paper(entry['arxiv_id'], scites=entry['scites'], tenants=[])
+            by_id[entry['arxiv_id']]['tenants'].append(tenant['name'])
+    papers = sorted(by_id.values(), key=lambda p: p['scites'], reverse=True)
+    logger.info(f"ランキング集計: {len(papers)}件, {(time.perf_counter() - start) * 1000:.1f}ms")
+    if not papers:
+        logger.error("期間内の履歴がありません")
+        return []
+
+    # タイトル・著者・Abstractは上位の論文だけarXivから取得
+    enrich_papers_with_abstracts(papers)
     if dry_run:
-        # ドライランモード: Discord投稿とGemini APIをスキップ
-        logger.info("")
-        logger.info("=" * 60)
-        logger.info(f"[ドライラン] 以下の論文が投稿される予定です（Scirate日付: {display_date}）:")
-        logger.info("=" * 60)
-        for i, paper in enumerate(papers, 1):
-            logger.info(f"\n{i}. {paper['title']}")
-            logger.info(f"   arXiv: {paper['arxiv_id']}")
-            logger.info(f"   Scites: {paper['scites']}")
-            if paper['authors']:
-                authors = ', '.join(paper['authors'][:3])
-                if len(paper['authors']) > 3:
-                    authors += ' et al.'
-                logger.info(f"   著者: {authors}")
-            if paper.get('abstract'):
-                logger.info(f"   Abstract: {paper['abstract'][:150]}...")
-        logger.info("")
-        logger.info("[ドライラン] Discord投稿とGemini API呼び出しはスキップされました")
-        logger.info("[ドライラン] 投稿済みマークもスキップされました")
-    else:
-        # 通常モード: Discordに投稿
-        # 4. Discordに投稿（バッチモードを使用してRPD節約）
-        post_to_discord(papers, SUMMARY_LANGUAGE, use_batch=True, date=display_date)
+        return report_dry_run(papers, f"{start_date} 〜 {end_date}")
 
-        # 5. 投稿した論文をマーク
-        for paper in papers:
-            posted_tracker.mark_as_posted(paper['arxiv_id'])
+    journals = {tenant['name']: PostingJournal(end_date, tenant=f"{tenant['name']}-{period}") for tenant in tenants}
+    summarize_for_tenants(papers, tenants, journals)
+    post_for_tenants(papers, tenants, journals, end_date, period=period)
+    usage_tracker.print_summary()
+    return papers
 
-        # API使用量サマリーを表示
-        usage_tracker.print_summary()
 
-    logger.info("=" * 60)
-    logger.info("すべての処理が完了しました！")
-    logger.info("=" * 60)
+# ===== 記録・再生（本番の実行をオフラインで再現） =====
+RECORDING_FORMAT = "scirate-recording"
+RECORDING_VERSION = 1
+REPLAY_TIMINGS = ('recorded', 'fast')
+# 記録に残すレスポンスヘッダー（本文は展開済みで保存するので Content-Encoding 等は落とす）
+RECORDED_RESPONSE_HEADERS = ('content-type', 'retry-after', 'x-ratelimit-limit', 'x-ratelimit-remaining',
+                             'x-ratelimit-reset-after', 'x-ratelimit-bucket', 'x-ratelimit-global')
+# 再生時に記録時と同じ接続先を使う設定（スタンドインに向けた記録もそのまま再生できる）
+RECORDED_ENDPOINTS = ('SCIRATE_BASE_URL', 'ARXIV_API_URL', 'GEMINI_BASE_URL')
+WEBHOOK_TOKEN_RE = re.compile(r'(/api/webhooks/\d+/)(?!redacted-)([^/?#\s]+)')
+
+
+def redact_url(url: str) -> str:
+    """URL中のWebhookトークンをハッシュに置き換える（記録に秘密を残さず、再生時も同じURLで照合できる。置換済みはそのまま）"""
+    return WEBHOOK_TOKEN_RE.sub(
+        lambda m: m.group(1) + "redacted-" + hashlib.sha256(m.group(2).encode('utf-8')).hexdigest()[:12], url)
+
+
+class TrafficRecorder:
+    """
+    外部へのHTTP通信（Scirate・arXiv・Gemini・Discord）を記録・再生するクラス
+
+    記録（mode='record'）: 実際に通信し、リクエスト・レスポンス・所要時間を順に記録する。
+    再生（mode='replay'）: 記録からレスポンスを返し、ネットワークには出ない。
+    照合はまず (メソッド, URL, リクエスト本文) の完全一致、無ければ (メソッド, クエリを除いたURL) で
+    記録順に使う（コードを変えてプロンプト等が変わっても、同じエンドポイントへの応答を返せる）。
+
+    Args:
+        timing: 再生時の待ち方。'recorded' は記録時の所要時間だけ待ち、'fast' は待たない
+    """
+    def __init__(self, mode: str = 'record', exchanges: Optional[List[Dict]] = None, timing: str = 'recorded'):
+        self.mode = mode
+        self.timing = timing
+        self.exchanges = exchanges or []
+        self.started_at = clock.monotonic()
+        self.unmatched = []  # 再生時に記録が無かったリクエスト (メソッド, URL)
+        self._used = set()
+        self._exact = {}
+        self._by_path = {}
+        for i, exchange in enumerate(self.exchanges):
+            self._exact.setdefault(self._exact_key(exchange['method'], exchange['url'], exchange['request_body']),
+                                   []).append(i)
+            self._by_path.setdefault(self._path_key(exchange['method'], exchange['url']), []).append(i)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _exact_key(method: str, url: str, body: bytes) -> tuple:
+        return method, url, hashlib.sha256(body or b'').hexdigest()
+
+    @staticmethod
+    def _path_key(method: str, url: str) -> tuple:
+        return method, url.split('?', 1)[0]
+
+    def record(self, method: str, url: str, request_body: bytes, status: int, headers: Dict[str, str],
+               body: bytes, started: float, elapsed: float):
+        """1回の通信を記録"""
+        with self._lock:
+            self.exchanges.append({
+                'method': method,
+                'url': redact_url(url),
+                'request_body': request_body or b'',
+                'status': status,
+                'headers': {k.lower(): redact_url(v) for k, v in headers.items()
+                            if k.lower() in RECORDED_RESPONSE_HEADERS},
+                'body': body,
+                'offset': round(started - self.started_at, 4),
+                'elapsed': round(elapsed, 4),
+            })
+
+    def replay(self, method: str, url: str, request_body: bytes) -> Optional[Dict]:
+        """記録からレスポンスを取り出す（無ければNone）。timing='recorded' なら記録時の所要時間だけ待つ"""
+        url = redact_url(url)
+        with self._lock:
+            index = None
+            for candidates in (self._exact.get(self._exact_key(method, url, request_body or b''), []),
+                               self._by_path.get(self._path_key(method, url), [])):
+                index = next((i for i in candidates if i not in self._used), None)
+                if index is not None:
+                    break
+            if index is None:
+                self.unmatched.append((method, url))
+                return None
+            self._used.add(index)
+        exchange = self.exchanges[index]
+        if self.timing == 'recorded':
+            clock.sleep(exchange['elapsed'])
+        return exchange
+
+    def stats(self) -> Dict:
+        """再生の集計（記録件数・使用件数・記録に無かった件数）"""
+        return {'recorded': len(self.exchanges), 'used': len(self._used), 'unmatched': len(self.unmatched)}
+
+    def to_bundle(self, meta: Dict, state: bytes) -> bytes:
+        """
+        記録をバンドル（tar.gz）にまとめる
+
+        manifest.json（形式・バージョン・実行条件・通信の一覧）と state.tar.gz（開始時の状態）、
+        bodies/ 以下に各通信のリクエスト・レスポンス本文を入れる。
+        """
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz', compresslevel=6) as tar:
+            def add(name: str, data: bytes):
+                info = tarfile.TarInfo(name=name)
+                info.size = len(data)
+                info.mtime = int(clock.time())
+                tar.addfile(info, io.BytesIO(data))
+
+            entries = []
+            for i, exchange in enumerate(self.exchanges):
+                add(f"bodies/{i:05d}.req", exchange['request_body'])
+                add(f"bodies/{i:05d}.res", exchange['body'])
+                entries.append({k: v for k, v in exchange.items() if k not in ('request_body', 'body')})
+            add("state.tar.gz", state)
+            add(STATE_MANIFEST_NAME, json.dumps({
+                'format': RECORDING_FORMAT,
+                'version': RECORDING_VERSION,
+                'created_at': clock.now().isoformat(timespec='seconds'),
+                'run': meta,
+                'exchanges': entries,
+            }, ensure_ascii=False, indent=2).encode('utf-8'))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bundle(cls, data: bytes, timing: str = 'recorded') -> tuple:
+        """
+        バンドルを読み込む
+
+        Returns:
+            (再生用の TrafficRecorder, 実行条件, 開始時の状態バンドル)
+
+        Raises:
+            ValueError: バンドルの形式・バージョンが不正な場合
+        """
+        try:
+            tar = tarfile.open(fileobj=io.BytesIO(data), mode='r:gz')
+        except (tarfile.TarError, OSError) as e:
+            raise ValueError(f"記録バンドルを開けません: {e}")
+        with tar:
+            members = {m.name: m for m in tar.getmembers() if m.isfile()}
+            if STATE_MANIFEST_NAME not in members:
+                raise ValueError("記録バンドルにマニフェストがありません")
+            manifest = json.loads(tar.extractfile(members[STATE_MANIFEST_NAME]).read().decode('utf-8'))
+            if manifest.get('format') != RECORDING_FORMAT:
+                raise ValueError(f"未知のバンドル形式です: {manifest.get('format')}")
+            if manifest.get('version', 0) > RECORDING_VERSION:
+                raise ValueError(f"バンドルのバージョン {manifest.get('version')} はサポート外です"
+                                 f"（対応: {RECORDING_VERSION}以下）")
+            exchanges = []
+            for i, entry in enumerate(manifest.get('exchanges', [])):
+                exchanges.append(dict(entry,
+                                      request_body=tar.extractfile(members[f"bodies/{i:05d}.req"]).read(),
+                                      body=tar.extractfile(members[f"bodies/{i:05d}.res"]).read()))
+            state = tar.extractfile(members["state.tar.gz"]).read()
+        return cls('replay', exchanges, timing=timing), manifest.get('run', {}), state
+
+
+class RecordingAdapter(requests.adapters.HTTPAdapter):
+    """requests のセッションに付けて、通信を TrafficRecorder に記録・再生するアダプタ"""
+    def __init__(self, recorder: TrafficRecorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    def build_recorded_response(self, request, status: int, headers: Dict[str, str], body: bytes,
+                                url: Optional[str] = None) -> requests.Response:
+        """記録した内容からレスポンスを作る（stream=True で raw を読む呼び出し元にも対応）"""
+        response = requests.Response()
+        response.status_code = status
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response.url = url or request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(self, request, **kwargs):
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else (request.body or b'')
+        if self.recorder.mode == 'replay':
+            exchange = self.recorder.replay(request.method, request.url, body)
+            if exchange is None:
+                raise requests.exceptions.ConnectionError(f"記録に無いリクエストです: {request.method} {request.url}",
+                                                          request=request)
+            return self.build_recorded_response(request, exchange['status'], exchange['headers'], exchange['body'])
+
+        started = clock.monotonic()
+        real = super().send(request, **kwargs)
+        content = real.content
+        real.close()
+        self.recorder.record(request.method, request.url, body, real.status_code, dict(real.headers),
+                             content, started, clock.monotonic() - started)
+        headers = {k: v for k, v in real.headers.items()
+                   if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        return self.build_recorded_response(request, real.status_code, headers, content, url=real.url)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Geminiクライアント（httpx）の通信を TrafficRecorder に記録・再生するトランスポート"""
+    def __init__(self, recorder: TrafficRecorder):
+        self.recorder = recorder
+        self.inner = httpx.HTTPTransport() if recorder.mode == 'record' else None
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        if self.recorder.mode == 'replay':
+            exchange = self.recorder.replay(request.method, str(request.url), body)
+            if exchange is None:
+                raise httpx.ConnectError(f"記録に無いリクエストです: {request.method} {request.url}", request=request)
+            return httpx.Response(exchange['status'], headers=exchange['headers'], content=exchange['body'],
+                                  request=request)
+
+        started = clock.monotonic()
+        real = self.inner.handle_request(request)
+        content = real.read()
+        real.close()
+        self.recorder.record(request.method, str(request.url), body, real.status_code, dict(real.headers),
+                             content, started, clock.monotonic() - started)
+        headers = {k: v for k, v in real.headers.items()
+                   if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        return httpx.Response(real.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        if self.inner:
+            self.inner.close()
+
+
+def install_traffic_recorder(recorder: TrafficRecorder) -> Dict:
+    """
+    共有HTTPセッションとGeminiクライアントの通信を recorder 経由にする
+
+    再生時はAPIキーが無くてもGeminiクライアントを作る（記録した応答を返すため）。
+
+    Returns:
+        uninstall_traffic_recorder() に渡す、元の状態
+    """
+    global gemini_client
+    previous = {'adapters': dict(http_session.adapters), 'gemini_client': gemini_client}
+    adapter = RecordingAdapter(recorder)
+    http_session.mount('https://', adapter)
+    http_session.mount('http://', adapter)
+    if gemini_client or recorder.mode == 'replay':
+        gemini_client = genai.Client(
+            api_key=GEMINI_API_KEY or "replay",
+            http_options=types.HttpOptions(base_url=GEMINI_BASE_URL or None,
+                                           httpx_client=httpx.Client(transport=RecordingTransport(recorder))),
+        )
+    return previous
+
+
+def uninstall_traffic_recorder(previous: Dict):
+    """install_traffic_recorder() の前の状態に戻す"""
+    global gemini_client
+    http_session.adapters.clear()
+    for prefix, adapter in previous['adapters'].items():
+        http_session.mount(prefix, adapter)
+    gemini_client = previous['gemini_client']
+
+
+def redact_tenants(tenants: List[Dict]) -> List[Dict]:
+    """
+    記録に残すテナント設定（WebhookのトークンはURLごとハッシュに置き換える）
+
+    再生時も記録時と同じ投稿先の投稿済み記録・ジャーナルを使うよう、元のURLから求めた投稿先キーを
+    'target_keys' に残す。
+    """
+    return [dict(tenant, webhooks=[redact_url(url) for url in tenant['webhooks']],
+                 target_keys={redact_url(url): key for url, key in tenant_target_keys(tenant).items()})
+            for tenant in tenants]
+
+
+def run_recorded(path: str, dry_run: bool = False, force_weekday: bool = False, date: Optional[str] = None,
+                 profile_dir: Optional[str] = None) -> int:
+    """
+    --record: 通常どおり実行し、外部との通信と開始時の状態をバンドルに書き出す（終了コードを返す）
+    """
+    tenants = load_tenants()
+    meta = {
+        'date': date or previous_listing_date(),
+        'dry_run': dry_run,
+        'tenants': redact_tenants(tenants),
+        'endpoints': {name: globals()[name] for name in RECORDED_ENDPOINTS},
+    }
+    state = export_state_bundle()
+    recorder = TrafficRecorder('record')
+    previous = install_traffic_recorder(recorder)
+    start = clock.monotonic()
+    try:
+        main(dry_run=dry_run, force_weekday=force_weekday, date=date, profile_dir=profile_dir, tenants=tenants)
+    finally:
+        uninstall_traffic_recorder(previous)
+        meta['duration_seconds'] = round(clock.monotonic() - start, 3)
+        data = recorder.to_bundle(meta, state)
+        Path(path).write_bytes(data)
+        logger.info(f"実行を記録しました: {path}（通信 {len(recorder.exchanges)}件, {len(data) / 1024:.1f}KB）")
+    return 0
+
+
+def run_replay(path: str, timing: str = 'recorded', profile_dir: Optional[str] = None) -> int:
+    """
+    --replay: 記録バンドルの状態から、記録した通信だけを使ってオフラインで再実行する（終了コードを返す）
+
+    一時ディレクトリに開始時の状態を展開してそこで実行するため、手元のキャッシュ・投稿履歴は変わらない。
+    timing='fast' ではボット自身の待機（レート制限・リトライ）も仮想時計で進め、実際には待たない。
+    """
+    global clock
+    try:
+        recorder, meta, state = TrafficRecorder.from_bundle(Path(path).read_bytes(), timing=timing)
+    except (OSError, ValueError) as e:
+        logger.error(f"記録バンドルを読み込めません: {e}")
+        return 1
+
+    profile_dir = str(Path(profile_dir).resolve()) if profile_dir else None
+    # 作業ディレクトリ・接続先・時計はどこで失敗しても finally で元に戻す
+    original_cwd = Path.cwd()
+    endpoints = {name: globals()[name] for name in RECORDED_ENDPOINTS}
+    original_clock = clock
+    previous = None
+    with tempfile.TemporaryDirectory(prefix="scirate-replay-") as workdir:
+        try:
+            import_state_bundle(state, cache_dir=Path(workdir) / CACHE_DIR)
+            os.chdir(workdir)
+            reload_state()
+            globals().update({name: value for name, value in meta.get('endpoints', {}).items()
+                              if name in RECORDED_ENDPOINTS})
+            if timing == 'fast':
+                clock = VirtualClock()
+            previous = install_traffic_recorder(recorder)
+            logger.info(f"再生: {path}（{meta.get('date')}, 通信 {len(recorder.exchanges)}件, timing={timing}）")
+            start, real_start = clock.monotonic(), time.perf_counter()
+            main(dry_run=meta.get('dry_run', False), force_weekday=True, date=meta.get('date'),
+                 profile_dir=profile_dir, tenants=meta.get('tenants'))
+            elapsed, real_elapsed = clock.monotonic() - start, time.perf_counter() - real_start
+        finally:
+            if previous is not None:
+                uninstall_traffic_recorder(previous)
+            globals().update(endpoints)
+            clock = original_clock
+            os.chdir(original_cwd)
+            reload_state()
+
+    stats = recorder.stats()
+    logger.info(f"再生完了: 実時間 {real_elapsed:.2f}秒, 経過時間 {elapsed:.2f}秒"
+                f"（記録時 {meta.get('duration_seconds', 0):.2f}秒）, 記録 {stats['recorded']}件中 {stats['used']}件を使用, 記録に無いリクエスト {stats['unmatched']}件")
+    for method, url in recorder.unmatched[:10]:
+        logger.warning(f"   記録に無いリクエスト: {method} {url}")
+    return 0
+
+
+# ===== 常駐モード =====
+HEALTH_HOST = os.environ.get('HEALTH_HOST', "127.0.0.1")
+HEALTH_PORT = int(os.environ.get('HEALTH_PORT', "8787"))
+
+
+class HealthServer:
+    """
+    常駐モードの状態を返すローカルHTTPサーバー
+
+    GET /healthz: 直近の実行結果と次回の実行時刻（JSON、直近の実行が失敗していれば503）
+    GET /metrics: 直近の実行のメトリクス（OpenMetrics形式）
+    """
+    def __init__(self, status: Dict, host: str = HEALTH_HOST, port: int = HEALTH_PORT):
+        self.status = status
+        health = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/healthz':
+                    code = 503 if health.status.get('last_result') == 'error' else 200
+                    body = json.dumps(health.status, ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json'
+                elif self.path == '/metrics':
+                    code, body = 200, metrics.to_openmetrics().encode('utf-8')
+                    content_type = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+                else:
+                    code, body, content_type = 404, b'', 'text/plain'
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.5,), daemon=True).start()
+        logger.info(f"ヘルスチェック: http://{self.server.server_address[0]}:{self.port}/healthz")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_scheduled_digest(status: Dict, state_backend: Optional[StateBackend] = None):
+    """常駐モードの1回分の実行（メトリクスを新しくし、終了後に状態を書き出す）"""
+    global metrics
+    metrics = RunMetrics()
+    sleep_tracker.reset()
+
+    status['last_run_started'] = clock.now(JST).isoformat(timespec='seconds')
+    try:
+        main(force_weekday=True)
+        status['last_result'] = 'ok'
+        status.pop('last_error', None)
+    except Exception as e:
+        logger.error(f"定時実行でエラー: {e}")
+        status['last_result'] = 'error'
+        status['last_error'] = str(e)
+    status['last_run_finished'] = clock.now(JST).isoformat(timespec='seconds')
+    status['runs'] = status.get('runs', 0) + 1
+
+    # プロセスが落ちても状態を失わないよう、実行ごとに書き出す
+    if state_backend:
+        persist_state(state_backend)
+
+
+def run_daemon(schedule: BusinessDaySchedule = None, health_port: Optional[int] = HEALTH_PORT,
+               state_backend: Optional[StateBackend] = None, stop_event: Optional[threading.Event] = None):
+    """
+    常駐モード: 営業日の決まった時刻に実行し、それ以外は待機する
+
+    キャッシュ・投稿履歴・HTTPセッション・Geminiクライアントはプロセス内に保持したまま使い回す。
+    """
+    schedule = schedule or business_schedule
+    stop_event = stop_event or threading.Event()
+    status = {'started_at': clock.now(JST).isoformat(timespec='seconds'), 'runs': 0}
+    health = HealthServer(status, port=health_port).start() if health_port is not None else None
+
+    logger.info(f"常駐モードで起動しました（営業日 {schedule.run_at:%H:%M} JST に実行）")
+    try:
+        while not stop_event.is_set():
+            next_run = schedule.next_run(clock.now(JST))
+            status['next_run'] = next_run.isoformat(timespec='seconds')
+            logger.info(f"次回の実行: {next_run:%Y-%m-%d %H:%M} JST")
+            if stop_event.wait(max(0.0, (next_run - clock.now(JST)).total_seconds())):
+                break
+            run_scheduled_digest(status, state_backend)
+    finally:
+        if health:
+            health.stop()
+        logger.info("常駐モードを終了しました")
 
 
 def parse_args():
@@ -1306,6 +4824,16 @@ def parse_args():
   python scirate_discord_bot.py --dry-run --force-weekday  # 土日でもドライラン
   python scirate_discord_bot.py --date 2026-03-02  # 特定日付の論文を投稿
   python scirate_discord_bot.py --date 2026-03-02 --dry-run  # 特定日付をドライラン
+  python scirate_discord_bot.py --dry-run --profile  # ステージごとにプロファイル
+  python scirate_discord_bot.py --export-state state.tar.gz  # 状態をバンドルに書き出し
+  python scirate_discord_bot.py --import-state state.tar.gz  # バンドルから状態を復元
+  python scirate_discord_bot.py --report 30        # 直近30回の実行傾向（p50/p95）
+  python scirate_discord_bot.py --daemon           # 常駐して営業日の決まった時刻に実行
+  python scirate_discord_bot.py --digest week      # 履歴から今週の人気論文を集計して投稿
+  python scirate_discord_bot.py --search "surface code decoder"  # 投稿済み論文を全文検索
+  python scirate_discord_bot.py --prefetch-arxiv   # 投稿前にarXivの新着をローカルに一括取得
+  python scirate_discord_bot.py --record run.tar.gz  # 実行し、通信と開始時の状態を記録
+  python scirate_discord_bot.py --replay run.tar.gz --replay-timing fast  # 記録をオフラインで再実行
         '''
     )
     parser.add_argument(
@@ -1324,8 +4852,103 @@ def parse_args():
         default=None,
         help='特定の日付の論文を取得（例: 2026-03-02）'
     )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=f"profile/{clock.now().strftime('%Y%m%d-%H%M%S')}",
+        default=None,
+        metavar='DIR',
+        help='ステージごとに cProfile/tracemalloc で計測し、.pstats と割り当てレポートを書き出す'
+    )
+    parser.add_argument(
+        '--export-state',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='PATH',
+        help='状態（キャッシュ・投稿履歴・使用量）をバンドルに書き出して終了（PATH省略時はSTATE_BACKENDへ）'
+    )
+    parser.add_argument(
+        '--import-state',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='PATH',
+        help='バンドルから状態を復元して終了（PATH省略時はSTATE_BACKENDから）'
+    )
+    parser.add_argument(
+        '--report',
+        nargs='?',
+        type=int,
+        const=30,
+        default=None,
+        metavar='N',
+        help='直近N回（省略時30回）の実行メトリクスの傾向を表示して終了'
+    )
+    parser.add_argument(
+        '--search',
+        type=str,
+        default=None,
+        metavar='QUERY',
+        help='投稿済み論文をタイトル・著者・アブストラクト・要約から検索して終了（関連度と新しさで順位付け）'
+    )
+    parser.add_argument(
+        '--search-limit',
+        type=int,
+        default=10,
+        metavar='N',
+        help='検索結果の表示件数（デフォルト: 10）'
+    )
+    parser.add_argument(
+        '--prefetch-arxiv',
+        nargs='*',
+        default=None,
+        metavar='CATEGORY',
+        help='arXivの新着メタデータを一括取得してローカルに保存し終了（省略時はテナント設定の全カテゴリ）'
+    )
+    parser.add_argument(
+        '--digest',
+        choices=sorted(DIGEST_PERIODS),
+        default=None,
+        help='日次の履歴から週間・月間の上位を集計して投稿（--date で期間の最終日を指定）'
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='通常どおり実行し、外部との通信（所要時間付き）と開始時の状態をバンドルに記録する'
+    )
+    parser.add_argument(
+        '--replay',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='--record のバンドルから、記録した通信だけを使ってオフラインで再実行して終了'
+    )
+    parser.add_argument(
+        '--replay-timing',
+        choices=REPLAY_TIMINGS,
+        default='recorded',
+        help='再生時の応答の待ち方（recorded: 記録時の所要時間だけ待つ / fast: 待たない）'
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help=f'常駐し、営業日の {DAEMON_RUN_AT} JST（DAEMON_RUN_AT）に実行する'
+    )
+    parser.add_argument(
+        '--health-port',
+        type=int,
+        default=HEALTH_PORT,
+        metavar='PORT',
+        help=f'常駐モードのヘルスチェック/メトリクスのポート（デフォルト: {HEALTH_PORT}、負の値で無効）'
+    )
     args = parser.parse_args()
 
+    if (args.export_state == '' or args.import_state == '') and not STATE_BACKEND:
+        parser.error("PATHを省略する場合は環境変数 STATE_BACKEND を設定してください")
+
     # --date のフォーマットバリデーション
     if args.date:
         try:
@@ -1336,6 +4959,85 @@ def parse_args():
     return args
 
 
+def run_state_command(export_path: Optional[str], import_path: Optional[str]) -> int:
+    """--export-state / --import-state を実行（終了コードを返す）"""
+    if export_path is not None:
+        if export_path:
+            data = export_state_bundle()
+            Path(export_path).write_bytes(data)
+            logger.info(f"状態を書き出しました: {export_path} ({len(data) / 1024:.1f}KB)")
+            return 0
+        return 0 if persist_state(get_state_backend(STATE_BACKEND)) else 1
+
+    if import_path:
+        try:
+            start = clock.monotonic()
+            count = import_state_bundle(Path(import_path).read_bytes())
+        except (OSError, ValueError) as e:
+            logger.error(f"状態の復元に失敗: {e}")
+            return 1
+        logger.info(f"状態を復元しました: {count}ファイル, {clock.monotonic() - start:.3f}秒")
+        return 0
+    return 0 if restore_state(get_state_backend(STATE_BACKEND)) else 1
+
+
 if __name__ == "__main__":
+    setup_logging()
     args = parse_args()
-    main(dry_run=args.dry_run, force_weekday=args.force_weekday, date=args.date)
+    if args.report is not None:
+        print(format_metrics_report(load_metrics_history(args.report)))
+        raise SystemExit(0)
+    if args.search is not None:
+        search_start = time.perf_counter()
+        results = search_index.search(args.search, limit=args.search_limit)
+        print(format_search_results(results))
+        logger.info(f"検索: {len(results)}件, {(time.perf_counter() - search_start) * 1000:.1f}ms")
+        raise SystemExit(0)
+    if args.export_state is not None or args.import_state is not None:
+        raise SystemExit(run_state_command(args.export_state, args.import_state))
+    if args.replay:
+        raise SystemExit(run_replay(args.replay, timing=args.replay_timing, profile_dir=args.profile))
+
+    # 状態バックエンドが設定されていれば、ウォームスタートのため復元してから実行
+    state_backend = get_state_backend(STATE_BACKEND)
+    if state_backend:
+        restore_state(state_backend)
+
+    if args.prefetch_arxiv is not None:
+        categories = args.prefetch_arxiv or list(dict.fromkeys(
+            category for tenant in load_tenants() for category in tenant['categories']))
+        try:
+            for category in categories:
+                arxiv_store.harvest(category)
+        finally:
+            if state_backend:
+                persist_state(state_backend)
+        raise SystemExit(0)
+
+    if args.digest:
+        try:
+            run_period_digest(args.digest, dry_run=args.dry_run, end_date=args.date)
+        finally:
+            if state_backend and not args.dry_run:
+                persist_state(state_backend)
+        raise SystemExit(0)
+
+    if args.daemon:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        try:
+            run_daemon(health_port=args.health_port if args.health_port >= 0 else None,
+                       state_backend=state_backend, stop_event=stop_event)
+        except KeyboardInterrupt:
+            pass
+        raise SystemExit(0)
+
+    try:
+        if args.record:
+            run_recorded(args.record, dry_run=args.dry_run, force_weekday=args.force_weekday, date=args.date,
+                         profile_dir=args.profile)
+        else:
+            main(dry_run=args.dry_run, force_weekday=args.force_weekday, date=args.date, profile_dir=args.profile)
+    finally:
+        if state_backend and not args.dry_run:
+            persist_state(state_backend)
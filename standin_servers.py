@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Scirate Discord Bot - ローカルスタンドインサーバー
+外部サービスの代わりにローカルで動くHTTPサーバー（テスト・ベンチマーク用）
+
+使い方:
+    with S3Standin() as s3:
+        backend = S3StateBackend(bucket="test", key="state.tar.gz", endpoint_url=s3.url)
+
+    # 遅延・エラー率を指定して劣化状態を再現
+    with ArxivStandin(latency=0.2, error_rate=0.3) as arxiv:
+        ...
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+
+class StandinServer:
+    """
+    バックグラウンドスレッドで動くHTTPサーバーの基底クラス
+    サブクラスは handle(method, path, headers, body) を実装する
+
+    Args:
+        latency: 各レスポンスの前に入れる遅延（秒）
+        error_rate: 503（Retry-After付き）を返す確率
+        throttle_rate: 429（Retry-After付き）を返す確率
+        retry_after: 503/429 の Retry-After（秒）
+        seed: 障害注入の乱数シード（再現性のため）
+        clock: monotonic()/sleep() を持つ時計（ボットの仮想時計を渡すと遅延・レート制限も仮想時間で動く）
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1, seed: int = 0,
+                 clock=time):
+        self.requests = []  # (method, path) の記録
+        self.clock = clock
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.injected = {503: 0, 429: 0}  # 注入した障害の回数
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with standin._lock:
+                    standin.requests.append((self.command, self.path))
+                if standin.latency:
+                    standin.clock.sleep(standin.latency)
+                fault = standin._inject_fault()
+                if fault:
+                    status, headers, payload = fault
+                else:
+                    status, headers, payload = standin.handle(self.command, self.path, self.headers, body)
+                with standin._lock:
+                    standin.bytes_sent += len(payload)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            do_GET = do_PUT = do_POST = do_HEAD = do_DELETE = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        raise NotImplementedError
+
+    def _inject_fault(self):
+        """error_rate/throttle_rate に従って 503/429 のレスポンスを返す（注入しない場合はNone）"""
+        if not (self.error_rate or self.throttle_rate):
+            return None
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.error_rate:
+                status = 503
+            elif roll < self.error_rate + self.throttle_rate:
+                status = 429
+            else:
+                return None
+            self.injected[status] += 1
+        body = json.dumps({
+            'error': {'code': status, 'message': 'injected by standin', 'status': 'UNAVAILABLE' if status == 503 else 'RESOURCE_EXHAUSTED'},
+            'retry_after': self.retry_after,
+        }).encode()
+        return status, {'Content-Type': 'application/json', 'Retry-After': str(self.retry_after)}, body
+
+    def reset(self):
+        """記録をクリア（ベンチマークの実行ごと）"""
+        with self._lock:
+            self.requests.clear()
+            self.injected = {503: 0, 429: 0}
+            self.bytes_sent = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ===== S3互換オブジェクトストレージ =====
+class S3Standin(StandinServer):
+    """
+    パス形式（/bucket/key）のGET/PUT/HEAD/DELETEだけを扱うS3スタンドイン
+    SigV4のAuthorizationヘッダーが無いリクエストは403を返す
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects: Dict[str, bytes] = {}
+
+    def handle(self, method, path, headers, body):
+        if not (headers.get('Authorization') or '').startswith('AWS4-HMAC-SHA256 '):
+            return 403, {}, b'<Error><Code>AccessDenied</Code></Error>'
+
+        if method == 'PUT':
+            self.objects[path] = body
+            return 200, {'ETag': '"standin"'}, b''
+        if method in ('GET', 'HEAD'):
+            if path not in self.objects:
+                return 404, {}, b'<Error><Code>NoSuchKey</Code></Error>'
+            return 200, {'Content-Type': 'application/octet-stream'}, self.objects[path]
+        if method == 'DELETE':
+            self.objects.pop(path, None)
+            return 204, {}, b''
+        return 405, {}, b''
+
+
+# ===== Discord Webhook =====
+class DiscordWebhookStandin(StandinServer):
+    """
+    Discord Webhookのスタンドイン
+    バケット単位のレート制限（X-RateLimit-*ヘッダー・429のretry_after）を再現し、受信したメッセージを記録する
+
+    Args:
+        limit: 1ウィンドウあたりのリクエスト数
+        window: ウィンドウの長さ（秒）
+        force_429: 最初のN回のリクエストに無条件で429を返す
+    """
+    def __init__(self, limit: int = 5, window: float = 2.0, force_429: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.window = window
+        self.force_429 = force_429
+        self.messages = []  # (path, payload)
+        self.rate_limited = 0
+        self._windows = {}  # path → (window_start, count)
+
+    def handle(self, method, path, headers, body):
+        if method != 'POST':
+            return 405, {}, b''
+
+        parsed = urlparse(path)
+        route = parsed.path
+        now = self.clock.monotonic()
+        with self._lock:
+            start, count = self._windows.get(route, (now, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            reset_after = max(0.0, self.window - (now - start))
+
+            if self.force_429 > 0 or count >= self.limit:
+                self.force_429 = max(0, self.force_429 - 1)
+                self.rate_limited += 1
+                body_out = json.dumps({
+                    'message': 'You are being rate limited.',
+                    'retry_after': round(reset_after, 3) or 0.01,
+                    'global': False,
+                }).encode()
+                return 429, {
+                    'Content-Type': 'application/json',
+                    'X-RateLimit-Limit': str(self.limit),
+                    'X-RateLimit-Remaining': '0',
+                    'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+                    'X-RateLimit-Bucket': f"bucket{route}",
+                }, body_out
+
+            count += 1
+            self._windows[route] = (start, count)
+            self.messages.append((route, json.loads(body or b'{}')))
+            message_id = str(len(self.messages))
+
+        rate_headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.limit - count),
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+            'X-RateLimit-Bucket': f"bucket{route}",
+        }
+        if parse_qs(parsed.query).get('wait') == ['true']:
+            rate_headers['Content-Type'] = 'application/json'
+            return 200, rate_headers, json.dumps({'id': message_id}).encode()
+        return 204, rate_headers, b''
+
+
+# ===== 合成データ =====
+def synthetic_papers(count: int, seed: int = 0) -> List[Dict]:
+    """スタンドイン用の合成論文（LaTeXを含むタイトル・Abstract）"""
+    rng = random.Random(seed)
+    topics = ["surface codes", "variational circuits", "Rydberg arrays", "bosonic qubits",
+              "quantum chemistry", "magic state distillation", "Hamiltonian learning", "tensor networks"]
+    papers = []
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        papers.append({
+            'arxiv_id': f"2603.{10000 + i:05d}",
+            'title': f"Scalable {topic} with $O(\\sqrt{{n}})$ overhead and fidelity $F>0.99$ (part {i})",
+            'abstract': " ".join(
+                f"We study {topic} in the regime $\\epsilon \\ll 1$ and show a bound of $|\\psi\\rangle$ sample complexity {rng.randint(2, 99)}."
+                for _ in range(6)
+            ),
+            'authors': [f"Author {i}-{j}" for j in range(rng.randint(1, 6))],
+            'scites': rng.randint(0, 80),
+        })
+    return papers
+
+
+# ===== Scirate =====
+class ScirateStandin(StandinServer):
+    """
+    Scirateのカテゴリページ（/arxiv/<category>）のスタンドイン
+    実ページと同じ構造（div.paperlist > ul.papers > div.row）のHTMLを返す
+
+    Args:
+        papers: ページに載せる論文（synthetic_papers の形式）
+        padding: ページに付け足すHTMLのバイト数（実ページのサイズを再現）
+        abstracts: 実ページと同じく各論文のAbstract（div.abstract）を載せるか
+        served_date: 指定すると、要求された日付に関係なくこの日のページを返す（掲載の無い日の再現）
+    """
+    def __init__(self, papers: List[Dict], padding: int = 0, abstracts: bool = True,
+                 served_date: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.papers = papers
+        self.padding = padding
+        self.abstracts = abstracts
+        self.served_date = served_date
+
+    def render(self, date: str) -> bytes:
+        rows = []
+        for paper in self.papers:
+            authors = ", ".join(f'<a href="/search?q=au:{escape(a)}">{escape(a)}</a>' for a in paper['authors'])
+            abstract = paper.get('abstract') if self.abstracts else None
+            rows.append(
+                f'<li><div class="row">'
+                f'<div class="scites-count"><button class="count">{paper["scites"]}</button></div>'
+                f'<div class="title"><a href="/arxiv/{paper["arxiv_id"]}">{escape(paper["title"])}</a></div>'
+                f'<div class="authors">{authors}</div>'
+                f'<div class="uid">arXiv:{paper["arxiv_id"]}v1</div>'
+                + (f'<div class="abstract">{escape(abstract)}</div>' if abstract else '') +
+                f'</div></li>'
+            )
+        prev_day = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        html = (
+            f'<html><body><a href="/arxiv/quant-ph?date={prev_day}">Prev day</a>'
+            f'<div class="paperlist"><ul class="papers">{"".join(rows)}</ul></div>'
+            f'<!-- {"x" * self.padding} --></body></html>'
+        )
+        return html.encode('utf-8')
+
+    def handle(self, method, path, headers, body):
+        parsed = urlparse(path)
+        if method != 'GET' or not parsed.path.startswith('/arxiv/'):
+            return 404, {}, b''
+        date = self.served_date or parse_qs(parsed.query).get('date', ['2026-03-02'])[0]
+        return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.render(date)
+
+
+# ===== arXiv API =====
+class ArxivStandin(StandinServer):
+    """
+    arXiv API（/api/query?id_list=... と ?search_query=cat:...&start=...&max_results=...）のスタンドイン
+    未知のIDには実APIと同じく title が "Error" のエントリを返す
+    一覧（search_query）は papers の並び順を新しい順として、opensearch:totalResults 付きのページを返す
+    """
+    def __init__(self, papers: List[Dict], **kwargs):
+        super().__init__(**kwargs)
+        self.papers = {p['arxiv_id']: p for p in papers}
+
+    def _entry(self, arxiv_id: str) -> str:
+        paper = self.papers.get(arxiv_id)
+        if paper is None:
+            return (f'<entry><id>http://arxiv.org/api/errors#incorrect_id_format_for_{arxiv_id}</id>'
+                    f'<title>Error</title><summary>incorrect id format for {arxiv_id}</summary></entry>')
+        authors = "".join(f"<author><name>{escape(a)}</name></author>" for a in paper['authors'])
+        return (f'<entry><id>http://arxiv.org/abs/{arxiv_id}v1</id>'
+                f'<published>{paper.get("published", "2026-03-01")}T18:00:00Z</published>'
+                f'<title>{escape(paper["title"])}</title>'
+                f'<summary>{escape(paper["abstract"])}</summary>{authors}</entry>')
+
+    def handle(self, method, path, headers, body):
+        parsed = urlparse(path)
+        if method != 'GET' or parsed.path != '/api/query':
+            return 404, {}, b''
+        query = parse_qs(parsed.query)
+        total = ''
+        if 'search_query' in query:
+            category = query['search_query'][0].split('cat:', 1)[-1]
+            listed = [i for i, p in self.papers.items() if category in p.get('categories', [category])]
+            start, count = int(query.get('start', ['0'])[0]), int(query.get('max_results', ['10'])[0])
+            ids = listed[start:start + count]
+            total = f'<opensearch:totalResults>{len(listed)}</opensearch:totalResults>'
+        else:
+            ids = [i for i in query.get('id_list', [''])[0].split(',') if i]
+        feed = ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom" '
+                'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+                + total + "".join(self._entry(i) for i in ids) + '</feed>')
+        return 200, {'Content-Type': 'application/atom+xml; charset=utf-8'}, feed.encode('utf-8')
+
+
+# ===== Gemini API =====
+class GeminiStandin(StandinServer):
+    """
+    Gemini API（/v1beta/models/<model>:generateContent）のスタンドイン
+    バッチプロンプト（[1] タイトル: ...）には [番号] 形式で、単体プロンプトには1つの要約を返す
+    JSONモード（responseMimeType=application/json）では、プロンプトの「出力形式: [...]」の言語キーで配列を返す
+    システム指示はプロンプトの先頭に付けて解釈する
+    """
+    BATCH_ITEM_RE = re.compile(r'^\[(\d+)\] タイトル: (.+)$', re.MULTILINE)
+    JSON_FORMAT_RE = re.compile(r'^出力形式: (\[.*\])$', re.MULTILINE)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []  # (model, 送信されたプロンプト文字数)
+
+    @staticmethod
+    def _text(content: Optional[Dict]) -> str:
+        return "".join(part.get('text', '') for part in (content or {}).get('parts', []))
+
+    def handle(self, method, path, headers, body):
+        request = json.loads(body or b'{}') if method == 'POST' else {}
+        match = re.match(r'^/v1beta/models/([^/:]+):generateContent', path)
+        if method != 'POST' or not match:
+            return 404, {}, b''
+        sent = "".join(self._text(content) for content in request.get('contents', []))
+        prompt = self._text(request.get('systemInstruction')) + sent
+        with self._lock:
+            self.calls.append((match.group(1), len(sent)))
+
+        items = self.BATCH_ITEM_RE.findall(prompt)
+        json_format = self.JSON_FORMAT_RE.search(prompt)
+        if request.get('generationConfig', {}).get('responseMimeType') == 'application/json' and json_format:
+            languages = [key for key in json.loads(json_format.group(1))[0] if key != 'id']
+            text = json.dumps([
+                {'id': int(num), **{language: f"[{language}] {title[:60]} の要約。" for language in languages}}
+                for num, title in items
+            ], ensure_ascii=False)
+        elif items:
+            text = "\n".join(f"[{num}] {title[:60]} の要約。具体的な手法と結果を2文で述べる。" for num, title in items)
+        else:
+            text = "スタンドインによる要約。具体的な手法と結果を2文で述べる。"
+
+        prompt_tokens = len(prompt) // 4
+        output_tokens = len(text) // 2
+        response = {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': output_tokens,
+                'totalTokenCount': prompt_tokens + output_tokens,
+            },
+            'modelVersion': match.group(1),
+        }
+        return 200, {'Content-Type': 'application/json'}, json.dumps(response, ensure_ascii=False).encode('utf-8')
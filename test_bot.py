@@ -15,6 +15,7 @@ from scirate_discord_bot import (
     get_top_papers_from_scirate,
     enrich_papers_with_abstracts,
     generate_summary,
+    setup_logging,
     ARXIV_CATEGORY,
     SUMMARY_LANGUAGE,
 )
@@ -73,4 +74,5 @@ def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
@@ -4,21 +4,84 @@ Scirate Discord Bot - ユニットテスト
 外部API不要、pytest で実行可能
 """
 
+import io
 import json
+import logging
+import os
+import subprocess
+import sys
+import tarfile
 import time
 import tempfile
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
 import pytest
 
 from scirate_discord_bot import (
     convert_latex_to_unicode,
-    is_weekday,
     RateLimiter,
     SummaryCache,
     PostedPapersTracker,
+    export_state_bundle,
+    import_state_bundle,
+    LocalDirStateBackend,
+    S3StateBackend,
+    get_state_backend,
+    build_paper_embed,
+    embed_char_count,
+    pack_embed_messages,
+    DiscordClient,
+    post_to_discord,
+    webhook_target_key,
+    PostingJournal,
+    summarize_papers,
+    Pipeline,
+    PipelineError,
+    Stage,
+    main,
+    StageProfiler,
+    SleepTracker,
+    RunMetrics,
+    load_metrics_history,
+    format_metrics_report,
+    _percentile,
+    get_top_papers_from_scirate,
+    VirtualClock,
+    load_tenants,
+    ScitesHistory,
+    record_scites_history,
+    SearchIndex,
+    find_near_duplicates,
+    collapse_near_duplicates,
+    select_tenant_papers,
+    post_for_tenants,
+    WatchlistMatcher,
+    Paper,
+    UNKNOWN_TITLE,
+    author_key,
+    listing_dates,
+    generate_multilingual_summaries,
+    build_digest_pipeline,
+    BusinessDaySchedule,
+    HealthServer,
+    JST,
+    previous_listing_date,
+    enrich_papers_with_abstracts,
+    ArxivMetadataStore,
+    GeminiContextCache,
+    APIUsageTracker,
+    generate_summary,
+    setup_logging,
+    stop_logging,
+    parse_log_levels,
+    TrafficRecorder,
+    install_traffic_recorder,
+    uninstall_traffic_recorder,
+)
+from standin_servers import (
+    S3Standin, DiscordWebhookStandin, ScirateStandin, ArxivStandin, GeminiStandin, synthetic_papers,
 )
 
 
@@ -53,6 +116,17 @@ class TestConvertLatexToUnicode:
         result = convert_latex_to_unicode(r"$\frac{a}{b}$")
         assert "a/b" in result
 
+    def test_frac_unbraced(self):
+        r"""中括弧なしの \frac12 は1文字ずつ引数として読む"""
+        assert convert_latex_to_unicode(r"$\frac12$") == "1/2"
+        assert convert_latex_to_unicode(r"$\frac\alpha2$") == "α/2"
+        assert convert_latex_to_unicode(r"$\frac 1{n}$") == "1/n"
+
+    def test_currency_dollars_untouched(self):
+        """通貨の$は数式区間として扱わない"""
+        assert convert_latex_to_unicode("cost $5 and $10") == "cost $5 and $10"
+        assert convert_latex_to_unicode(r"$2 \times 10^{9}$ for $20 and $x$") == "2 × 10⁹ for $20 and x"
+
     def test_sqrt(self):
         result = convert_latex_to_unicode(r"$\sqrt{x}$")
         assert "√x" in result
@@ -136,35 +210,48 @@ class TestConvertLatexToUnicode:
         result = convert_latex_to_unicode(r"$\widetilde{\mathcal{O}}$")
         assert "𝒪" in result
 
+    def test_longest_match_commands(self):
+        r"""\notin や \infty が \in として途中で置換されない"""
+        assert convert_latex_to_unicode(r"$x \notin A$") == "x ∉ A"
+        assert convert_latex_to_unicode(r"$n \in \mathbb{N}, n \to \infty$") == "n ∈ ℕ, n → ∞"
+
+    def test_nested_braces(self):
+        result = convert_latex_to_unicode(r"$\frac{1}{\sqrt{2}}$")
+        assert result == "1/√2"
+
+    def test_ket(self):
+        assert convert_latex_to_unicode(r"$\ket{\psi}$") == "|ψ⟩"
+
+    def test_superscript_command(self):
+        assert convert_latex_to_unicode(r"$a^\dagger$") == "a†"
 
-# ===== is_weekday =====
 
-class TestIsWeekday:
-    """平日チェックのテスト"""
+# ===== 前営業日 =====
 
-    @patch("scirate_discord_bot.datetime")
-    def test_monday_is_weekday(self, mock_dt):
-        mock_dt.now.return_value = datetime(2026, 3, 16)  # Monday
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-        assert is_weekday() is True
+class _FixedClock(VirtualClock):
+    """指定したUNIX時刻から進む仮想時計"""
+    def __init__(self, when: datetime):
+        super().__init__()
+        self.start = when.timestamp()
 
-    @patch("scirate_discord_bot.datetime")
-    def test_friday_is_weekday(self, mock_dt):
-        mock_dt.now.return_value = datetime(2026, 3, 20)  # Friday
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-        assert is_weekday() is True
+    def time(self) -> float:
+        return self.start + self.elapsed_virtual()
 
-    @patch("scirate_discord_bot.datetime")
-    def test_saturday_is_not_weekday(self, mock_dt):
-        mock_dt.now.return_value = datetime(2026, 3, 21)  # Saturday
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-        assert is_weekday() is False
 
-    @patch("scirate_discord_bot.datetime")
-    def test_sunday_is_not_weekday(self, mock_dt):
-        mock_dt.now.return_value = datetime(2026, 3, 22)  # Sunday
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-        assert is_weekday() is False
+class TestPreviousListingDate:
+    """前営業日（Scirateの掲載日）のテスト"""
+
+    def test_uses_jst_on_utc_host(self):
+        # 火曜 8:40 JST = 月曜 23:40 UTC。月曜の掲載日を取得する
+        when = datetime(2026, 3, 2, 23, 40, tzinfo=timezone.utc)
+        with patch("scirate_discord_bot.clock", _FixedClock(when)):
+            assert previous_listing_date() == "2026-03-02"
+
+    def test_monday_goes_back_to_friday(self):
+        when = datetime(2026, 3, 2, 8, 40, tzinfo=JST)  # 月曜 8:40 JST
+        with patch("scirate_discord_bot.clock", _FixedClock(when)):
+            assert previous_listing_date() == "2026-02-27"
+        assert previous_listing_date(datetime(2026, 3, 8, tzinfo=JST)) == "2026-03-06"  # 日曜
 
 
 # ===== RateLimiter =====
@@ -194,6 +281,20 @@ class TestRateLimiter:
         assert rl.rpm_limit == 20
         assert rl.interval == 3.0  # 60 / 20
 
+    def test_virtual_clock_skips_waits(self):
+        virtual = VirtualClock()
+        tracker = SleepTracker()
+        with patch("scirate_discord_bot.clock", virtual), patch("scirate_discord_bot.sleep_tracker", tracker):
+            rl = RateLimiter(rpm_limit=2)
+            start = time.monotonic()
+            for _ in range(3):
+                rl.wait_if_needed()
+            real_elapsed = time.monotonic() - start
+
+        assert real_elapsed < 1.0
+        assert virtual.elapsed_virtual() >= 59.0  # 30秒間隔 + 1分あたり2回の制限
+        assert tracker.total() == pytest.approx(virtual.elapsed_virtual(), abs=0.5)
+
 
 # ===== SummaryCache =====
 
@@ -232,6 +333,16 @@ class TestSummaryCache:
             assert stats["total_entries"] == 2
 
 
+    def test_expiry_follows_injected_clock(self):
+        virtual = VirtualClock()
+        with tempfile.TemporaryDirectory() as tmpdir, patch("scirate_discord_bot.clock", virtual):
+            cache = SummaryCache(cache_dir=Path(tmpdir))
+            cache.set("2603.12345", "abstract", "要約")
+            virtual.sleep(23 * 3600)
+            assert cache.get("2603.12345", "abstract") == "要約"
+            virtual.sleep(2 * 3600)  # 仮想時計で有効期限（24時間）を過ぎる
+            assert cache.get("2603.12345", "abstract") is None
+
 # ===== PostedPapersTracker =====
 
 class TestPostedPapersTracker:
@@ -275,6 +386,16 @@ class TestPostedPapersTracker:
             assert len(result) == 1
             assert result[0]["arxiv_id"] == "2603.00002"
 
+    def test_per_target_tracking(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracker = self._make_tracker(tmpdir)
+            tracker.mark_as_posted("2603.00001", target="a")
+            assert tracker.is_posted("2603.00001", target="a") is True
+            assert tracker.is_posted("2603.00001", target="b") is False
+            papers = [{"arxiv_id": "2603.00001"}, {"arxiv_id": "2603.00002"}]
+            assert len(tracker.filter_new_papers(papers, targets=["a"])) == 1
+            assert len(tracker.filter_new_papers(papers, targets=["a", "b"])) == 2
+
     def test_cleanup_old_entries(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             tracker = self._make_tracker(tmpdir)
@@ -285,3 +406,1150 @@ class TestPostedPapersTracker:
             tracker.cleanup_old_entries(days=60)
             assert "2603.00001" not in tracker.posted["papers"]
             assert "2603.00002" in tracker.posted["papers"]
+
+
+# ===== 状態バンドル =====
+
+class TestStateBundle:
+    """状態バンドルとバックエンドのテスト"""
+
+    def _populate(self, cache_dir):
+        cache = SummaryCache(cache_dir=cache_dir)
+        cache.set("2603.12345", "abstract", "要約テスト")
+        (cache_dir / "posted_papers.json").write_text(
+            json.dumps({"papers": {"2603.12345": datetime.now().isoformat()}, "last_date": None}),
+            encoding="utf-8",
+        )
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            self._populate(Path(src))
+            count = import_state_bundle(export_state_bundle(Path(src)), Path(dst))
+            assert count == 2
+            restored = SummaryCache(cache_dir=Path(dst))
+            assert restored.get("2603.12345", "abstract") == "要約テスト"
+            assert (Path(dst) / "posted_papers.json").read_bytes() == (Path(src) / "posted_papers.json").read_bytes()
+
+    def test_rejects_newer_version(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            self._populate(Path(src))
+            with patch("scirate_discord_bot.STATE_BUNDLE_VERSION", 99):
+                data = export_state_bundle(Path(src))
+            with pytest.raises(ValueError):
+                import_state_bundle(data, Path(dst))
+
+    def test_rejects_garbage(self):
+        with tempfile.TemporaryDirectory() as dst:
+            with pytest.raises(ValueError):
+                import_state_bundle(b"not a bundle", Path(dst))
+
+    def test_bundle_times_follow_clock(self):
+        when = datetime(2026, 3, 2, 23, 40, tzinfo=timezone.utc)
+        with tempfile.TemporaryDirectory() as src, patch("scirate_discord_bot.clock", _FixedClock(when)):
+            SummaryCache(cache_dir=Path(src)).set("2603.00001", "a", "s")
+            data = export_state_bundle(Path(src))
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+            manifest = json.loads(tar.extractfile("manifest.json").read())
+            assert tar.getmember("manifest.json").mtime == int(when.timestamp())
+        assert datetime.fromisoformat(manifest["created_at"]) == datetime.fromtimestamp(when.timestamp())
+
+    def test_restore_is_fast(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            cache = SummaryCache(cache_dir=Path(src))
+            cache.cache = {
+                f"key{i}": {"arxiv_id": f"2603.{i:05d}", "summary": "要約" * 50, "timestamp": datetime.now().isoformat()}
+                for i in range(2000)
+            }
+            cache._save_cache()
+            data = export_state_bundle(Path(src))
+            start = time.process_time()
+            with patch("tarfile.TarFile.extractfile", autospec=True, side_effect=tarfile.TarFile.extractfile) as read:
+                count = import_state_bundle(data, Path(dst))
+            # マニフェストと各ファイルを1回ずつ読むだけで展開し、1秒を大きく下回る
+            # （CIの混雑に左右されないよう、実時間ではなくこのプロセスのCPU時間で測る）
+            assert read.call_count == count + 1
+            assert time.process_time() - start < 1.0
+            assert len(SummaryCache(cache_dir=Path(dst)).cache) == 2000
+
+    def test_local_dir_backend(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = get_state_backend(f"dir:{tmpdir}/state")
+            assert isinstance(backend, LocalDirStateBackend)
+            assert backend.load() is None
+            backend.save(b"bundle")
+            assert backend.load() == b"bundle"
+
+    def test_s3_backend_spec(self):
+        backend = get_state_backend("s3://my-bucket/scirate")
+        assert isinstance(backend, S3StateBackend)
+        assert backend.bucket == "my-bucket"
+        assert backend.key == "scirate/scirate_state.tar.gz"
+
+    def test_s3_backend_roundtrip(self):
+        with S3Standin() as s3:
+            backend = S3StateBackend(
+                bucket="state", key="bot/scirate_state.tar.gz", endpoint_url=s3.url,
+                access_key="test", secret_key="secret",
+            )
+            assert backend.load() is None
+            backend.save(b"bundle-bytes")
+            assert backend.load() == b"bundle-bytes"
+            assert ("PUT", "/state/bot/scirate_state.tar.gz") in s3.requests
+
+
+# ===== Embedのパッキング =====
+
+def _paper(i, title="Paper"):
+    arxiv_id = f"2603.{i:05d}"
+    return {
+        "arxiv_id": arxiv_id, "title": f"{title} {i}", "scites": 10, "authors": ["A", "B"],
+        "url": f"https://arxiv.org/abs/{arxiv_id}", "scirate_url": f"https://scirate.com/arxiv/{arxiv_id}",
+    }
+
+
+class TestPackEmbedMessages:
+    """Embedを1メッセージにまとめるパッカーのテスト"""
+
+    def test_digest_fits_one_message(self):
+        embeds = [build_paper_embed(i, _paper(i), "短い要約") for i in range(1, 9)]
+        messages = pack_embed_messages("header", embeds)
+        assert len(messages) == 1
+        assert messages[0]["content"] == "header"
+        assert len(messages[0]["embeds"]) == 8
+
+    def test_split_on_embed_count(self):
+        embeds = [build_paper_embed(i, _paper(i), "要約") for i in range(1, 13)]
+        messages = pack_embed_messages("header", embeds)
+        assert [len(m["embeds"]) for m in messages] == [10, 2]
+        assert "content" not in messages[1]
+
+    def test_split_on_total_chars(self):
+        embeds = [build_paper_embed(i, _paper(i), "x" * 2500) for i in range(1, 6)]
+        messages = pack_embed_messages("header", embeds)
+        for message in messages:
+            assert sum(embed_char_count(e) for e in message["embeds"]) <= 6000
+        assert sum(len(m["embeds"]) for m in messages) == 5
+        assert [len(m["embeds"]) for m in messages] == [2, 2, 1]
+
+    def test_order_preserved(self):
+        embeds = [build_paper_embed(i, _paper(i), "x" * 1500) for i in range(1, 9)]
+        titles = [e["title"] for m in pack_embed_messages("", embeds) for e in m["embeds"]]
+        assert titles == [e["title"] for e in embeds]
+
+    def test_long_embed_truncated(self):
+        embed = build_paper_embed(1, _paper(1, title="T" * 300), "x" * 5000)
+        assert len(embed["title"]) <= 256
+        assert len(embed["description"]) <= 4096
+
+    def test_oversized_embed_fits_alone(self):
+        related = [{"arxiv_id": f"2603.{i:05d}", "url": "https://arxiv.org/abs/x", "title": "R" * 200} for i in range(6)]
+        paper = dict(_paper(1, title="T" * 300), related=related)
+        embed = build_paper_embed(1, paper, "要約" * 2000, watch_terms=["w" * 40] * 30)
+        assert embed_char_count(embed) > 6000
+
+        messages = pack_embed_messages("", [embed, build_paper_embed(2, _paper(2), "x" * 10)])
+        fitted = messages[0]["embeds"][0]
+        assert embed_char_count(fitted) <= 6000
+        # タイトル・リンク・要約の冒頭は残り、元のEmbedは変更しない
+        assert fitted["title"] == embed["title"] and fitted["fields"][0] == embed["fields"][0]
+        assert fitted["description"].startswith("**要約**\n要約要約")
+        assert embed_char_count(embed) > 6000
+
+# ===== DiscordClient =====
+
+class TestDiscordClient:
+    """レート制限ヘッダー対応のDiscordクライアントのテスト"""
+
+    def test_respects_bucket_without_429(self):
+        with DiscordWebhookStandin(limit=3, window=0.3) as discord:
+            client = DiscordClient()
+            url = f"{discord.url}/api/webhooks/1/token"
+            for i in range(7):
+                response = client.execute_webhook(url, {"content": str(i)})
+                assert response.status_code == 204
+            assert len(discord.messages) == 7
+            assert discord.rate_limited == 0
+            stats = client.get_stats()
+            assert list(stats) == ["bucket/api/webhooks/1/token"]
+            assert stats["bucket/api/webhooks/1/token"]["requests"] == 7
+
+    def test_retries_after_429(self):
+        with DiscordWebhookStandin(limit=5, window=0.1, force_429=2) as discord:
+            client = DiscordClient()
+            response = client.execute_webhook(f"{discord.url}/api/webhooks/1/token", {"content": "x"})
+            assert response.status_code == 204
+            assert len(discord.messages) == 1
+            (stats,) = client.get_stats().values()
+            assert stats["rate_limited"] == 2
+
+    def test_gives_up_after_max_retries(self):
+        with DiscordWebhookStandin(limit=5, window=0.1, force_429=10) as discord:
+            client = DiscordClient(max_retries=1)
+            response = client.execute_webhook(f"{discord.url}/api/webhooks/1/token", {"content": "x"})
+            assert response.status_code == 429
+            assert discord.messages == []
+
+
+# ===== 複数Webhookへのファンアウト =====
+
+class TestFanOut:
+    """複数Webhookへの並行投稿のテスト"""
+
+    def _tracker(self, tmpdir):
+        tracker = PostedPapersTracker()
+        tracker.posted_file = Path(tmpdir) / "posted_papers.json"
+        tracker.posted = {"papers": {}, "targets": {}, "last_date": None}
+        return tracker
+
+    def test_fan_out_and_resend_only_missing(self):
+        papers = [_paper(i) for i in range(1, 4)]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                DiscordWebhookStandin(limit=10, window=1) as good, \
+                DiscordWebhookStandin(limit=10, window=1, force_429=100) as bad:
+            tracker = self._tracker(tmpdir)
+            good_url = f"{good.url}/api/webhooks/1/a"
+            bad_url = f"{bad.url}/api/webhooks/2/b"
+            with patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.discord_client", DiscordClient(max_retries=0)), \
+                    patch("scirate_discord_bot.generate_summary", return_value="要約") as summarize:
+                journal = PostingJournal("2026-03-02", journal_dir=Path(tmpdir) / "journal")
+                results = post_to_discord(papers, webhook_urls=[good_url, bad_url], journal=journal)
+                assert len(results[webhook_target_key(good_url)]) == 3
+                assert results[webhook_target_key(bad_url)] == []
+                assert summarize.call_count == 3  # 要約は投稿先の数に関係なく1回ずつ
+                assert len(good.messages) == 1
+
+                # 失敗した投稿先だけに再送される
+                bad.force_429 = 0
+                results = post_to_discord(papers, webhook_urls=[good_url, bad_url], journal=journal)
+                assert results[webhook_target_key(good_url)] == []
+                assert len(results[webhook_target_key(bad_url)]) == 3
+                assert len(good.messages) == 1
+                assert len(bad.messages) == 1
+
+
+# ===== 投稿ジャーナル =====
+
+class TestPostingJournal:
+    """再開可能な投稿ジャーナルのテスト"""
+
+    def test_resume_reuses_summaries_and_ranks(self):
+        papers = [_paper(i) for i in range(1, 5)]
+        with tempfile.TemporaryDirectory() as tmpdir, DiscordWebhookStandin(limit=10, window=1) as discord:
+            tracker = PostedPapersTracker()
+            tracker.posted_file = Path(tmpdir) / "posted_papers.json"
+            tracker.posted = {"papers": {}, "targets": {}, "last_date": None}
+            url = f"{discord.url}/api/webhooks/1/a"
+            target = webhook_target_key(url)
+
+            # 1回目: 2件目までの要約生成と1メッセージ目の送信後に落ちた状況を再現
+            journal = PostingJournal("2026-03-02", journal_dir=Path(tmpdir))
+            journal.assign_ranks([p["arxiv_id"] for p in papers])
+            journal.record_summary("2603.00001", "要約1")
+            journal.record_summary("2603.00002", "要約2")
+            journal.record_message(target, "111", ["2603.00001", "2603.00002"], has_header=True)
+
+            # 2回目: 新しいインスタンスで再開
+            journal = PostingJournal("2026-03-02", journal_dir=Path(tmpdir))
+            with patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.discord_client", DiscordClient()), \
+                    patch("scirate_discord_bot.generate_summary", return_value="新しい要約") as summarize:
+                results = post_to_discord(papers[2:], webhook_urls=[url], journal=journal)
+
+            assert results[target] == ["2603.00003", "2603.00004"]
+            assert summarize.call_count == 2
+            (route, payload), = discord.messages
+            assert "content" not in payload  # ヘッダーは送信済み
+            assert [e["title"].split(".")[0] for e in payload["embeds"]] == ["3", "4"]
+
+            saved = json.loads((Path(tmpdir) / "2026-03-02.json").read_text(encoding="utf-8"))
+            assert saved["targets"][target]["acked"]["2603.00003"] == "1"  # ?wait=true で取得したID
+
+    def test_failed_summary_is_not_journaled(self):
+        papers = [dict(_paper(1), abstract="Abstract 1"), dict(_paper(2), abstract="")]
+        with tempfile.TemporaryDirectory() as tmpdir, DiscordWebhookStandin(limit=10, window=1) as discord:
+            tracker = PostedPapersTracker()
+            tracker.posted_file = Path(tmpdir) / "posted_papers.json"
+            tracker.posted = {"papers": {}, "targets": {}, "last_date": None}
+            url = f"{discord.url}/api/webhooks/1/a"
+            journal = PostingJournal("2026-03-02", journal_dir=Path(tmpdir))
+            with patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.discord_client", DiscordClient()), \
+                    patch("scirate_discord_bot.gemini_client", None):
+                post_to_discord(papers, webhook_urls=[url], journal=journal)
+
+            # 投稿には失敗メッセージを使うが、再実行で生成し直せるようジャーナルには残さない
+            (_, payload), = discord.messages
+            assert "APIキーが設定されていません" in payload["embeds"][0]["description"]
+            assert "Abstractが取得できませんでした" in payload["embeds"][1]["description"]
+            assert journal.data["summaries"] == {}
+
+    def test_pipeline_regenerates_failed_summary(self):
+        papers = [dict(_paper(1), abstract="Abstract 1")]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal = PostingJournal("2026-03-02", journal_dir=Path(tmpdir))
+            with patch("scirate_discord_bot.gemini_client", None):
+                summarize_papers(papers, ["ja"], {"ja": [journal]})
+            assert "APIキーが設定されていません" in papers[0]["summaries"]["ja"]
+            assert journal.get_summary("2603.00001") is None
+
+            # 再実行では失敗を再利用せず生成し直す
+            with patch("scirate_discord_bot.generate_batch_summaries", return_value={"2603.00001": "要約1"}):
+                summarize_papers(papers, ["ja"], {"ja": [journal]})
+            assert journal.get_summary("2603.00001") == "要約1"
+
+    def test_cleanup(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / "2000-01-01.json").write_text("{}")
+            PostingJournal.cleanup(days=14, journal_dir=Path(tmpdir))
+            assert list(Path(tmpdir).iterdir()) == []
+
+
+# ===== パイプライン =====
+
+class TestPipeline:
+    """段階的パイプラインエンジンのテスト"""
+
+    def test_order_preserved_with_concurrency(self):
+        def slow_double(batch):
+            time.sleep(0.01 * (5 - batch[0] % 5))
+            return [x * 2 for x in batch]
+
+        pipeline = Pipeline([Stage("double", slow_double, concurrency=4, batch_size=1)])
+        assert pipeline.run(range(10)) == [x * 2 for x in range(10)]
+
+    def test_stages_overlap(self):
+        events = []
+
+        def first(batch):
+            time.sleep(0.05)
+            events.append(("first", batch[0], time.perf_counter()))
+            return batch
+
+        def second(batch):
+            events.append(("second", batch[0], time.perf_counter()))
+            return batch
+
+        Pipeline([Stage("a", first, batch_size=1), Stage("b", second, batch_size=1)]).run([1, 2, 3])
+        second_start = {item: t for name, item, t in events if name == "second"}
+        first_end = {item: t for name, item, t in events if name == "first"}
+        # 1件目は3件目の取得完了を待たずに次の段へ進む
+        assert second_start[1] < first_end[3]
+
+    def test_barrier_and_fan_out(self):
+        batches = []
+
+        def expand(batch):
+            return [f"{x}-{i}" for x in batch for i in range(2)]
+
+        def collect(batch):
+            batches.append(list(batch))
+            return batch
+
+        pipeline = Pipeline([Stage("expand", expand, batch_size=1), Stage("all", collect, batch_size=None)])
+        assert pipeline.run(["a", "b"]) == ["a-0", "a-1", "b-0", "b-1"]
+        assert batches == [["a-0", "a-1", "b-0", "b-1"]]
+
+    def test_stage_error_drops_batch(self):
+        def fail_on_two(batch):
+            if 2 in batch:
+                raise RuntimeError("boom")
+            return batch
+
+        with patch("scirate_discord_bot.metrics", RunMetrics()) as run_metrics:
+            pipeline = Pipeline([Stage("f", fail_on_two, batch_size=1)])
+            assert pipeline.run([1, 2, 3]) == [1, 3]
+        assert pipeline.stats["f"]["errors"] == 1
+        assert [(name, count) for name, count, _ in pipeline.failures] == [("f", 1)]
+        assert run_metrics.total("pipeline_items_dropped") == 1
+
+    def test_dropped_batch_fails_run(self):
+        def fail(batch):
+            raise RuntimeError("boom")
+
+        pipeline = Pipeline([Stage("fetch", lambda batch: [1, 2], batch_size=1), Stage("enrich", fail, batch_size=None)])
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch("scirate_discord_bot.CACHE_DIR", Path(tmpdir)), \
+                patch("scirate_discord_bot.posted_tracker", TestFanOut()._tracker(tmpdir)), \
+                patch("scirate_discord_bot.build_digest_pipeline", return_value=pipeline), \
+                patch("scirate_discord_bot.metrics", RunMetrics()) as run_metrics, \
+                patch.object(RunMetrics, "write"):
+            with pytest.raises(PipelineError, match="enrich（2件を破棄: boom）"):
+                main(dry_run=True, date="2026-03-02")
+        assert run_metrics.total("pipeline_items_dropped") == 2
+
+
+# ===== プロファイル =====
+
+class TestStageProfiler:
+    """--profile のステージ別計測のテスト"""
+
+    def test_reports_per_stage(self):
+        tracker = SleepTracker()
+
+        def waits(batch):
+            tracker.sleep(0.05)
+            return batch
+
+        def allocates(batch):
+            return [[0] * 10000 for _ in batch]
+
+        with tempfile.TemporaryDirectory() as tmpdir, patch("scirate_discord_bot.sleep_tracker", tracker):
+            profiler = StageProfiler(Path(tmpdir))
+            profiler.start()
+            try:
+                pipeline = Pipeline([Stage("wait", waits, batch_size=1), Stage("alloc", allocates, batch_size=None)],
+                                    profiler=profiler)
+                pipeline.run([1, 2])
+                profiler.write_reports(total_wall=1.0)
+            finally:
+                profiler.stop()
+
+            assert (Path(tmpdir) / "wait.pstats").exists()
+            assert (Path(tmpdir) / "alloc.pstats").exists()
+            assert "== alloc" in (Path(tmpdir) / "allocations.txt").read_text(encoding="utf-8")
+            assert tracker.totals["wait"] >= 0.1
+            assert "alloc" not in tracker.totals
+            summary = (Path(tmpdir) / "summary.txt").read_text(encoding="utf-8")
+            assert "sleep" in summary and "work" in summary
+
+
+# ===== 実行メトリクス =====
+
+class TestRunMetrics:
+    """実行メトリクスと履歴レポートのテスト"""
+
+    def test_openmetrics_format(self):
+        m = RunMetrics()
+        m.inc("http_requests", host="scirate.com", status="2xx")
+        m.inc("http_requests", host="scirate.com", status="2xx")
+        m.inc("gemini_tokens", 120, model="gemini-2.5-flash")
+        m.set("stage_duration_seconds", 1.5, stage="fetch")
+        text = m.to_openmetrics()
+        assert "# TYPE scirate_bot_http_requests counter" in text
+        assert 'scirate_bot_http_requests_total{host="scirate.com",status="2xx"} 2' in text
+        assert 'scirate_bot_gemini_tokens_total{model="gemini-2.5-flash"} 120' in text
+        assert 'scirate_bot_stage_duration_seconds{stage="fetch"} 1.5' in text
+        assert text.endswith("# EOF\n")
+
+    def test_history_and_report(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            textfile = Path(tmpdir) / "bot.prom"
+            history = Path(tmpdir) / "history.jsonl"
+            for duration in [10, 20, 30, 40, 100]:
+                m = RunMetrics()
+                m.inc("discord_rate_limited", 2)
+                m.set("run_duration_seconds", duration)
+                m.write(textfile, history)
+
+            assert textfile.exists()
+            records = load_metrics_history(3, history)
+            assert len(records) == 3
+            report = format_metrics_report(load_metrics_history(30, history))
+            line = next(l for l in report.splitlines() if l.startswith("run_duration_seconds"))
+            p50, p95, last = (float(x) for x in line.split()[1:])
+            assert (p50, p95, last) == (30.0, 100.0, 100.0)
+            assert "discord_rate_limited_total" in report
+
+    def test_percentile_nearest_rank(self):
+        assert _percentile([1, 2, 3, 4, 5, 6], 50) == 3
+        assert _percentile(list(range(1, 11)), 30) == 3
+        assert _percentile(list(range(1, 21)), 95) == 19
+        assert _percentile([7], 5) == 7 and _percentile([3, 1, 2], 100) == 3
+
+    def test_report_without_history(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            assert format_metrics_report(load_metrics_history(30, Path(tmpdir) / "none.jsonl")) == "実行履歴がありません"
+
+
+class TestLogging:
+    """キュー経由のログ出力（ローテーション・ロガー別レベル・JSON）のテスト"""
+
+    def test_queued_json_with_rotation_and_levels(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "bot.log"
+            listener = setup_logging(str(path), "INFO", "scirate_bot.cache=WARNING", "json",
+                                     max_bytes=2000, backup_count=2, console=False)
+            try:
+                log = logging.getLogger("scirate_bot")
+                for i in range(100):
+                    log.info(f"論文を解析 {i}")
+                log.getChild("cache").info("キャッシュヒット: 2603.00001")
+                try:
+                    1 / 0
+                except ZeroDivisionError:
+                    log.exception("失敗")
+            finally:
+                stop_logging(listener)
+                stop_logging(listener)  # 2回目は何もしない
+                root.handlers[:] = saved_handlers
+                root.setLevel(saved_level)
+                logging.getLogger("scirate_bot.cache").setLevel(logging.NOTSET)
+
+            files = sorted(Path(tmpdir).glob("bot.log*"))
+            records = [json.loads(line) for f in files for line in f.read_text(encoding="utf-8").splitlines()]
+            assert len(files) == 3 and all(f.stat().st_size <= 2000 for f in files)
+            assert not any("キャッシュヒット" in r["msg"] for r in records)
+            last = json.loads(path.read_text(encoding="utf-8").splitlines()[-1])
+            assert last["level"] == "ERROR" and last["logger"] == "scirate_bot" and "ZeroDivisionError" in last["msg"]
+
+    def test_import_leaves_logging_alone(self):
+        """importしただけではルートロガーのハンドラもログファイルも作らない"""
+        code = ("import logging; logging.basicConfig(); before = logging.getLogger().handlers[:]; "
+                "import scirate_discord_bot; assert logging.getLogger().handlers == before")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+            subprocess.run([sys.executable, "-c", code], cwd=tmpdir, env=env, check=True)
+            assert not (Path(tmpdir) / "scirate_bot.log").exists()
+
+    def test_parse_log_levels(self):
+        assert parse_log_levels("urllib3=error, scirate_bot.cache=WARNING") == {
+            "urllib3": logging.ERROR, "scirate_bot.cache": logging.WARNING}
+        with pytest.raises(ValueError):
+            parse_log_levels("urllib3=LOUD")
+
+
+# ===== オフラインE2E用スタンドイン =====
+
+class TestOfflineStandins:
+    """Scirate/arXivスタンドインに向けた取得処理のテスト"""
+
+    def test_scirate_and_arxiv_standins(self):
+        source = synthetic_papers(12)
+        with tempfile.TemporaryDirectory() as tmpdir, ScirateStandin(source, abstracts=False) as scirate, \
+                ArxivStandin(source) as arxiv:
+            with patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url), \
+                    patch("scirate_discord_bot.ARXIV_API_URL", f"{arxiv.url}/api/query"), \
+                    patch("scirate_discord_bot.scites_history", ScitesHistory(Path(tmpdir))) as history:
+                papers, date = get_top_papers_from_scirate("quant-ph", 5, date="2026-03-02")
+                enrich_papers_with_abstracts(papers)
+                assert len(history.load("quant-ph")["ids"]) == 12  # ランキング全体を履歴に記録
+
+        assert date == "2026-03-02"
+        assert [p["scites"] for p in papers] == sorted((p["scites"] for p in source), reverse=True)[:5]
+        assert all(p["abstract"] and "ε" in p["abstract"] for p in papers)
+        assert len(arxiv.requests) == 1
+
+    def test_abstracts_from_scirate_page(self):
+        source = synthetic_papers(4)
+        page = [dict(p, abstract=None) if i == 2 else p for i, p in enumerate(source)]
+        with tempfile.TemporaryDirectory() as tmpdir, ScirateStandin(page) as scirate, ArxivStandin(source) as arxiv:
+            with patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url), \
+                    patch("scirate_discord_bot.ARXIV_API_URL", f"{arxiv.url}/api/query"), \
+                    patch("scirate_discord_bot.scites_history", ScitesHistory(Path(tmpdir))), \
+                    patch("scirate_discord_bot.metrics", RunMetrics()) as run_metrics:
+                papers, _ = get_top_papers_from_scirate("quant-ph", None, date="2026-03-02")
+                assert sum(1 for p in papers if p["abstract"]) == 3
+                enrich_papers_with_abstracts(papers)
+                # Abstractが欠けていた1件だけをarXiv APIに問い合わせる
+                assert len(arxiv.requests) == 1 and source[2]["arxiv_id"] in arxiv.requests[0][1]
+                assert run_metrics.total("arxiv_lookups_avoided") == 3
+
+                enrich_papers_with_abstracts(papers)
+                assert len(arxiv.requests) == 1  # 全件そろっていれば呼び出さない
+
+        assert all(p["abstract"] and "ε" in p["abstract"] for p in papers)
+
+    def test_prefetch_is_incremental_and_enrich_is_local(self):
+        source = synthetic_papers(25)
+        with tempfile.TemporaryDirectory() as tmpdir, ArxivStandin(source[5:]) as arxiv:
+            store = ArxivMetadataStore(Path(tmpdir) / "arxiv_metadata.db")
+            with patch("scirate_discord_bot.ARXIV_API_URL", f"{arxiv.url}/api/query"), \
+                    patch("scirate_discord_bot.clock", VirtualClock()), \
+                    patch("scirate_discord_bot.sleep_tracker", SleepTracker()):
+                assert store.harvest("quant-ph", page_size=8) == 20
+                assert len(arxiv.requests) == 3  # 8+8+4件
+
+                # 新着5件が先頭に増えた: 1ページ目で新規5件、2ページ目は既知のみで止まる
+                arxiv.papers = {p["arxiv_id"]: p for p in source}
+                arxiv.requests.clear()
+                assert store.harvest("quant-ph", page_size=8) == 5
+                assert len(arxiv.requests) == 2
+
+                papers = [Paper(p["arxiv_id"], p["title"], p["scites"], p["authors"]) for p in source[:8]]
+                arxiv.requests.clear()
+                with patch("scirate_discord_bot.arxiv_store", store):
+                    enrich_papers_with_abstracts(papers)
+                assert arxiv.requests == []
+
+        assert all(p["abstract"] and "ε" in p["abstract"] for p in papers)
+
+    def test_fault_injection(self):
+        with ScirateStandin(synthetic_papers(1), error_rate=1.0) as scirate:
+            with patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url):
+                papers, date = get_top_papers_from_scirate("quant-ph", 5)
+        assert papers == [] and date is None
+        assert scirate.injected[503] == 1
+
+
+# ===== 記録・再生 =====
+
+class TestRecordReplay:
+    """外部通信の記録・再生のテスト"""
+
+    def _run(self, scirate_url: str, arxiv_url: str, webhook: str, tmpdir: str):
+        with patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate_url), \
+                patch("scirate_discord_bot.ARXIV_API_URL", f"{arxiv_url}/api/query"), \
+                patch("scirate_discord_bot.scites_history", ScitesHistory(Path(tmpdir))):
+            papers, _ = get_top_papers_from_scirate("quant-ph", 3, date="2026-03-02")
+            enrich_papers_with_abstracts(papers)
+            response = DiscordClient().execute_webhook(webhook, {"content": papers[0]["title"]})
+        return [dict(p) for p in papers], response.status_code
+
+    def test_replay_without_network(self):
+        source = synthetic_papers(6)
+        recorder = TrafficRecorder("record")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with ScirateStandin(source, abstracts=False) as scirate, ArxivStandin(source) as arxiv, \
+                    DiscordWebhookStandin(limit=10, window=1) as discord:
+                previous = install_traffic_recorder(recorder)
+                try:
+                    recorded = self._run(scirate.url, arxiv.url, f"{discord.url}/api/webhooks/1/secret", tmpdir)
+                finally:
+                    uninstall_traffic_recorder(previous)
+                urls = (scirate.url, arxiv.url, f"{discord.url}/api/webhooks/1/secret")
+
+            bundle = recorder.to_bundle({"date": "2026-03-02"}, b"state")
+            assert b"secret" not in bundle  # Webhookトークンは記録に残さない
+            replayer, meta, state = TrafficRecorder.from_bundle(bundle, timing="fast")
+            assert meta == {"date": "2026-03-02"} and state == b"state"
+
+            # スタンドインを止めた状態でも、記録どおりの結果になる
+            previous = install_traffic_recorder(replayer)
+            try:
+                replayed = self._run(*urls, tmpdir)
+            finally:
+                uninstall_traffic_recorder(previous)
+
+        assert replayed == recorded and recorded[1] == 204
+        assert replayer.stats() == {"recorded": 3, "used": 3, "unmatched": 0}
+
+    def test_replay_keeps_posted_targets(self):
+        from google import genai
+        import scirate_discord_bot as bot
+        source = synthetic_papers(6)
+        ranked = [p["arxiv_id"] for p in sorted(source, key=lambda p: p["scites"], reverse=True)]
+        cwd = Path.cwd()
+        with tempfile.TemporaryDirectory() as tmpdir, ScirateStandin(source) as scirate, \
+                GeminiStandin() as gemini, DiscordWebhookStandin(limit=50, window=1) as discord:
+            webhook = f"{discord.url}/api/webhooks/1/secret"
+            with patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url), \
+                    patch("scirate_discord_bot.GEMINI_BASE_URL", gemini.url), \
+                    patch("scirate_discord_bot.gemini_client", genai.Client(api_key="standin")), \
+                    patch("scirate_discord_bot.DISCORD_WEBHOOK_URLS", [webhook]), \
+                    patch("scirate_discord_bot.TOP_N_PAPERS", 3), \
+                    patch("scirate_discord_bot.rate_limiter", RateLimiter(rpm_limit=1000)), \
+                    patch("scirate_discord_bot.clock", VirtualClock()), \
+                    patch("scirate_discord_bot.sleep_tracker", SleepTracker()), \
+                    patch("scirate_discord_bot.post_to_discord", wraps=bot.post_to_discord) as post:
+                os.chdir(tmpdir)
+                try:
+                    bot.reload_state()
+                    # 前日に1位の論文を投稿済み: 記録時は次点から3件を補充する
+                    bot.posted_tracker.mark_as_posted(ranked[0], webhook_target_key(webhook))
+                    bot.run_recorded("run.tar.gz", date="2026-03-02")
+                    bot.run_replay("run.tar.gz", timing="fast")
+                finally:
+                    os.chdir(cwd)
+                    bot.reload_state()
+
+        recorded, replayed = ([p["arxiv_id"] for p in c.args[0]] for c in post.call_args_list)
+        assert recorded == replayed == ranked[1:4]
+        # 再生でも記録時と同じ投稿先キーで投稿済み・ジャーナルを照合する
+        assert [c.kwargs["target_keys"] for c in post.call_args_list][1] == {
+            bot.redact_url(webhook): webhook_target_key(webhook)}
+        assert len(discord.messages) == 1  # 再生はDiscordに送らない
+
+    def test_replay_restores_globals_on_error(self):
+        import scirate_discord_bot as bot
+        cwd, clock, endpoint = Path.cwd(), bot.clock, bot.SCIRATE_BASE_URL
+        meta = {"date": "2026-03-02", "endpoints": {"SCIRATE_BASE_URL": "https://recorded.example"}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bundle = Path(tmpdir) / "run.tar.gz"
+            bundle.write_bytes(TrafficRecorder("record").to_bundle(meta, export_state_bundle(cache_dir=Path(tmpdir))))
+            # 作業ディレクトリ・接続先・時計を切り替えた後、main の前に失敗しても元に戻す
+            with patch("scirate_discord_bot.install_traffic_recorder", side_effect=RuntimeError("boom")), \
+                    pytest.raises(RuntimeError):
+                bot.run_replay(str(bundle), timing="fast")
+            with patch("scirate_discord_bot.main", side_effect=RuntimeError("boom")), pytest.raises(RuntimeError):
+                bot.run_replay(str(bundle), timing="fast")
+
+        assert Path.cwd() == cwd and bot.clock is clock and bot.SCIRATE_BASE_URL == endpoint
+        assert not any(isinstance(a, bot.RecordingAdapter) for a in bot.http_session.adapters.values())
+
+    def test_rejects_foreign_bundle(self):
+        with pytest.raises(ValueError):
+            TrafficRecorder.from_bundle(b"not a bundle")
+        with tempfile.TemporaryDirectory() as tmpdir, pytest.raises(ValueError):
+            TrafficRecorder.from_bundle(export_state_bundle(cache_dir=Path(tmpdir)))  # 状態バンドルは再生できない
+
+
+# ===== 常駐モード =====
+
+class TestBusinessDaySchedule:
+    """営業日スケジュールのテスト"""
+
+    def test_next_run_same_day(self):
+        schedule = BusinessDaySchedule("08:40")
+        after = datetime(2026, 3, 2, 7, 0, tzinfo=JST)  # 月曜 7:00
+        assert schedule.next_run(after) == datetime(2026, 3, 2, 8, 40, tzinfo=JST)
+
+    def test_skips_weekend_and_holidays(self):
+        schedule = BusinessDaySchedule("08:40", holidays="2026-03-09")
+        after = datetime(2026, 3, 6, 9, 0, tzinfo=JST)  # 金曜の実行後
+        assert schedule.next_run(after) == datetime(2026, 3, 10, 8, 40, tzinfo=JST)  # 土日・月曜休業日を飛ばす
+        assert not schedule.is_business_day(datetime(2026, 3, 9).date())
+
+    def test_converts_from_utc(self):
+        schedule = BusinessDaySchedule("08:40")
+        after = datetime(2026, 3, 1, 23, 30, tzinfo=timezone.utc)  # 日曜UTC = 月曜 8:30 JST
+        assert schedule.next_run(after) == datetime(2026, 3, 2, 8, 40, tzinfo=JST)
+
+
+class TestHealthServer:
+    """ヘルスチェックエンドポイントのテスト"""
+
+    def test_healthz_and_metrics(self):
+        import requests
+        status = {'runs': 1, 'last_result': 'ok'}
+        health = HealthServer(status, port=0).start()
+        try:
+            base = f"http://127.0.0.1:{health.port}"
+            assert requests.get(f"{base}/healthz", timeout=5).json()["runs"] == 1
+            status['last_result'] = 'error'
+            assert requests.get(f"{base}/healthz", timeout=5).status_code == 503
+            assert requests.get(f"{base}/metrics", timeout=5).text.endswith("# EOF\n")
+        finally:
+            health.stop()
+
+
+# ===== マルチテナント =====
+
+class TestTenants:
+    """テナント設定と共有取得・要約のテスト"""
+
+    def test_load_tenants(self):
+        config = {"tenants": [
+            {"name": "qc-ja", "categories": ["quant-ph"], "top_n": 5, "language": "ja",
+             "webhooks": ["env:TEST_QC_WEBHOOK"]},
+            {"name": "qc-en", "language": "en", "webhooks": ["https://example.com/hook"]},
+        ]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "tenants.json"
+            path.write_text(json.dumps(config), encoding="utf-8")
+            with patch.dict("os.environ", {"TEST_QC_WEBHOOK": "https://example.com/secret"}):
+                tenants = load_tenants(str(path))
+            assert tenants[0]["webhooks"] == ["https://example.com/secret"]
+            assert tenants[1]["categories"] == ["quant-ph"] and tenants[1]["top_n"] == 8
+
+            path.write_text(json.dumps({"tenants": [{"name": "bad name"}]}), encoding="utf-8")
+            with pytest.raises(ValueError):
+                load_tenants(str(path))
+
+    def test_shared_fetch_and_summaries(self):
+        ranking = {
+            "quant-ph": [_paper(1, "q1"), _paper(2, "q2"), _paper(3, "q3"), _paper(4, "q4")],
+            "cs.ET": [_paper(1, "q1"), _paper(5, "e1"), _paper(6, "e2")],
+        }
+        scites = {"2603.00001": 40, "2603.00002": 30, "2603.00003": 20, "2603.00004": 10,
+                  "2603.00005": 35, "2603.00006": 5}
+        fetch_calls, summary_calls, requests_made = [], [], []
+
+        def fake_fetch(category, top_n, date=None):
+            fetch_calls.append((category, top_n))
+            papers = [dict(p, scites=scites[p["arxiv_id"]], abstract="abs") for p in ranking[category]]
+            return sorted(papers, key=lambda p: p["scites"], reverse=True)[:top_n], date
+
+        def fake_batch(papers, language="ja"):
+            requests_made.append(language)
+            summary_calls.extend((p["arxiv_id"], language) for p in papers)
+            return {p["arxiv_id"]: f"{language}要約" for p in papers}
+
+        def fake_multi(papers, languages):
+            requests_made.append(tuple(languages))
+            summary_calls.extend((p["arxiv_id"], language) for p in papers for language in languages)
+            return {language: {p["arxiv_id"]: f"{language}要約" for p in papers} for language in languages}
+
+        with tempfile.TemporaryDirectory() as tmpdir, DiscordWebhookStandin(limit=50, window=1) as discord:
+            tenants = [
+                {"name": "a", "categories": ["quant-ph"], "top_n": 3, "language": "ja",
+                 "webhooks": [f"{discord.url}/api/webhooks/1/a"]},
+                {"name": "b", "categories": ["quant-ph", "cs.ET"], "top_n": 3, "language": "en",
+                 "webhooks": [f"{discord.url}/api/webhooks/2/b"]},
+                {"name": "c", "categories": ["cs.ET"], "top_n": 2, "language": "ja",
+                 "webhooks": [f"{discord.url}/api/webhooks/3/c"]},
+            ]
+            tracker = TestFanOut()._tracker(tmpdir)
+            with patch("scirate_discord_bot.CACHE_DIR", Path(tmpdir)), \
+                    patch("scirate_discord_bot.DEDUP_ENABLED", False), \
+                    patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.get_top_papers_from_scirate", side_effect=fake_fetch), \
+                    patch("scirate_discord_bot.enrich_papers_with_abstracts", side_effect=lambda papers: papers), \
+                    patch("scirate_discord_bot.generate_batch_summaries", side_effect=fake_batch), \
+                    patch("scirate_discord_bot.generate_multilingual_summaries", side_effect=fake_multi):
+                build_digest_pipeline("normal", "2026-03-02", tenants=tenants).run(["2026-03-02"])
+
+        # カテゴリごとに1回、ランキング全体を取得
+        assert sorted(fetch_calls) == [("cs.ET", None), ("quant-ph", None)]
+        # (論文, 言語) の組ごとに1回だけ要約（テナント合計8件に対して7件）
+        assert len(summary_calls) == len(set(summary_calls)) == 7
+        # ja+en が必要な3件は1回で、ja のみの1件は1回で要約
+        assert sorted(map(str, requests_made)) == ["('ja', 'en')", "ja"]
+        posted = {route: payload for route, payload in discord.messages}
+        assert [e["title"][:5] for e in posted["/api/webhooks/1/a"]["embeds"]] == ["1. q1", "2. q2", "3. q3"]
+        assert [e["title"][:5] for e in posted["/api/webhooks/2/b"]["embeds"]] == ["1. q1", "2. e1", "3. q2"]
+        assert "quant-ph, cs.ET" in posted["/api/webhooks/2/b"]["content"]
+        assert len(posted["/api/webhooks/3/c"]["embeds"]) == 2
+
+    def test_refill_from_parsed_ranking(self):
+        papers = [dict(_paper(i), category="quant-ph", scites=50 - i) for i in range(1, 7)]
+        tenants = [{"name": "a", "categories": ["quant-ph"], "top_n": 3, "webhooks": []}]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracker = TestFanOut()._tracker(tmpdir)
+            tracker.mark_as_posted("2603.00001")
+            tracker.mark_as_posted("2603.00003")
+            with patch("scirate_discord_bot.posted_tracker", tracker):
+                selected = select_tenant_papers(papers, tenants, reserve=1)
+
+        # 投稿済みの2件を飛ばし、未投稿の上位3件（+繰り上げ候補1件）を選ぶ
+        assert [p["arxiv_id"] for p in selected] == ["2603.00002", "2603.00004", "2603.00005", "2603.00006"]
+        assert [p["tenant_ranks"]["a"] for p in selected] == [0, 1, 2, 3]
+
+
+class TestMultilingualSummaries:
+    """1回の呼び出しによる多言語要約のテスト"""
+
+    def test_one_request_for_two_languages(self):
+        from google import genai
+        from google.genai import types
+        papers = [dict(_paper(i), abstract=f"Abstract {i}") for i in (1, 2)]
+        with tempfile.TemporaryDirectory() as tmpdir, GeminiStandin() as gemini:
+            client = genai.Client(api_key="standin", http_options=types.HttpOptions(base_url=gemini.url))
+            with patch("scirate_discord_bot.gemini_client", client), \
+                    patch("scirate_discord_bot.summary_cache", SummaryCache(cache_dir=Path(tmpdir))), \
+                    patch("scirate_discord_bot.rate_limiter", RateLimiter(rpm_limit=1000)), \
+                    patch("scirate_discord_bot.usage_tracker"):
+                results = generate_multilingual_summaries(papers, ["ja", "en"])
+                assert len(gemini.calls) == 1
+                assert results["ja"]["2603.00001"].startswith("[ja]")
+                assert results["en"]["2603.00002"].startswith("[en]")
+
+                # 言語ごとにキャッシュされ、再度の呼び出しは発生しない
+                generate_multilingual_summaries(papers, ["ja", "en"])
+                assert len(gemini.calls) == 1
+
+    def test_full_abstracts_in_capped_batches(self):
+        from google import genai
+        from google.genai import types
+        papers = [dict(_paper(i), abstract=f"Abstract {i} " + "x" * 1200) for i in (1, 2, 3)]
+        with tempfile.TemporaryDirectory() as tmpdir, GeminiStandin() as gemini:
+            client = genai.Client(api_key="standin", http_options=types.HttpOptions(base_url=gemini.url))
+            with patch("scirate_discord_bot.gemini_client", client), \
+                    patch("scirate_discord_bot.summary_cache", SummaryCache(cache_dir=Path(tmpdir))), \
+                    patch("scirate_discord_bot.rate_limiter", RateLimiter(rpm_limit=1000)), \
+                    patch("scirate_discord_bot.usage_tracker"), \
+                    patch("scirate_discord_bot.MULTILINGUAL_BATCH_SIZE", 2):
+                results = generate_multilingual_summaries(papers, ["ja", "en"])
+
+        # 2件と1件に分けて呼び出し、要旨は切り詰めずに送る
+        assert len(gemini.calls) == 2
+        assert gemini.calls[0][1] > 2 * 1200 and gemini.calls[1][1] > 1200
+        assert sorted(results["en"]) == ["2603.00001", "2603.00002", "2603.00003"]
+
+
+class TestGeminiContextCache:
+    """要約の指示をコンテキストキャッシュに載せるテスト"""
+
+    def _run(self, gemini, tmpdir, papers, context_cache):
+        from google import genai
+        from google.genai import types
+        client = genai.Client(api_key="standin", http_options=types.HttpOptions(base_url=gemini.url))
+        with patch("scirate_discord_bot.CACHE_DIR", Path(tmpdir)):
+            tracker = APIUsageTracker()
+        with patch("scirate_discord_bot.gemini_client", client), \
+                patch("scirate_discord_bot.context_cache", context_cache), \
+                patch("scirate_discord_bot.summary_cache", SummaryCache(cache_dir=Path(tmpdir))), \
+                patch("scirate_discord_bot.rate_limiter", RateLimiter(rpm_limit=1000)), \
+                patch("scirate_discord_bot.usage_tracker", tracker), \
+                patch("scirate_discord_bot.clock", VirtualClock()), \
+                patch("scirate_discord_bot.sleep_tracker", SleepTracker()):
+            summaries = [generate_summary(p["title"], p["abstract"], p["arxiv_id"]) for p in papers]
+        return summaries, tracker
+
+    def test_system_instruction_sends_only_delta(self):
+        papers = [dict(_paper(i), abstract=f"Abstract {i}") for i in (1, 2)]
+        with tempfile.TemporaryDirectory() as tmpdir, GeminiStandin() as gemini:
+            summaries, _ = self._run(gemini, tmpdir, papers, GeminiContextCache("system"))
+        assert all(summary.startswith("スタンドイン") for summary in summaries)
+        # 送るのは論文ごとの部分だけ
+        assert len(gemini.calls) == 2 and all(sent < 100 for _, sent in gemini.calls)
+
+    def test_cached_mode_is_treated_as_system(self):
+        """指示は最小キャッシュサイズに満たないため、cached はシステム指示で送る"""
+        assert GeminiContextCache("cached").mode == "system"
+        assert GeminiContextCache("bogus").mode == "off"
+        with patch("scirate_discord_bot.gemini_client", object()):
+            request = GeminiContextCache("cached").request("gemini-2.5-flash", "指示", "論文")
+        assert request["contents"] == "論文" and request["config"].system_instruction == "指示"
+        assert request["config"].cached_content is None
+
+
+# ===== scites履歴 =====
+
+class TestScitesHistory:
+    """列指向の履歴ストアと期間集計のテスト"""
+
+    def test_id_roundtrip(self):
+        for arxiv_id in ["2603.01234", "1412.1234", "2511.13560"]:
+            assert ScitesHistory.decode_id(ScitesHistory.encode_id(arxiv_id)) == arxiv_id
+        assert ScitesHistory.encode_id("quant-ph/0501001") is None
+
+    def test_period_ranking(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            history = ScitesHistory(Path(tmpdir))
+            history.record("quant-ph", "2026-03-02", [
+                {"arxiv_id": "2603.00001", "scites": 10}, {"arxiv_id": "2603.00002", "scites": 30}])
+            history.record("quant-ph", "2026-03-03", [
+                {"arxiv_id": "2603.00003", "scites": 20}, {"arxiv_id": "2603.00001", "scites": 50}])
+            history.record("quant-ph", "2026-02-20", [{"arxiv_id": "2602.00009", "scites": 99}])
+
+            top = history.top("quant-ph", "2026-03-02", "2026-03-06", 2)
+            assert [(e["arxiv_id"], e["scites"]) for e in top] == [("2603.00001", 50), ("2603.00002", 30)]
+            assert top[0]["date"] == "2026-03-02"
+
+            dates = listing_dates("2026-03-06", 7)
+            assert dates == ["2026-03-02", "2026-03-03", "2026-03-04", "2026-03-05", "2026-03-06"]
+            assert history.missing_dates("quant-ph", dates) == ["2026-03-04", "2026-03-05", "2026-03-06"]
+
+    def test_record_reports_missing_day(self):
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch("scirate_discord_bot.scites_history", ScitesHistory(Path(tmpdir))) as history:
+            with ScirateStandin(synthetic_papers(3)) as scirate, \
+                    patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url):
+                assert record_scites_history("quant-ph", "2026-03-02")
+            with ScirateStandin(synthetic_papers(3), error_rate=1.0) as scirate, \
+                    patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url):
+                assert not record_scites_history("quant-ph", "2026-03-03")
+            # 掲載の無い日に前の日のページが返った場合は、その日として記録しない
+            with ScirateStandin(synthetic_papers(3), served_date="2026-03-02") as scirate, \
+                    patch("scirate_discord_bot.SCIRATE_BASE_URL", scirate.url):
+                assert not record_scites_history("quant-ph", "2026-03-04")
+            assert history.missing_dates("quant-ph", ["2026-03-02", "2026-03-03", "2026-03-04"]) == [
+                "2026-03-03", "2026-03-04"]
+
+
+class TestSearchIndex:
+    """投稿済み論文の全文検索のテスト"""
+
+    def test_search_ranks_by_relevance_and_recency(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index = SearchIndex(Path(tmpdir) / "search.db")
+            old = {"arxiv_id": "2501.00001", "title": "Surface-code decoders with neural networks",
+                   "authors": ["Alice"], "abstract": "We study decoding."}
+            new = {"arxiv_id": "2603.00002", "title": "Trapped ions", "authors": ["Bob"],
+                   "abstract": "A surface-code decoder benchmark."}
+            other = {"arxiv_id": "2603.00003", "title": "Photonic sampling", "authors": ["Carol"], "abstract": ""}
+            index.add([old], {"2501.00001": "ニューラルネットで表面符号を復号する"}, posted_date="2025-01-10")
+            index.add([new, other], {"2603.00002": "イオントラップでの量子誤り訂正"}, posted_date="2026-03-02")
+            index.add([new], {"2603.00002": "Error correction with trapped ions"}, language="en",
+                      posted_date="2026-03-09")
+
+            results = index.search("surface-code decoder", today="2026-03-10")
+            assert [r["arxiv_id"] for r in results] == ["2603.00002", "2501.00001"]
+            assert results[0]["posted_date"] == "2026-03-02"  # 投稿日は最初のものを残す
+            assert "**" in results[0]["snippet"]
+
+            # 日本語の要約、2文字の語、言語を追加した要約も引ける
+            assert [r["arxiv_id"] for r in index.search("表面符号")] == ["2501.00001"]
+            assert [r["arxiv_id"] for r in index.search("量子 イオン")] == ["2603.00002"]
+            assert [r["arxiv_id"] for r in index.search("trapped ions correction")] == ["2603.00002"]
+            assert index.search("Carol")[0]["arxiv_id"] == "2603.00003"
+            assert index.search("superconducting") == []
+
+
+class TestNearDuplicates:
+    """近似重複の検出と繰り上げのテスト"""
+
+    def _papers(self):
+        texts = [
+            ("Logical quantum processor based on reconfigurable atom arrays",
+             "We realize a programmable logical quantum processor based on reconfigurable neutral atom arrays "
+             "with up to 48 logical qubits encoded in color codes and surface codes.", 50),
+            ("Certified randomness from a trapped-ion quantum computer",
+             "We demonstrate certified randomness generation using random circuit sampling on trapped ions.", 40),
+            ("Architecture of a logical quantum processor with reconfigurable atom arrays",
+             "We describe the architecture of a logical quantum processor based on reconfigurable neutral atom "
+             "arrays, encoding logical qubits in color codes and surface codes.", 30),
+            ("Barren plateaus in variational algorithms", "We study trainability of variational circuits.", 20),
+        ]
+        papers = []
+        for i, (title, abstract, scites) in enumerate(texts, 1):
+            paper = _paper(i)
+            paper.update(title=title, abstract=abstract, scites=scites)
+            papers.append(paper)
+        return papers
+
+    def test_groups_companions_and_flags_history(self):
+        papers = self._papers()
+        history = [{"arxiv_id": "2602.00009", "posted_date": "2026-02-20",
+                    "title": "Barren plateaus in variational quantum algorithms",
+                    "abstract": "We study the trainability of variational circuits and barren plateaus."}]
+        duplicates = find_near_duplicates(papers, history=history)
+        assert [p["arxiv_id"] for p in duplicates] == ["2603.00003"]
+        assert papers[2]["duplicate_of"] == "2603.00001"
+        assert [r["arxiv_id"] for r in papers[0]["related"]] == ["2603.00003"]
+        assert "related" not in papers[1]
+        assert papers[3]["similar_posted"]["arxiv_id"] == "2602.00009"
+        assert "similar_posted" not in papers[0]
+
+    def test_promotes_next_ranked_into_freed_slot(self):
+        tenants = [{"name": "default", "categories": ["quant-ph"], "top_n": 3, "language": "ja", "webhooks": []}]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracker = TestFanOut()._tracker(tmpdir)
+            with patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")):
+                papers = [dict(p, category="quant-ph") for p in self._papers()]
+                candidates = select_tenant_papers(papers, tenants, reserve=1)
+                selected = collapse_near_duplicates(candidates, tenants, reserve=1)
+                assert [p["arxiv_id"] for p in selected] == ["2603.00001", "2603.00002", "2603.00004"]
+
+                # 繰り上げなしでは重複分だけ短くなる
+                papers = [dict(p, category="quant-ph") for p in self._papers()]
+                selected = collapse_near_duplicates(select_tenant_papers(papers, tenants), tenants, reserve=0)
+                assert [p["arxiv_id"] for p in selected] == ["2603.00001", "2603.00002"]
+
+
+    def test_pipeline_dedups_on_page_abstracts(self):
+        """タイトルが異なりアブストラクトだけが重なる論文も、Scirateページのアブストラクトでまとめる"""
+        tenants = [{"name": "default", "categories": ["quant-ph"], "top_n": 2, "language": "ja", "webhooks": []}]
+        papers = self._papers()[:2] + self._papers()[3:]
+        papers.insert(1, _paper(5))
+        papers[1].update(title="Fault-tolerant computation with 48 neutral-atom logical qubits",
+                         abstract=papers[0]["abstract"], scites=45)
+        enriched = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracker = TestFanOut()._tracker(tmpdir)
+            with patch("scirate_discord_bot.CACHE_DIR", Path(tmpdir)), \
+                    patch("scirate_discord_bot.DEDUP_ENABLED", True), \
+                    patch("scirate_discord_bot.DEDUP_RESERVE", 1), \
+                    patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.get_top_papers_from_scirate", return_value=(papers, None)), \
+                    patch("scirate_discord_bot.enrich_papers_with_abstracts",
+                          side_effect=lambda batch: enriched.extend(batch) or batch):
+                results = build_digest_pipeline("dry_run", "2026-03-02", tenants=tenants).run(["2026-03-02"])
+
+        assert [p["arxiv_id"] for p in results] == ["2603.00001", "2603.00002"]
+        assert [r["arxiv_id"] for r in results[0]["related"]] == ["2603.00005"]
+        assert "2603.00005" not in [p["arxiv_id"] for p in enriched]
+
+    def test_pipeline_dedups_before_enrich(self):
+        tenants = [{"name": "default", "categories": ["quant-ph"], "top_n": 3, "language": "ja", "webhooks": []}]
+        enriched = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracker = TestFanOut()._tracker(tmpdir)
+            with patch("scirate_discord_bot.CACHE_DIR", Path(tmpdir)), \
+                    patch("scirate_discord_bot.DEDUP_ENABLED", True), \
+                    patch("scirate_discord_bot.DEDUP_RESERVE", 1), \
+                    patch("scirate_discord_bot.posted_tracker", tracker), \
+                    patch("scirate_discord_bot.search_index", SearchIndex(Path(tmpdir) / "search.db")), \
+                    patch("scirate_discord_bot.get_top_papers_from_scirate", return_value=(self._papers(), None)), \
+                    patch("scirate_discord_bot.enrich_papers_with_abstracts",
+                          side_effect=lambda papers: enriched.extend(papers) or papers):
+                pipeline = build_digest_pipeline("dry_run", "2026-03-02", tenants=tenants)
+                pipeline.run(["2026-03-02"])
+
+        # 近似重複はfilterの中でまとめ、enrichは全件を待たずにバッチごとに進める
+        assert [stage.name for stage in pipeline.stages] == ["fetch", "filter", "enrich", "report"]
+        assert pipeline.stages[2].batch_size == 4
+        assert [p["arxiv_id"] for p in enriched] == ["2603.00001", "2603.00002", "2603.00004"]
+
+
+class TestWatchlist:
+    """キーワード・著者ウォッチリストによる振り分けのテスト"""
+
+    def test_matcher_overlaps_and_author_keys(self):
+        assert author_key("Preskill, John") == author_key("J. Preskill") == "preskill j"
+        assert author_key("Jürgen Müller") == "muller j"
+        matcher = WatchlistMatcher([
+            {"name": "a", "keywords": ["quantum error correction"]},
+            {"name": "b", "keywords": ["Quantum error", "Surface-Code"], "authors": ["J. Preskill"]},
+            {"name": "c", "keywords": ["error correction", "codes"], "authors": ["Müller"]},
+        ])
+        matched = matcher.match({"title": "Quantum error correction with surface codes",
+                                 "authors": ["John Preskill", "Jurgen Muller"]})
+        assert matched == {
+            "a": ["quantum error correction"],
+            "b": ["quantum error", "John Preskill"],
+            "c": ["error correction", "codes", "Jurgen Muller"],
+        }
+        # 語の途中には一致しない（"surface code" は "surface codes" の一部）
+        assert matcher.match({"title": "Surface codebooks", "authors": []}) == {}
+
+    def test_boost_and_filter_routes(self):
+        papers = [dict(_paper(i, title), category="quant-ph", scites=50 - i)
+                  for i, title in enumerate(["Trapped ions", "Photonics", "Rydberg atoms", "Surface code decoder"], 1)]
+        papers[2]["authors"] = ["Mikhail Lukin"]
+        tenants = [
+            {"name": "boost", "categories": ["quant-ph"], "top_n": 2, "webhooks": [], "keywords": ["surface code"]},
+            {"name": "only", "categories": ["quant-ph"], "top_n": 2, "webhooks": [], "route": "filter",
+             "authors": ["M. Lukin"]},
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch("scirate_discord_bot.posted_tracker", TestFanOut()._tracker(tmpdir)):
+            selected = {p["arxiv_id"]: p for p in select_tenant_papers(papers, tenants)}
+
+        assert sorted(aid for aid, p in selected.items() if "boost" in p["tenants"]) == ["2603.00001", "2603.00004"]
+        assert selected["2603.00004"]["tenant_ranks"]["boost"] == 0
+        assert selected["2603.00004"]["watched"] == {"boost": ["surface code"]}
+        assert [aid for aid, p in selected.items() if "only" in p["tenants"]] == ["2603.00003"]
+
+    def test_posts_share_papers_and_show_tenant_terms(self):
+        paper = Paper("2603.00001", "Surface code decoder", 10, tenants=["a", "b"],
+                      watched={"a": ["surface code"], "b": ["decoder"]})
+        tenants = [{"name": name, "categories": ["quant-ph"], "language": "ja", "webhooks": [f"https://x/{name}"]}
+                   for name in ("a", "b")]
+        with patch("scirate_discord_bot.post_to_discord") as post:
+            post_for_tenants([paper], tenants, {"a": None, "b": None}, "2026-03-02")
+
+        # テナントごとに辞書へコピーせず、同じレコードを渡す
+        assert [c.args[0][0] is paper for c in post.call_args_list] == [True, True]
+        assert [c.kwargs["tenant"] for c in post.call_args_list] == ["a", "b"]
+        embed = build_paper_embed(1, paper, "要約", watch_terms=paper["watched"]["b"])
+        assert [f["value"] for f in embed["fields"] if f["name"] == "ウォッチリスト"] == ["decoder"]
+
+
+class TestPaper:
+    """__slots__ の論文レコードのテスト"""
+
+    def test_mapping_access_and_derived_fields(self):
+        paper = Paper("2603.00001", None, 12, ["".join(["Alice", " Smith"]), "Bob"])
+        assert not hasattr(paper, "__dict__")
+        assert paper["title"] == UNKNOWN_TITLE and paper.title is None
+        assert paper["url"] == "https://arxiv.org/abs/2603.00001"
+        assert paper["scirate_url"] == "https://scirate.com/arxiv/2603.00001"
+        assert paper.get("category") is None and "category" not in paper
+        assert paper["authors"][0] is Paper("2603.00002", authors=[" ".join(["Alice", "Smith"])]).authors[0]  # intern済み
+
+        paper["title"] = "Found"
+        paper["category"] = "quant-ph"
+        paper.setdefault("tenants", []).append("a")
+        assert paper["title"] == "Found" and paper["tenants"] == ["a"]
+        assert dict(paper, extra=1)["url"] == paper.url
+        with pytest.raises(KeyError):
+            paper["url"] = "https://example.com"
+
+    def test_mapping_roundtrip_and_identity(self):
+        paper = Paper.from_mapping(dict(_paper(3), abstract="abs", category="quant-ph", tenants=["a"]))
+        assert paper["tenants"] == ["a"]
+        restored = Paper.from_mapping(json.loads(json.dumps(dict(paper))))
+        assert dict(restored) == dict(paper)
+        assert restored["url"] == _paper(3)["url"] and restored["authors"] == paper["authors"]
+        # 同じ内容でも別のレコードとして比較・ハッシュする
+        assert restored != paper and len({paper, restored, paper}) == 2